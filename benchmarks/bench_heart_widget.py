@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+HeartWidget 和粒子系统的离屏渲染基准测试
+
+在 QT_QPA_PLATFORM=offscreen 下把 HeartWidget 渲染到 QImage，覆盖不同尺寸和设备像素比、
+所有随机动画（颤抖/弹跳/旋转/发光/抖动）以及大批量粒子发射，输出JSON结果，便于在版本之间比较。
+
+用法（在仓库根目录下）：
+    python benchmarks/bench_heart_widget.py --output bench.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyQt5.QtCore import QRectF, Qt, QT_VERSION_STR, PYQT_VERSION_STR
+from PyQt5.QtGui import QColor, QImage
+from PyQt5.QtWidgets import QApplication
+
+from views.heart_widget import HeartWidget
+from utils.constants import FRAME_INTERVAL_MS
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+ANIMATIONS = ("shiver", "pop", "spin", "glow", "jiggle")
+ANIMATION_ATTRS = ("shiver_active_until", "pop_active_until", "spin_active_until",
+                   "glow_active_until", "jiggle_active_until", "pressed_active_until")
+SIZES = ((200, 200), (400, 400), (800, 800))
+DEVICE_PIXEL_RATIOS = (1.0, 2.0)
+PARTICLE_BURSTS = (500, 2000)
+WARMUP_FRAMES = 30
+ALLOCATION_FRAMES = 100
+
+
+def peak_rss_kib() -> Optional[int]:
+    """进程的峰值常驻内存 (KiB)，平台不支持时返回None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak  # macOS 单位为字节
+
+
+class Scenario:
+    """一个基准场景：部件尺寸、设备像素比，以及每帧渲染前执行的驱动函数"""
+
+    def __init__(self, name: str, size=(400, 400), device_pixel_ratio: float = 1.0,
+                 drive: Optional[Callable[[HeartWidget, int], None]] = None):
+        self.name = name
+        self.size = size
+        self.device_pixel_ratio = device_pixel_ratio
+        self.drive = drive
+
+
+def _trigger_animation(widget: HeartWidget, name: str):
+    """结束所有进行中的动画后触发指定动画（绕过“同一时间只运行一个动画”的限制）"""
+    for attr in ANIMATION_ATTRS:
+        setattr(widget, attr, 0.0)
+    getattr(widget, f"random_action_{name}")()
+
+
+def drive_animations(widget: HeartWidget, frame_index: int):
+    """每20帧依次触发下一个随机动画"""
+    if frame_index % 20 == 0:
+        _trigger_animation(widget, ANIMATIONS[(frame_index // 20) % len(ANIMATIONS)])
+
+
+def make_particle_driver(burst: int) -> Callable[[HeartWidget, int], None]:
+    """每30帧发射一批粒子，交替使用两种粒子类型"""
+    def drive(widget: HeartWidget, frame_index: int):
+        if frame_index % 30 == 0:
+            particle_type = "sparkle" if (frame_index // 30) % 2 == 0 else "teardrop"
+            widget.emit_particles(burst, QRectF(widget.rect()), QColor("#FFB6C1"), particle_type)
+    return drive
+
+
+def build_scenarios() -> List[Scenario]:
+    """所有基准场景"""
+    scenarios = [
+        Scenario(f"static_{w}x{h}@{dpr:g}x", (w, h), dpr)
+        for w, h in SIZES for dpr in DEVICE_PIXEL_RATIOS
+    ]
+    scenarios += [Scenario(f"animations_{w}x{h}", (w, h), 1.0, drive_animations) for w, h in SIZES]
+    scenarios += [
+        Scenario(f"particles_burst_{burst}", (400, 400), 1.0, make_particle_driver(burst))
+        for burst in PARTICLE_BURSTS
+    ]
+    return scenarios
+
+
+class Renderer:
+    """把部件逐帧渲染到复用的 QImage 中"""
+
+    def __init__(self, widget: HeartWidget, scenario: Scenario):
+        self.widget = widget
+        self.scenario = scenario
+        w, h = scenario.size
+        dpr = scenario.device_pixel_ratio
+        self.image = QImage(int(w * dpr), int(h * dpr), QImage.Format_ARGB32_Premultiplied)
+        self.image.setDevicePixelRatio(dpr)
+        self.frame_index = 0
+
+    def render_frame(self):
+        """推进一帧并渲染"""
+        if self.scenario.drive:
+            self.scenario.drive(self.widget, self.frame_index)
+        self.widget.advance_frame(FRAME_INTERVAL_MS, time.time())
+        self.image.fill(Qt.transparent)
+        self.widget.render(self.image)
+        self.frame_index += 1
+
+
+def run_scenario(widget: HeartWidget, scenario: Scenario, frames: int) -> Dict[str, object]:
+    """运行一个场景，返回该场景的结果"""
+    widget.resize(*scenario.size)
+    # 离屏平台的屏幕设备像素比固定为1，显式指定以便按场景构建和测量高DPI位图
+    widget.device_pixel_ratio_override = scenario.device_pixel_ratio
+    widget.particles.clear()
+    for attr in ANIMATION_ATTRS:
+        setattr(widget, attr, 0.0)
+    widget.current_spin_angle = 0.0
+    renderer = Renderer(widget, scenario)
+
+    for _ in range(WARMUP_FRAMES):
+        renderer.render_frame()
+
+    # 计时
+    frame_times = []
+    max_particles = 0
+    started = time.perf_counter()
+    for _ in range(frames):
+        frame_started = time.perf_counter()
+        renderer.render_frame()
+        frame_times.append((time.perf_counter() - frame_started) * 1000.0)
+        max_particles = max(max_particles, len(widget.particles))
+    elapsed = time.perf_counter() - started
+
+    # 内存分配（tracemalloc 会拖慢执行，因此单独测量）
+    allocation_frames = min(frames, ALLOCATION_FRAMES)
+    tracemalloc.start()
+    peaks = []
+    net_before = tracemalloc.get_traced_memory()[0]
+    for _ in range(allocation_frames):
+        current = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        renderer.render_frame()
+        peaks.append(tracemalloc.get_traced_memory()[1] - current)
+    net_after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    frame_times.sort()
+    return {
+        "name": scenario.name,
+        "size": list(scenario.size),
+        "device_pixel_ratio": scenario.device_pixel_ratio,
+        "frames": frames,
+        "fps": frames / elapsed if elapsed > 0 else None,
+        "frame_ms_mean": statistics.fmean(frame_times),
+        "frame_ms_p50": frame_times[len(frame_times) // 2],
+        "frame_ms_p99": frame_times[min(len(frame_times) - 1, int(len(frame_times) * 0.99))],
+        "alloc_peak_bytes_per_frame": statistics.fmean(peaks),
+        "alloc_net_bytes_per_frame": (net_after - net_before) / allocation_frames,
+        "max_particles": max_particles,
+        "particles_dropped": widget.particles.dropped,
+        "peak_rss_kib": peak_rss_kib(),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="HeartWidget offscreen rendering benchmarks")
+    parser.add_argument("--frames", type=int, default=300, help="timed frames per scenario")
+    parser.add_argument("--filter", default="", help="only run scenarios whose name contains this text")
+    parser.add_argument("--output", help="write JSON results to this file instead of stdout")
+    args = parser.parse_args(argv)
+
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    widget = HeartWidget()
+    widget.frame_timer.stop()  # 由基准测试逐帧驱动
+
+    results = [
+        run_scenario(widget, scenario, args.frames)
+        for scenario in build_scenarios() if args.filter in scenario.name
+    ]
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "qt": QT_VERSION_STR,
+            "pyqt": PYQT_VERSION_STR,
+            "platform": platform.platform(),
+            "qpa_platform": app.platformName(),
+        },
+        "results": results,
+        "peak_rss_kib": peak_rss_kib(),
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -13,6 +13,7 @@ class AnimationController(QObject):
         self.sound_controller = sound_controller
         self.random_action_timer = QTimer()
         self.random_action_timer.setSingleShot(True)
+        self._paused_remaining_ms = None  # 暂停时随机动画定时器的剩余时间
         
     def connect_heart_widget(self, heart_widget):
         """连接到心形部件
@@ -96,6 +97,25 @@ class AnimationController(QObject):
                 "teardrop"
             )
     
+    def pause(self):
+        """暂停随机动画调度，并记住剩余时间"""
+        if self._paused_remaining_ms is not None:
+            return
+        if self.random_action_timer.isActive():
+            self._paused_remaining_ms = max(0, self.random_action_timer.remainingTime())
+            self.random_action_timer.stop()
+        else:
+            self._paused_remaining_ms = -1  # 暂停前没有待执行的动画，恢复时也不调度
+
+    def resume(self):
+        """从暂停处继续随机动画调度"""
+        if self._paused_remaining_ms is None:
+            return
+        remaining_ms = self._paused_remaining_ms
+        self._paused_remaining_ms = None
+        if remaining_ms >= 0:
+            self.random_action_timer.start(remaining_ms)
+
     def stop_animations(self):
         """停止所有动画"""
         if self.random_action_timer.isActive():
@@ -0,0 +1,280 @@
+import json
+import logging
+import os
+import random
+import threading
+import time
+from typing import TYPE_CHECKING, Iterator, Optional
+
+from controllers.resilience import BackendError
+from utils.constants import (
+    API_KEY, GEMINI_MODEL_NAME, GEMINI_HTTP_MAX_CONNECTIONS, GEMINI_HTTP_KEEPALIVE_EXPIRY_S,
+    GEMINI_BACKEND, LOCAL_BACKEND_PROFILE, LOCAL_BACKEND_PROFILES, LOCAL_BACKEND_SEED
+)
+
+if TYPE_CHECKING:
+    from google import genai
+    from models.gemini_models import GeminiPrompt
+
+logger = logging.getLogger(__name__)
+
+
+class GeminiBackend:
+    """生成Ruby回复的后端接口
+
+    generate 返回完整的JSON文本，generate_stream 逐块产出JSON文本；
+    调用方关闭 generate_stream 返回的生成器即表示放弃该请求。所有方法都在工作线程中调用。
+    """
+
+    name = "base"
+
+    def warm_up(self):
+        """提前完成耗时的初始化（可选）"""
+
+    def is_available(self) -> bool:
+        """后端是否可以发出请求"""
+        return True
+
+    def create_cached_content(self, system_instruction: str, ttl_s: float) -> str:
+        """把系统指令注册为上下文缓存
+
+        Returns:
+            缓存名，之后的请求配置中用 cached_content 引用
+        """
+        raise NotImplementedError(f"{self.name} backend does not support context caching")
+
+    def delete_cached_content(self, cache_name: str):
+        """删除 create_cached_content 注册的上下文缓存"""
+        raise NotImplementedError(f"{self.name} backend does not support context caching")
+
+    def generate(self, prompt: "GeminiPrompt", config: dict) -> str:
+        """阻塞式请求，返回完整的JSON文本"""
+        raise NotImplementedError
+
+    def generate_stream(self, prompt: "GeminiPrompt", config: dict) -> Iterator[str]:
+        """流式请求，逐块产出JSON文本"""
+        raise NotImplementedError
+
+
+class GenaiBackend(GeminiBackend):
+    """通过 google-genai 访问 Gemini API，所有工作线程共享一个长连接客户端
+
+    SDK 导入较慢，推迟到第一次创建客户端时（通常是启动后的后台预热）。
+    """
+
+    name = "genai"
+
+    def __init__(self, model: str = GEMINI_MODEL_NAME, api_key: str = API_KEY):
+        self.model = model
+        self.api_key = api_key
+        self._client: Optional["genai.Client"] = None
+        self._client_lock = threading.Lock()
+
+    def get_client(self) -> Optional["genai.Client"]:
+        """获取共享的Gemini客户端（线程安全，首次调用时创建）
+
+        客户端内部的HTTP连接池启用了keep-alive，后续请求复用已建立的TLS连接。
+
+        Returns:
+            Gemini客户端，创建失败时返回None（下次调用会重试）
+        """
+        if self._client is not None:
+            return self._client
+        with self._client_lock:
+            if self._client is None:
+                try:
+                    import httpx
+                    from google import genai
+
+                    self._client = genai.Client(
+                        api_key=self.api_key,
+                        http_options={'client_args': {'limits': httpx.Limits(
+                            max_connections=GEMINI_HTTP_MAX_CONNECTIONS,
+                            max_keepalive_connections=GEMINI_HTTP_MAX_CONNECTIONS,
+                            keepalive_expiry=GEMINI_HTTP_KEEPALIVE_EXPIRY_S,
+                        )}},
+                    )
+                except Exception as e:
+                    logger.error("Failed to initialize Gemini Client: %s. Ensure API key is valid.", e)
+            return self._client
+
+    def warm_up(self):
+        self.get_client()
+
+    def is_available(self) -> bool:
+        return self.get_client() is not None
+
+    def create_cached_content(self, system_instruction: str, ttl_s: float) -> str:
+        cached_content = self.get_client().caches.create(
+            model=self.model,
+            config={
+                'system_instruction': system_instruction,
+                'ttl': f"{int(ttl_s)}s",
+                'display_name': 'ruby-system-instruction',
+            },
+        )
+        return cached_content.name
+
+    def delete_cached_content(self, cache_name: str):
+        self.get_client().caches.delete(name=cache_name)
+
+    def generate(self, prompt: "GeminiPrompt", config: dict) -> str:
+        response = self.get_client().models.generate_content(
+            model=self.model,
+            contents=prompt.contents,
+            config=config,
+        )
+
+        json_text = response.text
+        if not json_text:  # Fallback for some response structures
+            if response.candidates and response.candidates[0].content.parts:
+                json_text = response.candidates[0].content.parts[0].text
+            else:
+                raise ValueError("No text found in Gemini response.")
+        return json_text
+
+    def generate_stream(self, prompt: "GeminiPrompt", config: dict) -> Iterator[str]:
+        stream = self.get_client().models.generate_content_stream(
+            model=self.model,
+            contents=prompt.contents,
+            config=config,
+        )
+        try:
+            for chunk in stream:
+                if chunk.text:
+                    yield chunk.text
+        finally:
+            # 调用方提前关闭时关闭底层连接，服务端不再继续生成
+            close = getattr(stream, "close", None)
+            if close:
+                close()
+
+
+# 本地后端的回复素材：(short_dialogue, color_hex, frequency_hz, long_dialogue)
+_LOCAL_REPLIES = {
+    "poke_reaction": [
+        ("哎呀！", "#FFB6C1", 4.0, "哎呀，你干嘛戳我呀！吓了我一跳……不过，嘻嘻，也不是不可以啦。"),
+        ("嘻嘻！", "#FFFFE0", 5.5, "被你戳到啦~ 再戳一下试试？我可是会反击的哦！"),
+        ("哼！", "#FF0000", 6.0, "不许乱戳！……好啦好啦，我没有真的生气。"),
+    ],
+    "mood_query": [
+        ("还不错", "#FFFFE0", 3.0, "我现在心情还不错呀，和你聊天的时候心跳都变快了呢。"),
+        ("有点闷", "#800080", 1.2, "嗯……今天有点闷闷的，你陪我多说说话好不好？"),
+    ],
+    "chat": [
+        ("嗯嗯！", "#FFB6C1", 3.5, "你说的是“{text}”吗？我认真听着呢，再多告诉我一点吧！"),
+        ("明白啦！", "#FFFFE0", 4.5, "原来是“{text}”呀，我懂啦~ 你总是有好多有趣的想法。"),
+        ("嗯…", "#0000FF", 1.5, "“{text}”……让我想一想，这个问题好像有点难呢。"),
+    ],
+}
+
+
+class LocalBackend(GeminiBackend):
+    """离线的本地替身后端，用于压测和基准测试
+
+    返回符合 RubyResponse 结构的JSON，按延迟配置模拟首块延迟、分块间隔和错误注入。
+    随机数由种子和请求序号决定，同样的请求序列产生同样的延迟、错误和回复。
+    """
+
+    name = "local"
+
+    def __init__(self, profile: str = LOCAL_BACKEND_PROFILE, seed: int = LOCAL_BACKEND_SEED):
+        """
+        Args:
+            profile: LOCAL_BACKEND_PROFILES 中的延迟配置名
+            seed: 随机种子
+        """
+        if profile not in LOCAL_BACKEND_PROFILES:
+            raise ValueError(f"Unknown local backend profile: {profile}")
+        self.profile_name = profile
+        self.profile = LOCAL_BACKEND_PROFILES[profile]
+        self.seed = seed
+        self._request_count = 0
+        self._lock = threading.Lock()
+
+    def create_cached_content(self, system_instruction: str, ttl_s: float) -> str:
+        return "cachedContents/local"
+
+    def delete_cached_content(self, cache_name: str):
+        pass
+
+    def generate(self, prompt: "GeminiPrompt", config: dict) -> str:
+        rng = self._next_rng()
+        json_text = self._reply(prompt, rng)
+        self._maybe_fail(rng)
+        chunk_count = -(-len(json_text) // self.profile["chunk_chars"])
+        delay_ms = self._latency(rng, "first_chunk_ms")
+        delay_ms += sum(self._latency(rng, "chunk_interval_ms") for _ in range(chunk_count - 1))
+        time.sleep(delay_ms / 1000.0)
+        return json_text
+
+    def generate_stream(self, prompt: "GeminiPrompt", config: dict) -> Iterator[str]:
+        rng = self._next_rng()
+        json_text = self._reply(prompt, rng)
+        time.sleep(self._latency(rng, "first_chunk_ms") / 1000.0)
+        self._maybe_fail(rng)
+        size = self.profile["chunk_chars"]
+        for start in range(0, len(json_text), size):
+            if start:
+                time.sleep(self._latency(rng, "chunk_interval_ms") / 1000.0)
+            yield json_text[start:start + size]
+
+    def _next_rng(self) -> random.Random:
+        """为下一个请求创建独立的随机数生成器"""
+        with self._lock:
+            self._request_count += 1
+            return random.Random(self.seed * 1000003 + self._request_count)
+
+    def _latency(self, rng: random.Random, key: str) -> float:
+        """按对数正态分布 (中位数毫秒, sigma) 抽取一个延迟"""
+        median_ms, sigma = self.profile[key]
+        if median_ms <= 0:
+            return 0.0
+        return median_ms * rng.lognormvariate(0.0, sigma) if sigma > 0 else float(median_ms)
+
+    def _maybe_fail(self, rng: random.Random):
+        """按配置的错误率注入带状态码的错误，重试和熔断按与真实接口相同的规则处理"""
+        if rng.random() >= self.profile["error_rate"]:
+            return
+        raise BackendError(rng.choice(self.profile["error_codes"]), "Injected by local backend")
+
+    @staticmethod
+    def _reply(prompt: "GeminiPrompt", rng: random.Random) -> str:
+        """根据最后一轮用户内容选择一条回复，返回JSON文本"""
+        text = prompt.contents[-1]['parts'][0]['text'] if prompt.contents else ""
+        if "戳了你一下" in text:
+            interaction_type = "poke_reaction"
+        elif "心情" in text:
+            interaction_type = "mood_query"
+        else:
+            interaction_type = "chat"
+        user_text = text.rsplit("用户说：", 1)[-1].strip("'")[:20]
+        short_dialogue, color_hex, frequency_hz, long_dialogue = rng.choice(_LOCAL_REPLIES[interaction_type])
+        return json.dumps({
+            "short_dialogue": short_dialogue,
+            "color_hex": color_hex,
+            "frequency_hz": frequency_hz,
+            "long_dialogue": long_dialogue.format(text=user_text),
+        }, ensure_ascii=False)
+
+
+def create_backend(name: Optional[str] = None) -> GeminiBackend:
+    """创建后端，未指定时依次使用环境变量 RUBY_GEMINI_BACKEND 和 GEMINI_BACKEND
+
+    本地后端的延迟配置和随机种子可通过 RUBY_LOCAL_BACKEND_PROFILE 和 RUBY_LOCAL_BACKEND_SEED 覆盖。
+
+    Args:
+        name: genai 或 local
+
+    Returns:
+        后端实例
+    """
+    name = name or os.environ.get("RUBY_GEMINI_BACKEND") or GEMINI_BACKEND
+    if name == "local":
+        return LocalBackend(
+            profile=os.environ.get("RUBY_LOCAL_BACKEND_PROFILE", LOCAL_BACKEND_PROFILE),
+            seed=int(os.environ.get("RUBY_LOCAL_BACKEND_SEED", LOCAL_BACKEND_SEED)),
+        )
+    if name == "genai":
+        return GenaiBackend()
+    raise ValueError(f"Unknown Gemini backend: {name}")
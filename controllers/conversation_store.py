@@ -0,0 +1,175 @@
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+from utils.constants import (
+    CONVERSATION_DB_PATH, CONVERSATION_WRITE_BATCH_SIZE, CONVERSATION_FLUSH_INTERVAL_S
+)
+
+if TYPE_CHECKING:
+    from models.gemini_models import RubyResponse
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS exchanges (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    interaction_type TEXT NOT NULL,
+    user_entry TEXT NOT NULL,
+    short_dialogue TEXT NOT NULL,
+    long_dialogue TEXT NOT NULL,
+    color_hex TEXT NOT NULL,
+    frequency_hz REAL NOT NULL,
+    latency_ms REAL
+)
+"""
+_INSERT = (
+    "INSERT INTO exchanges (created_at, interaction_type, user_entry, short_dialogue, long_dialogue,"
+    " color_hex, frequency_hz, latency_ms) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+)
+_CLOSE = object()  # 写入线程的退出标记
+
+
+class ConversationStore:
+    """持久化的对话记录（SQLite WAL 模式）
+
+    写入由后台线程完成：append() 只把记录放进队列，后台线程把一批记录放在同一个事务中提交，
+    因此每批只触发一次 fsync，UI线程不会等待磁盘。启动时只需按主键倒序读取末尾几条，
+    读取耗时与历史总长度无关。
+    """
+
+    def __init__(self, path: str = CONVERSATION_DB_PATH, batch_size: int = CONVERSATION_WRITE_BATCH_SIZE,
+                 flush_interval_s: float = CONVERSATION_FLUSH_INTERVAL_S):
+        """
+        Args:
+            path: 数据库文件路径
+            batch_size: 单个事务最多提交的记录数
+            flush_interval_s: 收到第一条记录后最多等待多久再提交
+        """
+        self.path = path
+        self.batch_size = max(1, batch_size)
+        self.flush_interval_s = flush_interval_s
+        self.written = 0  # 已提交的记录数
+        self._queue: "queue.Queue" = queue.Queue()
+        self._reader: Optional[sqlite3.Connection] = None
+        self._writer: Optional[threading.Thread] = None
+        self._open()
+
+    def _open(self):
+        """创建数据库并启动写入线程，失败时只在内存中保留历史"""
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = self._connect()
+            connection.execute(_SCHEMA)
+            connection.commit()
+            self._reader = connection
+        except (OSError, sqlite3.Error) as e:
+            logger.warning("Conversation store unavailable, history will not be saved: %s", e)
+            return
+        self._writer = threading.Thread(target=self._write_loop, name="ConversationStoreWriter", daemon=True)
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        """打开一个 WAL 模式的连接（每个线程各自使用自己的连接）"""
+        connection = sqlite3.connect(self.path, timeout=5.0)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=FULL")  # 每次提交都落盘，提交次数由批量写入控制
+        return connection
+
+    @property
+    def available(self) -> bool:
+        """数据库是否可用"""
+        return self._writer is not None
+
+    def append(self, user_entry: str, interaction_type: str, ruby_data: "RubyResponse",
+               latency_ms: Optional[float] = None):
+        """异步追加一轮对话（不阻塞调用线程）
+
+        Args:
+            user_entry: 历史记录中的用户条目
+            interaction_type: 交互类型
+            ruby_data: Ruby的回复
+            latency_ms: 从发送请求到收到完整回复的耗时，缓存命中时可为None
+        """
+        if not self.available:
+            return
+        self._queue.put((
+            time.time(), interaction_type, user_entry,
+            ruby_data.short_dialogue, ruby_data.long_dialogue,
+            ruby_data.color_hex, ruby_data.frequency_hz, latency_ms,
+        ))
+
+    def load_tail(self, limit: int) -> List[Dict[str, str]]:
+        """读取最近的若干轮对话，按时间顺序返回
+
+        Args:
+            limit: 最多读取的轮数
+
+        Returns:
+            与 ChatHistoryManager.entries 相同格式的条目列表
+        """
+        if self._reader is None or limit <= 0:
+            return []
+        try:
+            rows = self._reader.execute(
+                "SELECT user_entry, long_dialogue, interaction_type FROM exchanges ORDER BY id DESC LIMIT ?",
+                (limit,)
+            ).fetchall()
+        except sqlite3.Error as e:
+            logger.error("Failed to load conversation history: %s", e)
+            return []
+        return [{"user": user, "ruby": ruby, "type": interaction_type} for user, ruby, interaction_type in reversed(rows)]
+
+    def close(self, timeout_s: float = 2.0):
+        """提交队列中剩余的记录并停止写入线程
+
+        Args:
+            timeout_s: 最多等待写入线程结束的时间
+        """
+        if self._writer is not None:
+            self._queue.put(_CLOSE)
+            self._writer.join(timeout_s)
+            if self._writer.is_alive():
+                logger.warning("Conversation store did not finish writing in time.")
+            self._writer = None
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+
+    def _write_loop(self):
+        """写入线程：攒够一批或等待超时后在一个事务中提交"""
+        try:
+            connection = self._connect()
+        except sqlite3.Error as e:
+            logger.error("Conversation store writer failed to start: %s", e)
+            return
+        closing = False
+        while not closing:
+            record = self._queue.get()
+            if record is _CLOSE:
+                break
+            batch = [record]
+            deadline = time.monotonic() + self.flush_interval_s
+            while len(batch) < self.batch_size:
+                try:
+                    record = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if record is _CLOSE:
+                    closing = True
+                    break
+                batch.append(record)
+            try:
+                with connection:
+                    connection.executemany(_INSERT, batch)
+                self.written += len(batch)
+            except sqlite3.Error as e:
+                logger.error("Failed to save %d conversation exchange(s): %s", len(batch), e)
+        connection.close()
@@ -0,0 +1,49 @@
+# 心跳声源：作为混音器的一路持续声源，声音与心形的脉动相位锁定
+from typing import Callable, Optional, Tuple
+
+import numpy as np
+
+from utils.constants import AUDIO_SAMPLE_RATE
+from utils.heartbeat_synth import HeartbeatSynth
+
+
+class HeartbeatAudio:
+    """程序化心跳声
+
+    注册到 AudioMixer 后，每次音频设备拉取采样时先用画面的脉动相位和输出缓冲中尚未播放的时长
+    校准合成器，因此频率变化时声音平滑跟随，不需要逐拍的定时器，也不会重新播放文件。
+    """
+
+    def __init__(self, phase_source: Callable[[], Tuple[float, float]], sample_rate: int = AUDIO_SAMPLE_RATE):
+        """
+        Args:
+            phase_source: 返回画面此刻的 (脉动相位（周期数）, 频率Hz)，例如 HeartWidget.pulse_phase
+            sample_rate: 采样率，与混音器一致
+        """
+        self.phase_source = phase_source
+        self.synth = HeartbeatSynth(sample_rate)
+        self.active = True
+
+    def suspend(self):
+        """静音（例如窗口不可见时），不再合成"""
+        self.active = False
+
+    def resume(self):
+        """恢复发声，合成器会在下次拉取时重新对齐画面相位"""
+        self.active = True
+
+    def __call__(self, frames: int, latency_s: float) -> Optional[np.ndarray]:
+        """混音器的声源接口：生成下一块采样
+
+        Args:
+            frames: 采样数
+            latency_s: 这一块要等多久才会被听到
+
+        Returns:
+            float32 采样，静音时返回None
+        """
+        if not self.active:
+            return None
+        phase, frequency_hz = self.phase_source()
+        self.synth.sync(phase, frequency_hz, latency_s)
+        return self.synth.render(frames)
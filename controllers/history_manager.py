@@ -0,0 +1,226 @@
+import logging
+import re
+from typing import Callable, Dict, List, Optional
+
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+from utils.constants import (
+    HISTORY_TOKEN_BUDGET, HISTORY_SUMMARY_TOKEN_BUDGET, HISTORY_SUMMARY_CLIP_CHARS
+)
+
+logger = logging.getLogger(__name__)
+
+# 中日韩字符及全角标点，大致每个字符一个token
+_CJK_CHARS = re.compile(r'[　-〿぀-ヿ㐀-䶿一-鿿가-힯＀-￯]')
+# 句末标点，用于截取第一句话
+_SENTENCE_END = re.compile(r'(?<=[。！？!?.…~])')
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算文本的token数：CJK字符每个计1，其余字符每4个计1
+
+    Args:
+        text: 文本
+
+    Returns:
+        估算的token数
+    """
+    if not text:
+        return 0
+    cjk = len(_CJK_CHARS.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def _clip(text: str, max_chars: int) -> str:
+    """截取第一句话，并限制最大长度"""
+    first = _SENTENCE_END.split(text.strip(), maxsplit=1)[0]
+    return first if len(first) <= max_chars else first[:max_chars] + "…"
+
+
+def summarize_turns(previous_summary: str, turns: List[Dict[str, str]]) -> str:
+    """默认的本地摘要：每轮对话保留双方的第一句话，超出摘要预算时丢弃最早的部分
+
+    Args:
+        previous_summary: 已有的滚动摘要
+        turns: 需要并入摘要的旧对话
+
+    Returns:
+        新的滚动摘要
+    """
+    lines = previous_summary.splitlines() if previous_summary else []
+    for turn in turns:
+        lines.append(f"用户：{_clip(turn['user'], HISTORY_SUMMARY_CLIP_CHARS)} / "
+                     f"Ruby：{_clip(turn['ruby'], HISTORY_SUMMARY_CLIP_CHARS)}")
+    while len(lines) > 1 and estimate_tokens("\n".join(lines)) > HISTORY_SUMMARY_TOKEN_BUDGET:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+class HistorySignals(QObject):
+    """信号类，用于把后台生成的摘要送回UI线程"""
+    summarized = pyqtSignal(int, str)  # (已并入摘要的最后一条序号, 新摘要)
+
+
+class _SummarizeWorker(QRunnable):
+    """在后台线程中把旧对话压缩进滚动摘要"""
+
+    def __init__(self, summarizer, previous_summary: str, turns: List[Dict[str, str]], last_seq: int):
+        super().__init__()
+        self.summarizer = summarizer
+        self.previous_summary = previous_summary
+        self.turns = turns
+        self.last_seq = last_seq
+        self.signals = HistorySignals()
+
+    def run(self):
+        try:
+            summary = self.summarizer(self.previous_summary, self.turns)
+        except Exception as e:
+            logger.warning("History summarization failed, using local summary: %s: %s", type(e).__name__, e)
+            summary = summarize_turns(self.previous_summary, self.turns)
+        self.signals.summarized.emit(self.last_seq, summary)
+
+
+class ChatHistoryManager:
+    """按token预算管理聊天历史
+
+    最近的对话原样保留；总量超出预算时，最早的对话在后台线程中被压缩进滚动摘要。
+    渲染后的多轮内容会被缓存，只在追加对话或摘要更新时重新生成。
+    """
+
+    def __init__(self, token_budget: int = HISTORY_TOKEN_BUDGET,
+                 summarizer: Callable[[str, List[Dict[str, str]]], str] = summarize_turns,
+                 threadpool: Optional[QThreadPool] = None):
+        """
+        Args:
+            token_budget: 原样保留的历史对话的token预算
+            summarizer: 摘要函数 (旧摘要, 旧对话列表) -> 新摘要，在后台线程中调用
+            threadpool: 执行摘要任务的线程池，默认使用全局线程池
+        """
+        self.token_budget = token_budget
+        self.summarizer = summarizer
+        self.threadpool = threadpool or QThreadPool.globalInstance()
+        self.entries: List[Dict[str, str]] = []
+        self.summary = ""
+        self._entry_tokens: List[int] = []
+        self._entry_seqs: List[int] = []
+        self._next_seq = 0
+        self._total_tokens = 0
+        self._pending_summary_seq: Optional[int] = None  # 进行中的摘要任务覆盖到的最后序号
+        self._rendered: Optional[List[dict]] = None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __bool__(self):
+        return bool(self.entries) or bool(self.summary)
+
+    @property
+    def total_tokens(self) -> int:
+        """原样保留的历史对话的估算token数"""
+        return self._total_tokens
+
+    def append(self, user: str, ruby: str, interaction_type: str = "chat"):
+        """追加一轮对话，超出预算时在后台压缩旧对话
+
+        Args:
+            user: 历史记录中的用户条目
+            ruby: Ruby的长对话回复
+            interaction_type: 交互类型
+        """
+        tokens = estimate_tokens(user) + estimate_tokens(ruby)
+        self.entries.append({"user": user, "ruby": ruby, "type": interaction_type})
+        self._entry_tokens.append(tokens)
+        self._entry_seqs.append(self._next_seq)
+        self._next_seq += 1
+        self._total_tokens += tokens
+        self._rendered = None
+        self._maybe_summarize()
+
+    def restore(self, entries: List[Dict[str, str]]):
+        """用持久化的历史初始化，只保留token预算内最近的对话
+
+        Args:
+            entries: 按时间顺序排列的历史条目 (user/ruby/type)
+        """
+        self.clear()
+        kept = []
+        total = 0
+        for entry in reversed(entries):
+            tokens = estimate_tokens(entry["user"]) + estimate_tokens(entry["ruby"])
+            if kept and total + tokens > self.token_budget:
+                break
+            kept.append((entry, tokens))
+            total += tokens
+        for entry, tokens in reversed(kept):
+            self.entries.append({"user": entry["user"], "ruby": entry["ruby"], "type": entry.get("type", "chat")})
+            self._entry_tokens.append(tokens)
+            self._entry_seqs.append(self._next_seq)
+            self._next_seq += 1
+        self._total_tokens = total
+
+    def render_contents(self) -> List[dict]:
+        """渲染为Gemini多轮内容（带缓存）
+
+        滚动摘要作为第一轮用户内容的前缀。
+
+        Returns:
+            交替的 user/model 内容列表（调用方不应修改）
+        """
+        if self._rendered is None:
+            contents = []
+            for entry in self.entries:
+                contents.append({'role': 'user', 'parts': [{'text': entry['user']}]})
+                contents.append({'role': 'model', 'parts': [{'text': entry['ruby']}]})
+            if self.summary and contents:
+                contents[0] = {'role': 'user', 'parts': [{'text': self.summary_preamble() + contents[0]['parts'][0]['text']}]}
+            self._rendered = contents
+        return self._rendered
+
+    def summary_preamble(self) -> str:
+        """返回滚动摘要的提示前缀，没有摘要时为空字符串"""
+        if not self.summary:
+            return ""
+        return f"（更早之前我们的互动摘要：\n{self.summary}）\n"
+
+    def clear(self):
+        """清空历史和摘要"""
+        self.entries.clear()
+        self._entry_tokens.clear()
+        self._entry_seqs.clear()
+        self._total_tokens = 0
+        self.summary = ""
+        self._pending_summary_seq = None  # 丢弃进行中的摘要结果
+        self._rendered = None
+
+    def _maybe_summarize(self):
+        """历史超出预算且没有进行中的摘要任务时，启动后台摘要"""
+        if self._pending_summary_seq is not None or self._total_tokens <= self.token_budget:
+            return
+        # 从最早的对话开始压缩，直到剩余部分回到预算以内
+        remaining = self._total_tokens
+        count = 0
+        while count < len(self.entries) and remaining > self.token_budget:
+            remaining -= self._entry_tokens[count]
+            count += 1
+        turns = [dict(entry) for entry in self.entries[:count]]
+        self._pending_summary_seq = self._entry_seqs[count - 1]
+        worker = _SummarizeWorker(self.summarizer, self.summary, turns, self._pending_summary_seq)
+        worker.signals.summarized.connect(self._apply_summary)
+        self.threadpool.start(worker)
+
+    def _apply_summary(self, last_seq: int, summary: str):
+        """在UI线程中用新摘要替换已压缩的对话"""
+        if last_seq != self._pending_summary_seq:
+            return  # 历史已被清空，结果作废
+        self._pending_summary_seq = None
+        count = 0
+        while count < len(self._entry_seqs) and self._entry_seqs[count] <= last_seq:
+            count += 1
+        del self.entries[:count]
+        self._total_tokens -= sum(self._entry_tokens[:count])
+        del self._entry_tokens[:count]
+        del self._entry_seqs[:count]
+        self.summary = summary
+        self._rendered = None
+        self._maybe_summarize()
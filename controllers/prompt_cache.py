@@ -0,0 +1,121 @@
+import logging
+import threading
+import time
+from typing import Optional
+
+from controllers.history_manager import estimate_tokens
+from utils.constants import (
+    GEMINI_MODEL_NAME, GEMINI_CONTEXT_CACHE_TTL_S, GEMINI_CONTEXT_CACHE_REFRESH_MARGIN_S,
+    GEMINI_CONTEXT_CACHE_RETRY_S, GEMINI_CONTEXT_CACHE_MIN_TOKENS
+)
+
+logger = logging.getLogger(__name__)
+
+
+def context_cache_min_tokens(model: str) -> int:
+    """返回模型的显式上下文缓存最小token数（最长的前缀匹配优先）"""
+    matches = [prefix for prefix in GEMINI_CONTEXT_CACHE_MIN_TOKENS if prefix != "default" and model.startswith(prefix)]
+    if not matches:
+        return GEMINI_CONTEXT_CACHE_MIN_TOKENS["default"]
+    return GEMINI_CONTEXT_CACHE_MIN_TOKENS[max(matches, key=len)]
+
+
+class SystemInstructionCache:
+    """将静态的系统指令（规则和人设）注册为Gemini上下文缓存，并在过期前续建
+
+    注册是阻塞的网络调用，只在后台线程中通过 refresh() 执行（启动预热和过期前的续建），
+    请求路径上的 request_config() 只读取当前状态。缓存不可用时（系统指令低于模型的最小长度、
+    注册失败且尚未到重试时间、或正在注册）请求直接携带系统指令。可在多个线程中同时使用。
+    """
+
+    def __init__(self, system_instruction: str, backend, ttl_s: float = GEMINI_CONTEXT_CACHE_TTL_S,
+                 min_tokens: Optional[int] = None):
+        """
+        Args:
+            system_instruction: 系统指令文本
+            backend: 负责注册和删除缓存的 GeminiBackend
+            ttl_s: 缓存有效期
+            min_tokens: 模型允许缓存的最小token数，默认按后端的模型查表
+        """
+        self.system_instruction = system_instruction
+        self.backend = backend
+        self.ttl_s = ttl_s
+        if min_tokens is None:
+            min_tokens = context_cache_min_tokens(getattr(backend, "model", GEMINI_MODEL_NAME))
+        tokens = estimate_tokens(system_instruction)
+        self.supported = tokens >= min_tokens
+        if not self.supported:
+            logger.info("System instruction (~%d tokens) is below the %d-token context caching minimum; "
+                        "sending it inline", tokens, min_tokens)
+        self._lock = threading.Lock()
+        self._cache_name: Optional[str] = None
+        self._expires_at = 0.0
+        self._retry_after = 0.0
+        self._refreshing = False
+
+    def request_config(self) -> dict:
+        """返回请求配置中与系统指令相关的部分（不会发出网络请求）
+
+        Returns:
+            {'cached_content': 缓存名} 或 {'system_instruction': 系统指令文本}
+        """
+        with self._lock:
+            if self._cache_name and time.monotonic() < self._expires_at:
+                return {'cached_content': self._cache_name}
+        return {'system_instruction': self.system_instruction}
+
+    def needs_refresh(self) -> bool:
+        """是否应该在后台调用 refresh()"""
+        with self._lock:
+            return self._needs_refresh(time.monotonic())
+
+    def _needs_refresh(self, now: float) -> bool:
+        if not self.supported or self._refreshing or now < self._retry_after:
+            return False
+        return self._cache_name is None or now >= self._expires_at - GEMINI_CONTEXT_CACHE_REFRESH_MARGIN_S
+
+    def refresh(self) -> bool:
+        """需要时注册新缓存并删除被替换的旧缓存（阻塞，在后台线程中调用）
+
+        Returns:
+            是否注册了新缓存
+        """
+        with self._lock:
+            if not self._needs_refresh(time.monotonic()):
+                return False
+            self._refreshing = True
+            old_cache_name = self._cache_name
+        try:
+            cache_name = self.backend.create_cached_content(self.system_instruction, self.ttl_s)
+        except Exception as e:
+            logger.warning("Context caching unavailable, sending system instruction inline: %s: %s",
+                           type(e).__name__, e)
+            with self._lock:
+                self._refreshing = False
+                self._retry_after = time.monotonic() + GEMINI_CONTEXT_CACHE_RETRY_S
+            return False
+        with self._lock:
+            self._refreshing = False
+            self._cache_name = cache_name
+            self._expires_at = time.monotonic() + self.ttl_s
+        if old_cache_name and old_cache_name != cache_name:
+            self._delete(old_cache_name)
+        return True
+
+    def invalidate(self, cache_name: Optional[str] = None):
+        """缓存在服务端已不存在（过期或被删除）时调用，之后的请求直接携带系统指令直到重新注册
+
+        Args:
+            cache_name: 只有当前缓存名与之相同时才失效，None 表示无条件失效
+        """
+        with self._lock:
+            if cache_name is None or cache_name == self._cache_name:
+                self._cache_name = None
+                self._expires_at = 0.0
+
+    def _delete(self, cache_name: str):
+        """删除不再使用的服务端缓存（失败时只记录日志，缓存会在有效期后自动过期）"""
+        try:
+            self.backend.delete_cached_content(cache_name)
+        except Exception as e:
+            logger.warning("Could not delete context cache %s: %s: %s", cache_name, type(e).__name__, e)
@@ -0,0 +1,107 @@
+import threading
+import time
+from typing import TYPE_CHECKING
+
+from controllers.history_manager import estimate_tokens
+from utils.constants import (
+    GEMINI_RATE_LIMIT_RPM, GEMINI_RATE_LIMIT_TPM, GEMINI_RATE_LIMIT_RESERVE,
+    GEMINI_EXPECTED_OUTPUT_TOKENS
+)
+
+if TYPE_CHECKING:
+    from models.gemini_models import GeminiPrompt
+
+
+def estimate_prompt_tokens(prompt: "GeminiPrompt") -> int:
+    """估算一次请求消耗的token数（系统指令 + 多轮内容 + 预期输出）
+
+    Args:
+        prompt: 请求的提示
+
+    Returns:
+        估算的token数
+    """
+    total = estimate_tokens(prompt.system_instruction) + GEMINI_EXPECTED_OUTPUT_TOKENS
+    for content in prompt.contents:
+        for part in content.get('parts', ()):
+            total += estimate_tokens(part.get('text', ''))
+    return total
+
+
+class TokenBucket:
+    """令牌桶：容量为每分钟的配额，按配额/60的速率匀速补充（不加锁，由 RateLimiter 保护）"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = max(1.0, float(per_minute))
+        self.refill_per_s = self.capacity / 60.0
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def refill(self, now: float):
+        """按流逝的时间补充令牌"""
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.refill_per_s)
+        self._updated = now
+
+    def wait_time(self, amount: float, reserve: float = 0.0) -> float:
+        """返回需要等待多久才能取出 amount 个令牌，并在桶中至少剩下 reserve 比例的容量
+
+        Args:
+            amount: 需要的令牌数（超过容量时按容量计算，避免永远无法满足）
+            reserve: 取出后需要保留的容量比例
+
+        Returns:
+            等待秒数，0 表示现在就可以取出
+        """
+        amount = min(amount, self.capacity)
+        needed = min(self.capacity, amount + self.capacity * reserve)
+        if self.tokens >= needed:
+            return 0.0
+        return (needed - self.tokens) / self.refill_per_s
+
+    def take(self, amount: float):
+        """取出令牌"""
+        self.tokens -= min(amount, self.capacity)
+
+
+class RateLimiter:
+    """客户端限流：同时限制每分钟请求数和每分钟token数
+
+    低优先级的自动请求（戳一戳、询问心情、预取）只能使用扣除保留部分后的配额，
+    保证用户主动聊天在配额紧张时仍能优先发出。可在多个工作线程中同时使用。
+    """
+
+    def __init__(self, requests_per_minute: float = GEMINI_RATE_LIMIT_RPM,
+                 tokens_per_minute: float = GEMINI_RATE_LIMIT_TPM,
+                 low_priority_reserve: float = GEMINI_RATE_LIMIT_RESERVE):
+        """
+        Args:
+            requests_per_minute: 每分钟最多请求数
+            tokens_per_minute: 每分钟最多token数
+            low_priority_reserve: 为高优先级请求保留的配额比例
+        """
+        self.low_priority_reserve = low_priority_reserve
+        self._requests = TokenBucket(requests_per_minute)
+        self._tokens = TokenBucket(tokens_per_minute)
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int, high_priority: bool = True) -> float:
+        """尝试为一次请求取得配额
+
+        Args:
+            tokens: 本次请求估算的token数
+            high_priority: 是否可以使用保留的配额
+
+        Returns:
+            0 表示已取得配额；否则为建议的等待秒数（此时不消耗配额）
+        """
+        reserve = 0.0 if high_priority else self.low_priority_reserve
+        with self._lock:
+            now = time.monotonic()
+            self._requests.refill(now)
+            self._tokens.refill(now)
+            wait = max(self._requests.wait_time(1, reserve), self._tokens.wait_time(tokens, reserve))
+            if wait > 0:
+                return wait
+            self._requests.take(1)
+            self._tokens.take(tokens)
+            return 0.0
@@ -0,0 +1,188 @@
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional
+
+from utils.constants import (
+    GEMINI_RETRYABLE_STATUS_CODES, GEMINI_BACKOFF_BASE_S, GEMINI_BACKOFF_MAX_S,
+    CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_TIMEOUT_S
+)
+
+
+class RequestTimeout(Exception):
+    """请求在规定时间内没有完成"""
+
+
+class BackendError(Exception):
+    """后端返回的带HTTP状态码的错误，不依赖 SDK 的错误类型（例如离线后端注入的错误）"""
+
+    def __init__(self, code: int, message: str = ""):
+        super().__init__(f"{code} {message}".strip())
+        self.code = code
+        self.message = message
+
+
+def error_status_code(error: Exception) -> Optional[int]:
+    """返回错误携带的HTTP状态码，没有时返回None
+
+    SDK 的错误类型只在 SDK 已经加载时才检查：没有加载就不可能抛出 SDK 的错误，
+    因此离线后端和没有安装 SDK 的环境不会因为错误分类而导入 SDK。
+    """
+    if isinstance(error, BackendError):
+        return error.code
+    genai_errors = sys.modules.get("google.genai.errors")
+    if genai_errors is not None and isinstance(error, genai_errors.APIError):
+        return error.code
+    return None
+
+
+def is_retryable(error: Exception) -> bool:
+    """判断错误是否是暂时性的（限流、服务端错误、超时或网络故障），可以重试
+
+    Args:
+        error: 请求抛出的异常
+
+    Returns:
+        是否可以重试
+    """
+    code = error_status_code(error)
+    if code is not None:
+        return code in GEMINI_RETRYABLE_STATUS_CODES
+    if isinstance(error, (RequestTimeout, TimeoutError, ConnectionError)):
+        return True
+    httpx = sys.modules.get("httpx")
+    return httpx is not None and isinstance(error, (httpx.TimeoutException, httpx.TransportError))
+
+
+def is_cache_missing(error: Exception) -> bool:
+    """判断错误是否表示请求引用的上下文缓存已不存在（过期或被删除）
+
+    只有错误信息指向 cachedContents 资源时才算；其他 404（例如模型名错误）按普通客户端错误处理，直接失败。
+    """
+    code = error_status_code(error)
+    return code in (400, 403, 404) and "cachedcontent" in str(error).lower().replace(" ", "")
+
+
+def is_timeout(error: Exception) -> bool:
+    """判断错误是否是超时"""
+    if isinstance(error, (RequestTimeout, TimeoutError)):
+        return True
+    httpx = sys.modules.get("httpx")
+    return httpx is not None and isinstance(error, httpx.TimeoutException)
+
+
+def backoff_delay(attempt: int, base_s: float = GEMINI_BACKOFF_BASE_S, max_s: float = GEMINI_BACKOFF_MAX_S) -> float:
+    """带完全抖动的指数退避时间
+
+    Args:
+        attempt: 已失败的次数（从0开始）
+        base_s: 首次退避的上限
+        max_s: 退避时间的上限
+
+    Returns:
+        [0, min(max_s, base_s * 2^attempt)) 内的随机等待秒数
+    """
+    return random.uniform(0, min(max_s, base_s * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """熔断器，在接口持续失败时快速失败，避免继续冲击不健康的服务
+
+    closed     正常放行，连续失败达到阈值后打开
+    open       直接拒绝，经过 reset_timeout_s 后进入半开
+    half_open  只放行一个探测请求，成功则关闭，失败则重新打开
+    可在多个工作线程中同时使用。
+    """
+
+    def __init__(self, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+                 reset_timeout_s: float = CIRCUIT_RESET_TIMEOUT_S):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout_s = reset_timeout_s
+        self._lock = threading.Lock()
+        self._state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        """当前状态 closed/open/half_open（open 状态超时后视为 half_open）"""
+        with self._lock:
+            if self._state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout_s:
+                return "half_open"
+            return self._state
+
+    def retry_after(self) -> float:
+        """距离允许下一次探测还有多少秒"""
+        with self._lock:
+            if self._state != "open":
+                return 0.0
+            return max(0.0, self.reset_timeout_s - (time.monotonic() - self._opened_at))
+
+    def allow_request(self) -> bool:
+        """申请发出一次请求，半开状态下只有第一个申请者成为探测请求
+
+        Returns:
+            是否允许发出请求
+        """
+        with self._lock:
+            if self._state == "open":
+                if time.monotonic() - self._opened_at < self.reset_timeout_s:
+                    return False
+                self._state = "half_open"
+                self._probe_in_flight = False
+            if self._state == "half_open":
+                if self._probe_in_flight:
+                    return False
+                self._probe_in_flight = True
+            return True
+
+    def record_success(self):
+        """记录一次成功，关闭熔断器"""
+        with self._lock:
+            self._state = "closed"
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        """记录一次失败，达到阈值或探测失败时打开熔断器"""
+        with self._lock:
+            self._failures += 1
+            if self._state == "half_open" or self._failures >= self.failure_threshold:
+                self._state = "open"
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+    def release_probe(self):
+        """探测请求既没有成功也没有失败（例如被取消）时，允许下一个请求重新探测"""
+        with self._lock:
+            self._probe_in_flight = False
+
+
+class ResilienceStats:
+    """各类请求结果的计数器（线程安全）
+
+    计数项：attempts 实际发出的请求次数、successes 成功、retries 重试、
+    timeouts 超时、failures 最终失败、short_circuited 被熔断器拒绝、fallbacks 以缓存回复代替、
+    rate_limited 因客户端限流而等待
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Counter = Counter()
+
+    def increment(self, name: str, amount: int = 1):
+        """增加某项计数"""
+        with self._lock:
+            self._counts[name] += amount
+
+    def snapshot(self) -> Dict[str, int]:
+        """返回当前所有计数的副本"""
+        with self._lock:
+            return dict(self._counts)
+
+    def __getitem__(self, name: str) -> int:
+        with self._lock:
+            return self._counts[name]
@@ -0,0 +1,158 @@
+# 资源引导：按清单在后台线程中一次性检查和补齐资源文件，并把声音解码为PCM交给声音控制器
+import logging
+import os
+import struct
+import wave
+from typing import Dict, Optional
+
+import numpy as np
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+from controllers.sound_controller import SoundController, decode_wav
+from utils.constants import AUDIO_SAMPLE_RATE, SOUND_DIR, SOUND_MANIFEST
+
+logger = logging.getLogger(__name__)
+
+_PLACEHOLDER_SAMPLE_RATE = 44100
+
+
+def placeholder_wav() -> bytes:
+    """返回一个不含采样数据的最小有效WAV文件（单声道16位PCM）"""
+    channels, bits = 1, 16
+    block_align = channels * bits // 8
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 36, b"WAVE",
+        b"fmt ", 16, 1, channels, _PLACEHOLDER_SAMPLE_RATE, _PLACEHOLDER_SAMPLE_RATE * block_align, block_align, bits,
+        b"data", 0,
+    )
+
+
+def _is_wav(path: str) -> bool:
+    """文件是否以RIFF/WAVE头开始"""
+    try:
+        with open(path, "rb") as f:
+            header = f.read(12)
+    except OSError:
+        return False
+    return len(header) == 12 and header[:4] == b"RIFF" and header[8:] == b"WAVE"
+
+
+def ensure_sound_files(sound_dir: str = SOUND_DIR,
+                       manifest: Dict[str, str] = SOUND_MANIFEST) -> Dict[str, Optional[str]]:
+    """按清单检查声音文件，缺失的写入静音占位文件
+
+    目录只列举一次；已有文件只读取文件头校验格式，不会被覆盖。
+
+    Args:
+        sound_dir: 声音文件目录
+        manifest: 声音名 -> 文件名
+
+    Returns:
+        声音名 -> 可加载的文件路径，无法使用时为None
+    """
+    paths: Dict[str, Optional[str]] = {}
+    try:
+        os.makedirs(sound_dir, exist_ok=True)
+        with os.scandir(sound_dir) as entries:
+            existing = {entry.name for entry in entries if entry.is_file()}
+    except OSError as e:
+        logger.warning("Sound directory %s is unavailable: %s", sound_dir, e)
+        return dict.fromkeys(manifest)
+
+    placeholder = None
+    for name, filename in manifest.items():
+        path = os.path.join(sound_dir, filename)
+        if filename in existing:
+            if _is_wav(path):
+                paths[name] = path
+            else:
+                logger.warning("Sound file %s is not a valid WAV file; '%s' will be silent", path, name)
+                paths[name] = None
+            continue
+        placeholder = placeholder or placeholder_wav()
+        try:
+            with open(path, "wb") as f:
+                f.write(placeholder)
+        except OSError as e:
+            logger.warning("Could not create placeholder sound file %s: %s", path, e)
+            paths[name] = None
+            continue
+        logger.info("Created placeholder sound file: %s", path)
+        paths[name] = path
+    return paths
+
+
+def decode_sounds(sound_paths: Dict[str, Optional[str]],
+                  sample_rate: int = AUDIO_SAMPLE_RATE) -> Dict[str, Optional[np.ndarray]]:
+    """把声音文件解码为内存中的PCM
+
+    Args:
+        sound_paths: 声音名 -> 文件路径，None 表示不可用
+        sample_rate: 混音器的采样率
+
+    Returns:
+        声音名 -> 采样，无法解码时为None
+    """
+    buffers: Dict[str, Optional[np.ndarray]] = {}
+    for name, path in sound_paths.items():
+        buffers[name] = None
+        if path is None:
+            continue
+        try:
+            buffers[name] = decode_wav(path, sample_rate)
+        except (OSError, EOFError, wave.Error) as e:
+            logger.warning("Could not decode sound '%s' from %s: %s", name, path, e)
+    return buffers
+
+
+class ResourceSignals(QObject):
+    """信号类，用于把后台检查和解码的结果送回UI线程"""
+    sounds_loaded = pyqtSignal(dict)  # {声音名: 采样或None}
+
+
+class _SoundLoader(QRunnable):
+    """在后台线程中检查、补齐并解码声音文件"""
+
+    def __init__(self, sound_dir: str, manifest: Dict[str, str], sample_rate: int):
+        super().__init__()
+        self.sound_dir = sound_dir
+        self.manifest = manifest
+        self.sample_rate = sample_rate
+        self.signals = ResourceSignals()
+
+    def run(self):
+        paths = ensure_sound_files(self.sound_dir, self.manifest)
+        self.signals.sounds_loaded.emit(decode_sounds(paths, self.sample_rate))
+
+
+class ResourceBootstrap:
+    """启动后在后台准备资源：文件检查和解码都放在线程池中
+
+    启动流程因此不需要等待磁盘或解码；资源就绪之前，声音控制器会静默跳过播放。
+    """
+
+    def __init__(self, sound_controller: SoundController, sound_dir: str = SOUND_DIR,
+                 manifest: Dict[str, str] = SOUND_MANIFEST, threadpool: Optional[QThreadPool] = None):
+        """
+        Args:
+            sound_controller: 接收解码结果的声音控制器
+            sound_dir: 声音文件目录
+            manifest: 声音名 -> 文件名
+            threadpool: 执行文件检查和解码的线程池，默认使用全局线程池
+        """
+        self.sound_controller = sound_controller
+        self.sound_dir = sound_dir
+        self.manifest = manifest
+        self.threadpool = threadpool or QThreadPool.globalInstance()
+        self.started = False
+
+    def start(self):
+        """开始后台检查（只执行一次）"""
+        if self.started:
+            return
+        self.started = True
+        self.sound_controller.expect_sounds(self.manifest)
+        worker = _SoundLoader(self.sound_dir, self.manifest, self.sound_controller.sample_rate)
+        worker.signals.sounds_loaded.connect(self.sound_controller.load_sounds)
+        self.threadpool.start(worker)
@@ -0,0 +1,136 @@
+import hashlib
+import time
+from collections import OrderedDict, deque
+from typing import TYPE_CHECKING, Deque, Dict, List, Optional, Tuple
+
+from utils.constants import (
+    RESPONSE_CACHE_POOL_SIZE, RESPONSE_CACHE_TTL_S,
+    RESPONSE_CACHE_MAX_KEYS, RESPONSE_CACHE_HISTORY_WINDOW
+)
+
+if TYPE_CHECKING:
+    from models.gemini_models import RubyResponse
+
+CacheKey = Tuple[str, str]
+
+
+class ResponseCache:
+    """为戳一戳、询问心情等提示几乎不变的交互预取并缓存多条不同的Ruby回复
+
+    每个键（交互类型 + 最近聊天历史窗口的哈希）对应一个回复池，取出即消耗，
+    条目超过TTL后失效，键的数量超过上限时按LRU淘汰。只在UI线程中使用，无需加锁。
+    """
+
+    def __init__(self, pool_size: int = RESPONSE_CACHE_POOL_SIZE, ttl_s: float = RESPONSE_CACHE_TTL_S,
+                 max_keys: int = RESPONSE_CACHE_MAX_KEYS, history_window: int = RESPONSE_CACHE_HISTORY_WINDOW):
+        self.pool_size = pool_size
+        self.ttl_s = ttl_s
+        self.max_keys = max(1, max_keys)
+        self.history_window = history_window
+        self._pools: "OrderedDict[CacheKey, Deque[Tuple[float, RubyResponse]]]" = OrderedDict()
+        self._in_flight: Dict[CacheKey, int] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def make_key(self, interaction_type: str, chat_history: Optional[List[Dict[str, str]]]) -> CacheKey:
+        """生成缓存键
+
+        只有用户主动聊天的条目会影响键，戳一戳和询问心情本身的回复不会让缓存失效。
+
+        Args:
+            interaction_type: 交互类型
+            chat_history: 聊天历史记录
+
+        Returns:
+            缓存键
+        """
+        chat_entries = [e for e in (chat_history or []) if e.get("type", "chat") == "chat"]
+        window = chat_entries[-self.history_window:] if self.history_window > 0 else []
+        digest = hashlib.sha1()
+        for entry in window:
+            digest.update(entry["user"].encode("utf-8"))
+            digest.update(b"\0")
+            digest.update(entry["ruby"].encode("utf-8"))
+            digest.update(b"\0")
+        return interaction_type, digest.hexdigest()
+
+    def take(self, key: CacheKey) -> Optional["RubyResponse"]:
+        """取出一条未过期的缓存回复（取出后即从池中移除）
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            缓存的回复，没有可用回复时返回None
+        """
+        pool = self._pools.get(key)
+        if pool is not None:
+            self._pools.move_to_end(key)
+            self._expire(pool)
+            if pool:
+                self.hits += 1
+                return pool.popleft()[1]
+        self.misses += 1
+        return None
+
+    def take_any(self, interaction_type: str) -> Optional["RubyResponse"]:
+        """取出该交互类型任意键下最近使用的一条未过期回复（不计入命中统计），用于接口不可用时的降级
+
+        Args:
+            interaction_type: 交互类型
+
+        Returns:
+            缓存的回复，没有可用回复时返回None
+        """
+        for key in reversed(self._pools):
+            if key[0] != interaction_type:
+                continue
+            pool = self._pools[key]
+            self._expire(pool)
+            if pool:
+                return pool.popleft()[1]
+        return None
+
+    def put(self, key: CacheKey, response: "RubyResponse"):
+        """放入一条预取的回复
+
+        Args:
+            key: 缓存键
+            response: Ruby回复
+        """
+        pool = self._pools.get(key)
+        if pool is None:
+            pool = self._pools[key] = deque()
+            if len(self._pools) > self.max_keys:
+                self._pools.popitem(last=False)  # 淘汰最久未使用的键
+        else:
+            self._pools.move_to_end(key)
+        self._expire(pool)
+        if len(pool) < self.pool_size:
+            pool.append((time.monotonic(), response))
+
+    def missing_count(self, key: CacheKey) -> int:
+        """返回该键还需要预取多少条回复才能填满（已计入正在进行的预取）"""
+        pool = self._pools.get(key)
+        if pool is not None:
+            self._expire(pool)
+        available = len(pool) if pool is not None else 0
+        return max(0, self.pool_size - available - self._in_flight.get(key, 0))
+
+    def mark_in_flight(self, key: CacheKey, delta: int):
+        """记录该键正在进行的预取请求数的变化"""
+        count = self._in_flight.get(key, 0) + delta
+        if count > 0:
+            self._in_flight[key] = count
+        else:
+            self._in_flight.pop(key, None)
+
+    def clear(self):
+        """清空缓存"""
+        self._pools.clear()
+
+    def _expire(self, pool: Deque[Tuple[float, "RubyResponse"]]):
+        """移除池中已过期的回复"""
+        deadline = time.monotonic() - self.ttl_s
+        while pool and pool[0][0] < deadline:
+            pool.popleft()
@@ -1,73 +1,298 @@
-from PyQt5.QtMultimedia import QSoundEffect
-from PyQt5.QtCore import QUrl
-import os
+from PyQt5.QtMultimedia import QAudio, QAudioDeviceInfo, QAudioFormat, QAudioOutput
+from PyQt5.QtCore import QIODevice
+import logging
+import threading
+import wave
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from utils.constants import AUDIO_SAMPLE_RATE, AUDIO_BUFFER_MS, SOUND_DEFAULT_VOLUME, SOUND_MAX_VOICES
+
+logger = logging.getLogger(__name__)
+
+# 声音加载状态
+SOUND_PENDING = "pending"    # 等待后台检查和解码
+SOUND_READY = "ready"
+SOUND_MISSING = "missing"    # 文件缺失、无效或无法解码
+
+_BYTES_PER_FRAME = 2  # 单声道16位
+_SAMPLE_SCALE = {1: 128.0, 2: 32768.0, 4: 2147483648.0}
+_SAMPLE_DTYPE = {1: np.uint8, 2: "<i2", 4: "<i4"}
+
+
+def decode_wav(path: str, sample_rate: int = AUDIO_SAMPLE_RATE) -> np.ndarray:
+    """把PCM WAV文件解码为单声道 float32 采样，并重采样到 sample_rate
+
+    Args:
+        path: 文件路径
+        sample_rate: 目标采样率
+
+    Returns:
+        -1 到 1 之间的采样
+
+    Raises:
+        wave.Error, OSError: 文件无法读取或不是支持的PCM格式（8/16/32位）
+    """
+    with wave.open(path, "rb") as f:
+        channels, width, rate = f.getnchannels(), f.getsampwidth(), f.getframerate()
+        raw = f.readframes(f.getnframes())
+    if width not in _SAMPLE_DTYPE:
+        raise wave.Error(f"unsupported sample width: {width * 8} bits")
+    samples = np.frombuffer(raw, dtype=_SAMPLE_DTYPE[width]).astype(np.float32)
+    if width == 1:
+        samples -= 128.0  # 8位WAV是无符号的
+    samples /= _SAMPLE_SCALE[width]
+    if channels > 1:
+        samples = samples[:len(samples) - len(samples) % channels].reshape(-1, channels).mean(axis=1)
+    if rate != sample_rate and len(samples) > 1:
+        count = int(round(len(samples) * sample_rate / rate))
+        samples = np.interp(np.arange(count) * (rate / sample_rate), np.arange(len(samples)), samples)
+    return np.ascontiguousarray(samples, dtype=np.float32)
+
+
+class _Voice:
+    """一个正在播放的音效"""
+    __slots__ = ("name", "buffer", "position", "gain")
+
+    def __init__(self, name: str, buffer: np.ndarray, gain: float):
+        self.name = name
+        self.buffer = buffer
+        self.position = 0
+        self.gain = gain
+
+
+class AudioMixer:
+    """把多路音效和持续声源混合成一路 int16 单声道流
+
+    音效（play）各自有独立的音量，播放完自动移除；同时播放的音效超过 max_voices 时，
+    停止最早开始的那个。持续声源（add_source，例如程序化心跳）每块调用一次，
+    不计入音效上限。play 在UI线程中调用，render 由音频设备拉取，两者可以在不同线程。
+    """
+
+    def __init__(self, sample_rate: int = AUDIO_SAMPLE_RATE, max_voices: int = SOUND_MAX_VOICES):
+        self.sample_rate = sample_rate
+        self.max_voices = max(1, max_voices)
+        self.voices: List[_Voice] = []  # 按开始时间排序
+        self.sources: List[Callable[[int, float], Optional[np.ndarray]]] = []
+        self.stolen = 0  # 被抢占的音效数
+        self._lock = threading.Lock()
+
+    def play(self, name: str, buffer: np.ndarray, gain: float):
+        """开始播放一个音效
+
+        Args:
+            name: 音效名（仅用于调试）
+            buffer: decode_wav 得到的采样
+            gain: 本次播放的音量
+        """
+        if len(buffer) == 0 or gain <= 0:
+            return
+        with self._lock:
+            if len(self.voices) >= self.max_voices:
+                del self.voices[0]
+                self.stolen += 1
+            self.voices.append(_Voice(name, buffer, gain))
+
+    def add_source(self, source: Callable[[int, float], Optional[np.ndarray]]):
+        """添加持续声源
+
+        Args:
+            source: (采样数, 输出延迟秒) -> float32 采样；返回None表示本块静音
+        """
+        self.sources.append(source)
+
+    def stop_all(self):
+        """停止所有音效"""
+        with self._lock:
+            self.voices.clear()
+
+    def render(self, frames: int, latency_s: float = 0.0) -> np.ndarray:
+        """混合下一块采样
+
+        Args:
+            frames: 采样数
+            latency_s: 这一块要等多久才会被听到，传给持续声源用于同步
+
+        Returns:
+            int16 单声道采样
+        """
+        mix = np.zeros(frames, dtype=np.float32)
+        for source in self.sources:
+            block = source(frames, latency_s)
+            if block is not None:
+                mix += block
+        with self._lock:
+            remaining = []
+            for voice in self.voices:
+                chunk = voice.buffer[voice.position:voice.position + frames]
+                mix[:len(chunk)] += voice.gain * chunk
+                voice.position += len(chunk)
+                if voice.position < len(voice.buffer):
+                    remaining.append(voice)
+            self.voices = remaining
+        np.clip(mix, -1.0, 1.0, out=mix)
+        return (mix * 32767.0).astype(np.int16)
+
+
+class _MixerStream(QIODevice):
+    """只读的无限流，音频设备每次读取时由混音器生成所需的采样"""
+
+    def __init__(self, render: Callable[[int], np.ndarray]):
+        super().__init__()
+        self.render = render
+
+    def readData(self, max_size: int) -> bytes:
+        return self.render(max_size // _BYTES_PER_FRAME).tobytes()
+
+    def writeData(self, data) -> int:
+        return -1
+
+    def bytesAvailable(self) -> int:
+        return AUDIO_SAMPLE_RATE * _BYTES_PER_FRAME + super().bytesAvailable()
+
+    def isSequential(self) -> bool:
+        return True
+
 
 class SoundController:
-    """管理应用程序的声音效果"""
-    
-    def __init__(self):
-        self.sound_effects = {}
+    """管理应用程序的声音效果
+
+    声音文件在后台解码为内存中的PCM（见 ResourceBootstrap），由 AudioMixer 混合后通过
+    唯一的 QAudioOutput 播放。某个声音就绪之前，播放它的请求会被静默跳过。
+    """
+
+    def __init__(self, sample_rate: int = AUDIO_SAMPLE_RATE, buffer_ms: int = AUDIO_BUFFER_MS):
+        """
+        Args:
+            sample_rate: 混音和输出的采样率
+            buffer_ms: 输出缓冲时长
+        """
+        self.sample_rate = sample_rate
+        self.buffer_ms = buffer_ms
+        self.mixer = AudioMixer(sample_rate)
+        self.sound_buffers: Dict[str, Optional[np.ndarray]] = {}
         self.sounds_enabled = True
-        
-    def init_sounds(self, sound_dir="resources/sounds"):
-        """初始化声音文件
-        
+        self._status: Dict[str, str] = {}
+        self._output: Optional[QAudioOutput] = None
+        self._stream = _MixerStream(self._render)
+        self._frames_rendered = 0
+
+    def expect_sounds(self, names):
+        """登记即将加载的声音，在加载完成前它们的状态为 pending"""
+        for name in names:
+            self._status.setdefault(name, SOUND_PENDING)
+
+    def load_sounds(self, sound_buffers: Dict[str, Optional[np.ndarray]]):
+        """接收解码好的声音
+
         Args:
-            sound_dir: 声音文件所在目录
+            sound_buffers: 声音名 -> decode_wav 得到的采样，None 表示不可用
         """
-        # 声音文件配置
-        sound_files = {
-            "poke": "poke.wav",
-            "pop": "pop.wav",
-            "spin": "swoosh.wav",
-            "jiggle": "jiggle.wav",
-            "heartbeat_soft": "heartbeat_soft.wav",  # 较低频率
-            "heartbeat_fast": "heartbeat_fast.wav",  # 较高频率
-            "message_receive": "message.wav",
-            "ui_click": "click.wav"
-        }
-        
-        for name, filename in sound_files.items():
-            full_path = os.path.join(sound_dir, filename)
-            effect = QSoundEffect()
-            effect.setSource(QUrl.fromLocalFile(full_path))
-            effect.setVolume(0.6)
-            
-            if effect.status() == QSoundEffect.Error:
-                print(f"Warning: Could not load sound '{name}' from '{full_path}'. Status: {effect.status()}")
-                self.sound_effects[name] = None  # 记录加载失败
-            else:
-                self.sound_effects[name] = effect
-    
+        for name, buffer in sound_buffers.items():
+            self.sound_buffers[name] = buffer
+            self._status[name] = SOUND_MISSING if buffer is None else SOUND_READY
+
+    def status(self, name: str) -> str:
+        """返回声音的加载状态（pending/ready/missing），未登记的声音视为 missing"""
+        return self._status.get(name, SOUND_MISSING)
+
+    def is_ready(self, name: str) -> bool:
+        """声音是否可以播放"""
+        return self.status(name) == SOUND_READY
+
+    def all_loaded(self) -> bool:
+        """所有登记的声音是否都已结束加载（无论成功与否）"""
+        return all(status != SOUND_PENDING for status in self._status.values())
+
     def play_sound(self, name: str, volume: float = -1.0):
-        """播放指定声音
-        
+        """播放指定声音，尚未就绪时不播放
+
+        同一个声音可以重叠播放，每次播放的音量互不影响。
+
         Args:
             name: 声音名称
             volume: 音量 (0.0-1.0)，-1表示使用默认音量
         """
         if not self.sounds_enabled:
             return
-            
-        if name in self.sound_effects and self.sound_effects[name]:
-            sound = self.sound_effects[name]
-            if sound.status() == QSoundEffect.Ready:
-                if volume >= 0.0:
-                    sound.setVolume(min(1.0, volume))
-                sound.play()
-    
+
+        buffer = self.sound_buffers.get(name)
+        if buffer is not None and self.is_ready(name):
+            self.mixer.play(name, buffer, min(1.0, volume) if volume >= 0.0 else SOUND_DEFAULT_VOLUME)
+
+    def start_output(self) -> bool:
+        """打开默认音频设备开始播放混音（已打开时恢复播放）
+
+        Returns:
+            是否成功；没有可用的音频设备时返回False，所有声音保持静音
+        """
+        if self._output is not None:
+            if self._output.state() == QAudio.SuspendedState:
+                self._output.resume()
+            return True
+        audio_format = QAudioFormat()
+        audio_format.setSampleRate(self.sample_rate)
+        audio_format.setChannelCount(1)
+        audio_format.setSampleSize(16)
+        audio_format.setCodec("audio/pcm")
+        audio_format.setByteOrder(QAudioFormat.LittleEndian)
+        audio_format.setSampleType(QAudioFormat.SignedInt)
+        device = QAudioDeviceInfo.defaultOutputDevice()
+        if device.isNull() or not device.isFormatSupported(audio_format):
+            logger.warning("No audio output supports %s Hz mono PCM; sounds disabled", self.sample_rate)
+            return False
+        self._output = QAudioOutput(device, audio_format)
+        self._output.setBufferSize(self.sample_rate * _BYTES_PER_FRAME * self.buffer_ms // 1000)
+        self._frames_rendered = 0  # 与 processedUSecs 从同一时刻开始计数
+        self._stream.open(QIODevice.ReadOnly)
+        self._output.start(self._stream)
+        if self._output.error() != QAudio.NoError:
+            logger.warning("Audio output failed to start: error %s", self._output.error())
+            self.stop_output()
+            return False
+        return True
+
+    def suspend_output(self):
+        """暂停音频输出"""
+        if self._output is not None and self._output.state() != QAudio.SuspendedState:
+            self._output.suspend()
+
+    def stop_output(self):
+        """关闭音频设备"""
+        self.mixer.stop_all()
+        if self._output is not None:
+            self._output.stop()
+            self._output = None
+        if self._stream.isOpen():
+            self._stream.close()
+
+    def _render(self, frames: int) -> np.ndarray:
+        """为音频设备生成下一块采样"""
+        latency_s = 0.0
+        if self._output is not None:
+            # 已交给设备但尚未播放的时长
+            latency_s = max(0.0, self._frames_rendered / self.sample_rate - self._output.processedUSecs() / 1e6)
+        self._frames_rendered += frames
+        return self.mixer.render(frames, latency_s)
+
     def enable_sounds(self, enabled=True):
-        """启用或禁用声音
-        
+        """启用或禁用声音，禁用时暂停音频输出
+
         Args:
             enabled: 是否启用声音
         """
         self.sounds_enabled = enabled
-        
+        if enabled:
+            self.start_output()
+        else:
+            self.mixer.stop_all()
+            self.suspend_output()
+
     def are_sounds_enabled(self):
         """返回声音是否启用
-        
+
         Returns:
             声音是否启用
         """
-        return self.sounds_enabled
\ No newline at end of file
+        return self.sounds_enabled
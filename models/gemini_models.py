@@ -1,16 +1,29 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Any, Dict, List, Optional
 from PyQt5.QtCore import QObject, pyqtSignal
 
 class RubyResponse(BaseModel):
-    """Pydantic模型，用于解析Gemini API的响应"""
+    """Pydantic模型，用于解析Gemini API的响应
+
+    字段顺序即模型输出顺序：短字段在前，流式响应时心形可以先变色、变速，长对话随后逐字到达。
+    """
     short_dialogue: str = Field(..., description="A very short phrase or a few words (max 3-5 words) for the heart display.")
-    long_dialogue: str = Field(..., description="ruby's main, longer chat message as a playful little girl.")
     color_hex: str = Field(..., description="Hex color code (e.g., #FFC0CB) for the heart, based on ruby's mood.")
     frequency_hz: float = Field(..., description="Heartbeat frequency (0.5-15.0 Hz, but practically capped lower for display) based on ruby's mood.")
+    long_dialogue: str = Field(..., description="ruby's main, longer chat message as a playful little girl.")
+
+
+class GeminiPrompt(BaseModel):
+    """发送给Gemini的提示：静态系统指令 + 多轮对话内容"""
+    system_instruction: str = Field(..., description="Static rules and persona, identical across requests.")
+    contents: List[Dict[str, Any]] = Field(..., description="Multi-turn contents: history turns followed by the current interaction.")
 
 
 class GeminiSignals(QObject):
     """信号类，用于在线程间传递Gemini API响应"""
     result = pyqtSignal(RubyResponse)
-    error = pyqtSignal(str)
\ No newline at end of file
+    error = pyqtSignal(str)
+    # 流式响应：某个字段完整到达时发出 (字段名, 值)
+    field_ready = pyqtSignal(str, object)
+    # 流式响应：long_dialogue 新到达的文本片段
+    long_dialogue_chunk = pyqtSignal(str)
\ No newline at end of file
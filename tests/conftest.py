@@ -0,0 +1,37 @@
+# 测试公共配置：让测试可以直接导入项目模块，并提供可手动推进的时钟
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+
+class FakeClock:
+    """可手动推进的 time.monotonic 替身"""
+
+    def __init__(self, start: float = 1000.0):
+        self.now = start
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """替换 time.monotonic，返回可推进的时钟"""
+    fake = FakeClock()
+    monkeypatch.setattr("time.monotonic", fake)
+    return fake
+
+
+@pytest.fixture(scope="session")
+def qapp():
+    """整个测试会话共用的 QApplication（位图、字体和部件都需要它）"""
+    from PyQt5.QtWidgets import QApplication
+    app = QApplication.instance() or QApplication([])
+    yield app
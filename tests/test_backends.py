@@ -0,0 +1,106 @@
+import json
+import sys
+
+import pytest
+
+from controllers.backends import GenaiBackend, LocalBackend, create_backend
+from controllers.resilience import BackendError, is_retryable
+from models.gemini_models import GeminiPrompt, RubyResponse
+from utils.constants import LOCAL_BACKEND_PROFILES
+
+
+def _prompt(text: str) -> GeminiPrompt:
+    return GeminiPrompt(system_instruction="规则", contents=[{"role": "user", "parts": [{"text": text}]}])
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """记录而不真正执行 time.sleep，返回每次的等待秒数"""
+    recorded = []
+    monkeypatch.setattr("controllers.backends.time.sleep", recorded.append)
+    return recorded
+
+
+def _run(backend, count: int, stream: bool = False):
+    """依次发出 count 个请求，返回每个请求的结果（回复文本或错误状态码）"""
+    outcomes = []
+    for i in range(count):
+        try:
+            if stream:
+                outcomes.append("".join(backend.generate_stream(_prompt(f"用户说：'第{i}条'"), {})))
+            else:
+                outcomes.append(backend.generate(_prompt(f"用户说：'第{i}条'"), {}))
+        except BackendError as e:
+            outcomes.append(e.code)
+    return outcomes
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_same_seed_replays_same_replies_latencies_and_errors(sleeps, stream):
+    first = _run(LocalBackend("flaky", seed=7), 40, stream)
+    first_sleeps = list(sleeps)
+    sleeps.clear()
+    assert _run(LocalBackend("flaky", seed=7), 40, stream) == first
+    assert sleeps == first_sleeps
+
+
+def test_different_seeds_differ(sleeps):
+    assert _run(LocalBackend("flaky", seed=1), 40) != _run(LocalBackend("flaky", seed=2), 40)
+
+
+def test_error_injection_follows_profile(sleeps):
+    profile = LOCAL_BACKEND_PROFILES["flaky"]
+    outcomes = _run(LocalBackend("flaky", seed=3), 500)
+    errors = [o for o in outcomes if isinstance(o, int)]
+    assert set(errors) <= set(profile["error_codes"])
+    assert abs(len(errors) / len(outcomes) - profile["error_rate"]) < 0.06
+    assert all(is_retryable(BackendError(code)) for code in errors)
+
+
+def test_profiles_without_errors_never_fail(sleeps):
+    assert not any(isinstance(o, int) for o in _run(LocalBackend("typical"), 100))
+
+
+def test_replies_are_valid_and_match_interaction(sleeps):
+    backend = LocalBackend("instant")
+    chat = RubyResponse.model_validate_json(backend.generate(_prompt("用户说：'今天好累'"), {}))
+    assert "今天好累" in chat.long_dialogue
+    poke = json.loads(backend.generate(_prompt("用户刚刚戳了你一下！"), {}))
+    mood = json.loads(backend.generate(_prompt("用户想知道你现在的心情。"), {}))
+    assert poke != mood
+    assert sleeps == [0.0, 0.0, 0.0]
+
+
+def test_stream_yields_profile_sized_chunks(sleeps):
+    backend = LocalBackend("typical", seed=5)
+    chunks = list(backend.generate_stream(_prompt("用户说：'hi'"), {}))
+    size = LOCAL_BACKEND_PROFILES["typical"]["chunk_chars"]
+    assert all(len(chunk) == size for chunk in chunks[:-1])
+    assert 0 < len(chunks[-1]) <= size
+    RubyResponse.model_validate_json("".join(chunks))
+    assert len(sleeps) == len(chunks)  # 首块延迟 + 每个后续分块的间隔
+    assert all(delay > 0 for delay in sleeps)
+
+
+def test_unknown_profile_is_rejected():
+    with pytest.raises(ValueError):
+        LocalBackend("warp-speed")
+
+
+def test_create_backend_from_environment(monkeypatch):
+    monkeypatch.setenv("RUBY_GEMINI_BACKEND", "local")
+    monkeypatch.setenv("RUBY_LOCAL_BACKEND_PROFILE", "slow")
+    monkeypatch.setenv("RUBY_LOCAL_BACKEND_SEED", "42")
+    backend = create_backend()
+    assert isinstance(backend, LocalBackend)
+    assert (backend.profile_name, backend.seed) == ("slow", 42)
+    assert isinstance(create_backend("genai"), GenaiBackend)
+    with pytest.raises(ValueError):
+        create_backend("carrier-pigeon")
+
+
+def test_local_backend_does_not_import_sdk(sleeps, monkeypatch):
+    for name in [m for m in sys.modules if m == "google.genai" or m.startswith("google.genai.")]:
+        monkeypatch.delitem(sys.modules, name)
+    _run(LocalBackend("flaky", seed=9), 20)
+    assert "google.genai" not in sys.modules
@@ -0,0 +1,85 @@
+import sqlite3
+import time
+
+import pytest
+
+from controllers.conversation_store import ConversationStore
+from models.gemini_models import RubyResponse
+
+
+def _reply(i: int) -> RubyResponse:
+    return RubyResponse(short_dialogue=f"短{i}", color_hex="#FFC0CB", frequency_hz=1.5, long_dialogue=f"回复{i}")
+
+
+def _wait_until(condition, timeout_s: float = 5.0):
+    deadline = time.monotonic() + timeout_s
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "nested" / "conversation.db")
+
+
+def test_append_is_persisted_and_reloaded_in_order(db_path):
+    store = ConversationStore(db_path, flush_interval_s=0.01)
+    assert store.available
+    for i in range(5):
+        store.append(f"问{i}", "chat", _reply(i), latency_ms=10.0 * i)
+    store.close()
+    assert store.written == 5
+
+    reopened = ConversationStore(db_path)
+    tail = reopened.load_tail(3)
+    reopened.close()
+    assert tail == [{"user": f"问{i}", "ruby": f"回复{i}", "type": "chat"} for i in range(2, 5)]
+
+
+def test_records_are_committed_in_batches(db_path):
+    store = ConversationStore(db_path, batch_size=4, flush_interval_s=10.0)
+    for i in range(4):
+        store.append(f"问{i}", "poke_reaction", _reply(i))
+    # 攒满一批后立即提交，不等待 flush_interval_s
+    _wait_until(lambda: store.written == 4)
+    assert [e["type"] for e in store.load_tail(10)] == ["poke_reaction"] * 4
+    store.close()
+
+
+def test_close_flushes_pending_records(db_path):
+    store = ConversationStore(db_path, batch_size=100, flush_interval_s=10.0)
+    store.append("问", "chat", _reply(0), latency_ms=123.0)
+    store.close()
+    assert store.written == 1
+    assert not store.available
+
+    row = sqlite3.connect(db_path).execute(
+        "SELECT user_entry, short_dialogue, color_hex, frequency_hz, latency_ms FROM exchanges"
+    ).fetchone()
+    assert row == ("问", "短0", "#FFC0CB", 1.5, 123.0)
+
+
+def test_closed_store_ignores_appends_and_loads(db_path):
+    store = ConversationStore(db_path)
+    store.close()
+    store.append("问", "chat", _reply(0))
+    assert store.load_tail(5) == []
+    store.close()  # 重复关闭无害
+
+
+def test_load_tail_of_empty_store(db_path):
+    store = ConversationStore(db_path)
+    assert store.load_tail(5) == []
+    assert store.load_tail(0) == []
+    store.close()
+
+
+def test_unavailable_database_keeps_history_in_memory_only(tmp_path):
+    blocker = tmp_path / "file"
+    blocker.write_text("not a directory")
+    store = ConversationStore(str(blocker / "conversation.db"))
+    assert not store.available
+    store.append("问", "chat", _reply(0))
+    assert store.load_tail(5) == []
+    store.close()
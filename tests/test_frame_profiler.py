@@ -0,0 +1,58 @@
+import pytest
+
+from utils.frame_profiler import FrameProfiler, _percentile
+
+
+def test_percentile_nearest_rank():
+    values = list(range(1, 101))
+    assert _percentile(values, 0.5) == 50
+    assert _percentile(values, 0.99) == 99
+    assert _percentile(values, 1.0) == 100
+    assert _percentile([7.0], 0.99) == 7.0
+    assert _percentile([], 0.99) == 0.0
+
+
+def test_stats_percentiles_and_averages():
+    profiler = FrameProfiler(window=100, target_interval_ms=16.0)
+    for i in range(1, 101):
+        profiler.record_tick(16.0, float(i))
+        profiler.record_paint(float(i))
+
+    stats = profiler.stats()
+    assert stats["paint_ms_avg"] == pytest.approx(50.5)
+    assert stats["paint_ms_p99"] == 99.0
+    assert stats["update_ms_avg"] == pytest.approx(50.5)
+    assert stats["frame_ms_p99"] == 16.0
+    assert stats["ticks"] == 100
+    assert stats["paints"] == 100
+    assert stats["dropped_frames"] == 0
+
+
+def test_window_keeps_only_recent_samples():
+    profiler = FrameProfiler(window=4, target_interval_ms=16.0)
+    for paint_ms in (100.0, 1.0, 2.0, 3.0, 4.0):
+        profiler.record_paint(paint_ms)
+    stats = profiler.stats()
+    assert stats["paint_ms_p99"] == 4.0
+    assert stats["paint_ms_avg"] == pytest.approx(2.5)
+    assert stats["paints"] == 5
+
+
+def test_dropped_frames_count_missed_intervals():
+    profiler = FrameProfiler(target_interval_ms=16.0)
+    profiler.record_tick(16.0, 0.0)   # 正常
+    profiler.record_tick(20.0, 0.0)   # 轻微抖动，不超过阈值
+    profiler.record_tick(48.0, 0.0)   # 三倍间隔，错过两帧
+    profiler.record_tick(100.0, 0.0)  # 约六倍间隔，错过五帧
+    assert profiler.stats()["dropped_frames"] == 7
+
+
+def test_reset_clears_everything():
+    profiler = FrameProfiler(target_interval_ms=16.0)
+    profiler.record_tick(64.0, 1.0)
+    profiler.record_paint(2.0)
+    profiler.reset()
+    stats = profiler.stats()
+    assert stats["ticks"] == stats["paints"] == stats["dropped_frames"] == 0
+    assert stats["paint_ms_p99"] == stats["frame_ms_p99"] == 0.0
+    assert stats["fps"] == 0.0
@@ -0,0 +1,227 @@
+import pytest
+
+from controllers.backends import LocalBackend
+from controllers.gemini_controller import GeminiController, GeminiWorker
+from controllers.rate_limiter import RateLimiter, estimate_prompt_tokens
+from models.gemini_models import GeminiPrompt, RubyResponse
+from utils.constants import GEMINI_EXPECTED_OUTPUT_TOKENS, GEMINI_PREFETCH_PRIORITY, GEMINI_REQUEST_PRIORITIES
+
+
+class RecordingPool:
+    """代替 QThreadPool：只记录提交的工作线程，由测试手动发出结果信号"""
+
+    def __init__(self, take_succeeds: bool = False):
+        self.started = []
+        self.take_succeeds = take_succeeds  # tryTake 是否成功（工作线程尚未开始执行）
+
+    def start(self, worker, priority=0):
+        self.started.append(worker)
+
+    def tryTake(self, worker):
+        if self.take_succeeds and worker in self.started:
+            self.started.remove(worker)
+            return True
+        return False
+
+
+class Recorder:
+    """收集某个请求的回调"""
+
+    def __init__(self):
+        self.results = []
+        self.errors = []
+
+    def callbacks(self):
+        return self.results.append, self.errors.append
+
+
+def _reply(text: str) -> RubyResponse:
+    return RubyResponse(short_dialogue=text, color_hex="#FFC0CB", frequency_hz=1.0, long_dialogue=text)
+
+
+@pytest.fixture
+def controller(qapp):
+    controller = GeminiController(backend=LocalBackend("instant"))
+    controller.threadpool = RecordingPool()
+    yield controller
+    controller.shutdown()
+
+
+def _send(controller, text="hi", interaction_type="chat"):
+    recorder = Recorder()
+    prompt = controller.build_gemini_prompt(text, interaction_type)
+    controller.send_message(prompt, *recorder.callbacks(), interaction_type=interaction_type)
+    return recorder
+
+
+def test_request_ids_increase(controller):
+    prompt = controller.build_gemini_prompt("hi", "chat")
+    first = controller.send_message(prompt, print, print)
+    assert controller.send_message(prompt, print, print) == first + 1
+
+
+def test_latest_wins_cancels_running_request(controller):
+    first = _send(controller, "first")
+    second = _send(controller, "second")
+    old_worker, new_worker = controller.threadpool.started
+    assert old_worker.is_cancelled()
+    assert not new_worker.is_cancelled()
+
+    old_worker.signals.result.emit(_reply("stale"))
+    new_worker.signals.result.emit(_reply("fresh"))
+    assert first.results == []
+    assert [r.short_dialogue for r in second.results] == ["fresh"]
+
+
+def test_latest_wins_removes_request_not_yet_started(controller):
+    controller.threadpool = RecordingPool(take_succeeds=True)
+    _send(controller, "first")
+    _send(controller, "second")
+    assert len(controller.threadpool.started) == 1
+    assert not controller.threadpool.started[0].is_cancelled()
+
+
+def test_latest_wins_drops_stale_stream_events(controller):
+    first = Recorder()
+    fields, chunks = [], []
+    prompt = controller.build_gemini_prompt("first", "chat")
+    controller.send_message(prompt, *first.callbacks(), lambda *f: fields.append(f), chunks.append)
+    _send(controller, "second")
+    stale = controller.threadpool.started[0]
+    stale.signals.field_ready.emit("short_dialogue", "stale")
+    stale.signals.long_dialogue_chunk.emit("stale")
+    stale.signals.error.emit("stale")
+    assert (fields, chunks, first.errors) == ([], [], [])
+
+
+def test_debounce_coalesces_rapid_pokes(controller):
+    controller.request_policy = "debounce"
+    pokes = [_send(controller, "poke", "poke_reaction") for _ in range(3)]
+    assert controller.threadpool.started == []
+    assert controller._debounce_timer.isActive()
+
+    controller._debounce_timer.stop()
+    controller._flush_debounced_request()  # 模拟防抖时间到
+    (worker,) = controller.threadpool.started
+    worker.signals.result.emit(_reply("ouch"))
+    assert [len(p.results) for p in pokes] == [0, 0, 1]
+
+
+def test_debounce_chat_is_sent_immediately_and_supersedes_pending_poke(controller):
+    controller.request_policy = "debounce"
+    poke = _send(controller, "poke", "poke_reaction")
+    chat = _send(controller, "hello", "chat")
+    assert not controller._debounce_timer.isActive()
+    (worker,) = controller.threadpool.started
+    controller._flush_debounced_request()
+    assert controller.threadpool.started == [worker]
+
+    worker.signals.result.emit(_reply("hi"))
+    assert poke.results == []
+    assert len(chat.results) == 1
+
+
+def test_fifo_runs_requests_one_at_a_time_in_order(controller):
+    controller.request_policy = "fifo"
+    recorders = [_send(controller, f"msg {i}") for i in range(3)]
+    assert len(controller.threadpool.started) == 1
+
+    controller.threadpool.started[0].signals.result.emit(_reply("0"))
+    assert len(controller.threadpool.started) == 2
+    controller.threadpool.started[1].signals.error.emit("boom")
+    assert len(controller.threadpool.started) == 3
+    controller.threadpool.started[2].signals.result.emit(_reply("2"))
+
+    assert [len(r.results) for r in recorders] == [1, 0, 1]
+    assert recorders[1].errors == ["boom"]
+    assert not controller._active_requests
+
+
+def test_cancel_all_suppresses_every_callback(controller):
+    controller.request_policy = "fifo"
+    recorders = [_send(controller, f"msg {i}") for i in range(3)]
+    (worker,) = controller.threadpool.started
+    controller.cancel_all()
+    assert worker.is_cancelled()
+
+    worker.signals.result.emit(_reply("late"))
+    assert len(controller.threadpool.started) == 1  # 排队的请求也被取消，不会再启动
+    assert all(r.results == [] and r.errors == [] for r in recorders)
+
+
+def test_cancel_all_stops_pending_debounce(controller):
+    controller.request_policy = "debounce"
+    poke = _send(controller, "poke", "poke_reaction")
+    controller.cancel_all()
+    assert not controller._debounce_timer.isActive()
+    controller._flush_debounced_request()
+    assert controller.threadpool.started == []
+    assert poke.results == []
+
+
+def _worker(controller, tokens: int, priority: int) -> GeminiWorker:
+    """估算约 tokens 个token的工作线程（系统指令之外还计入预期输出）"""
+    instruction = "规" * max(0, tokens - GEMINI_EXPECTED_OUTPUT_TOKENS)
+    prompt = GeminiPrompt(system_instruction=instruction, contents=[])
+    assert estimate_prompt_tokens(prompt) == tokens
+    return GeminiWorker(prompt, controller.backend, rate_limiter=controller.rate_limiter, priority=priority)
+
+
+@pytest.fixture
+def limited_controller(controller, clock):
+    """每分钟 6000 token（每秒补充 100），已用掉 5000"""
+    controller.rate_limiter = RateLimiter(requests_per_minute=1000, tokens_per_minute=6000, low_priority_reserve=0.0)
+    assert controller.rate_limiter.acquire(5000) == 0.0
+    return controller
+
+
+def test_quota_admits_in_priority_order(limited_controller, clock):
+    controller = limited_controller
+    prefetch = _worker(controller, 400, GEMINI_PREFETCH_PRIORITY)
+    chat = _worker(controller, 600, GEMINI_REQUEST_PRIORITIES["chat"])
+    controller._awaiting_quota = [prefetch, chat]
+    controller._awaiting_quota.sort(key=lambda w: -w.priority)
+    controller._start_waiting_workers()
+    assert controller.threadpool.started == [chat, prefetch]
+    assert chat.quota_granted and prefetch.quota_granted
+
+
+def test_blocked_chat_stops_lower_priority_admission(limited_controller, clock):
+    controller = limited_controller
+    chat = _worker(controller, 2000, GEMINI_REQUEST_PRIORITIES["chat"])
+    controller._submit(chat)
+    prefetches = [_worker(controller, 300, GEMINI_PREFETCH_PRIORITY) for _ in range(3)]
+    for worker in prefetches:
+        controller._submit(worker)
+    # 剩余的 1000 个token足够所有预取请求，但它们不能插到等待中的聊天请求前面
+    assert controller.threadpool.started == []
+    assert controller._quota_timer.isActive()
+
+    clock.advance(10.0)
+    controller._start_waiting_workers()
+    assert controller.threadpool.started == [chat]
+    assert controller._awaiting_quota == prefetches
+
+
+def test_smaller_request_of_same_priority_may_go_first(limited_controller, clock):
+    controller = limited_controller
+    big = _worker(controller, 2000, GEMINI_REQUEST_PRIORITIES["chat"])
+    small = _worker(controller, 500, GEMINI_REQUEST_PRIORITIES["chat"])
+    controller._submit(big)
+    controller._submit(small)
+    assert controller.threadpool.started == [small]
+    assert controller._awaiting_quota == [big]
+
+
+def test_cancel_all_removes_requests_waiting_for_quota(limited_controller, clock):
+    controller = limited_controller
+    controller.rate_limiter.acquire(1000)
+    recorder = _send(controller, "hi")
+    assert controller.threadpool.started == []
+    (worker,) = controller._awaiting_quota
+    controller.cancel_all()
+    assert controller._awaiting_quota == []
+    clock.advance(60.0)
+    controller._start_waiting_workers()
+    assert controller.threadpool.started == []
+    assert recorder.results == recorder.errors == []
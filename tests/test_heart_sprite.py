@@ -0,0 +1,52 @@
+from PyQt5.QtGui import QColor
+
+from utils.heart_sprite import HeartSpriteCache
+
+BASE, HIGHLIGHT, SHADOW = QColor("#FFC0CB"), QColor("#FFFFFF"), QColor("#AA0000")
+
+
+def test_repeated_lookup_hits(qapp):
+    cache = HeartSpriteCache(max_entries=4)
+    first = cache.get(4, BASE, HIGHLIGHT, SHADOW)
+    assert cache.get(4, BASE, HIGHLIGHT, SHADOW) is first
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_sprite_size_follows_device_pixel_ratio(qapp):
+    cache = HeartSpriteCache()
+    normal = cache.get(4, BASE, HIGHLIGHT, SHADOW)
+    hidpi = cache.get(4, BASE, HIGHLIGHT, SHADOW, device_pixel_ratio=2.0)
+    assert hidpi.devicePixelRatio() == 2.0
+    assert (hidpi.width(), hidpi.height()) == (normal.width() * 2, normal.height() * 2)
+
+
+def test_lru_evicts_least_recently_used(qapp):
+    cache = HeartSpriteCache(max_entries=2)
+    cache.get(1, BASE, HIGHLIGHT, SHADOW)
+    cache.get(2, BASE, HIGHLIGHT, SHADOW)
+    cache.get(1, BASE, HIGHLIGHT, SHADOW)
+    cache.get(3, BASE, HIGHLIGHT, SHADOW)  # 淘汰尺寸 2
+    misses = cache.misses
+    cache.get(1, BASE, HIGHLIGHT, SHADOW)
+    assert cache.misses == misses
+    cache.get(2, BASE, HIGHLIGHT, SHADOW)
+    assert cache.misses == misses + 1
+
+
+def test_transient_colors_do_not_evict_settled_sprites(qapp):
+    cache = HeartSpriteCache(max_entries=2, max_transient_entries=2)
+    settled = [cache.get(size, BASE, HIGHLIGHT, SHADOW) for size in (1, 2)]
+    for red in range(0, 250, 10):
+        cache.get(1, QColor(red, 0, 0), HIGHLIGHT, SHADOW, transient=True)
+    assert len(cache) == 2
+    assert [cache.get(size, BASE, HIGHLIGHT, SHADOW) for size in (1, 2)] == settled
+
+
+def test_transient_lookup_hits_settled_and_transient_entries(qapp):
+    cache = HeartSpriteCache()
+    settled = cache.get(4, BASE, HIGHLIGHT, SHADOW)
+    assert cache.get(4, BASE, HIGHLIGHT, SHADOW, transient=True) is settled
+    step = QColor(10, 20, 30)
+    transient = cache.get(4, step, HIGHLIGHT, SHADOW, transient=True)
+    assert cache.get(4, step, HIGHLIGHT, SHADOW, transient=True) is transient
+    assert (cache.hits, cache.misses) == (2, 2)
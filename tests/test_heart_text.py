@@ -0,0 +1,115 @@
+import numpy as np
+import pytest
+from PyQt5.QtCore import QRectF, Qt
+from PyQt5.QtGui import QColor, QImage, QPainter
+
+from utils.heart_text import HeartTextCache
+
+RECT = QRectF(10, 20, 160, 90)
+WHITE = QColor(Qt.white)
+LONG_TEXT = " ".join(f"word{i}" for i in range(40))  # 每行内容都不同，错位一行也能从像素上看出来
+
+
+@pytest.fixture
+def cache(qapp):
+    return HeartTextCache(max_entries=8)
+
+
+def test_same_key_is_a_hit_and_position_is_ignored(cache):
+    font = cache.font(14)
+    first = cache.get("Ruby...", font, RECT, WHITE)
+    assert cache.get("Ruby...", font, RECT.translated(7, -3), QColor(Qt.white)) is first
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+@pytest.mark.parametrize("text, point_size, rect, color", [
+    ("Ruby!", 14, RECT, WHITE),
+    ("Ruby...", 15, RECT, WHITE),
+    ("Ruby...", 14, QRectF(10, 20, 161, 90), WHITE),
+    ("Ruby...", 14, QRectF(10, 20, 160, 91), WHITE),
+    ("Ruby...", 14, RECT, QColor(Qt.black)),
+    ("Ruby...", 14, RECT, QColor(255, 255, 255, 128)),
+])
+def test_every_key_component_invalidates(cache, text, point_size, rect, color):
+    first = cache.get("Ruby...", cache.font(14), RECT, WHITE)
+    assert cache.get(text, cache.font(point_size), rect, color) is not first
+    assert (cache.hits, cache.misses) == (0, 2)
+
+
+def test_least_recently_used_layout_is_evicted(qapp):
+    cache = HeartTextCache(max_entries=2)
+    font = cache.font(12)
+    a = cache.get("a", font, RECT, WHITE)
+    cache.get("b", font, RECT, WHITE)
+    assert cache.get("a", font, RECT, WHITE) is a  # a 变为最近使用
+    cache.get("c", font, RECT, WHITE)
+    assert len(cache) == 2
+    assert cache.get("a", font, RECT, WHITE) is a
+    misses = cache.misses
+    cache.get("b", font, RECT, WHITE)
+    assert cache.misses == misses + 1
+
+
+def test_fonts_are_shared_per_point_size(cache):
+    assert cache.font(12) is cache.font(12)
+    assert cache.font(12).pointSize() == 12 and cache.font(12).bold()
+    cache.get("x", cache.font(12), RECT, WHITE)
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_short_text_is_centred_vertically(cache):
+    layout = cache.get("Ruby...", cache.font(14), RECT, WHITE)
+    assert not HeartTextCache.overflows(layout, RECT)
+    position = HeartTextCache.position(layout, RECT)
+    assert position.x() == RECT.x()
+    assert position.y() == pytest.approx(RECT.y() + (RECT.height() - layout.centering_height) / 2)
+    assert RECT.y() < position.y() < RECT.center().y()
+
+
+def test_overflowing_text_spills_above_and_below(cache):
+    layout = cache.get(LONG_TEXT, cache.font(14), RECT, WHITE)
+    assert HeartTextCache.overflows(layout, RECT)
+    # 与 drawText 一样以全部行的高度居中，上下溢出的部分相同
+    assert layout.centering_height == layout.static_text.size().height()
+    top = HeartTextCache.position(layout, RECT).y()
+    assert RECT.y() - top == pytest.approx(top + layout.centering_height - RECT.bottom())
+
+
+def _draw(paint) -> np.ndarray:
+    image = QImage(200, 140, QImage.Format_ARGB32_Premultiplied)
+    image.fill(Qt.transparent)
+    painter = QPainter(image)
+    painter.setRenderHint(QPainter.Antialiasing, True)
+    paint(painter)
+    painter.end()
+    pixels = image.constBits()
+    pixels.setsize(image.byteCount())
+    return np.frombuffer(pixels, np.uint32).reshape(image.height(), image.width()).copy()
+
+
+@pytest.mark.parametrize("text", [
+    "Ruby...",
+    "今天也要开心哦 我一直都在这里陪着你",
+    " ".join(f"word{i}" for i in range(12)),
+    LONG_TEXT,
+])
+def test_static_text_matches_draw_text(cache, text):
+    font = cache.font(14)
+    layout = cache.get(text, font, RECT, WHITE)
+
+    def with_draw_text(painter):
+        painter.setFont(font)
+        painter.setPen(WHITE)
+        painter.drawText(RECT, Qt.AlignCenter | Qt.TextWordWrap, text)
+
+    def with_static_text(painter):
+        painter.setFont(font)
+        painter.setPen(WHITE)
+        if HeartTextCache.overflows(layout, RECT):
+            painter.setClipRect(RECT)
+        painter.drawStaticText(HeartTextCache.position(layout, RECT), layout.static_text)
+
+    expected = _draw(with_draw_text)
+    assert expected.any()
+    assert np.array_equal(_draw(with_static_text), expected)
@@ -0,0 +1,141 @@
+import numpy as np
+import pytest
+from PyQt5.QtCore import QRectF, Qt
+from PyQt5.QtGui import QColor, QImage, QRegion
+
+from views.heart_widget import HeartWidget
+
+NOW = 1000.0
+DT_MS = 16.0
+
+
+@pytest.fixture
+def widget(qapp):
+    """固定尺寸、停止脉动并已经画过第一帧的心形部件（帧时钟停止，由测试手动推进）"""
+    widget = HeartWidget()
+    widget.frame_timer.stop()
+    widget.resize(400, 400)
+    widget.current_frequency_hz = widget.target_frequency_hz = 0.0
+    widget.advance_frame(DT_MS, NOW)
+    yield widget
+    widget.deleteLater()
+
+
+def _render(widget) -> np.ndarray:
+    image = QImage(widget.size(), QImage.Format_ARGB32_Premultiplied)
+    image.fill(Qt.transparent)
+    widget.render(image)
+    pixels = image.constBits()
+    pixels.setsize(image.byteCount())
+    return np.frombuffer(pixels, np.uint32).reshape(image.height(), image.width()).copy()
+
+
+def _mask(region: QRegion, width: int, height: int) -> np.ndarray:
+    mask = np.zeros((height, width), dtype=bool)
+    for rect in region.rects():
+        mask[rect.top():rect.bottom() + 1, rect.left():rect.right() + 1] = True
+    return mask
+
+
+def _covers(widget, region: QRegion, rect) -> bool:
+    """region 是否完全覆盖 rect 在部件内的部分（QRegion.contains(QRect) 只判断是否相交）"""
+    return QRegion(rect.intersected(widget.rect())).subtracted(region).isEmpty()
+
+
+def _area(region: QRegion) -> int:
+    return sum(rect.width() * rect.height() for rect in region.rects())
+
+
+def _start_spin(widget, until: float):
+    widget.spin_total_duration = 1.0
+    widget.spin_target_angle = 360.0
+    widget.spin_active_until = until
+
+
+def _press(widget, until: float):
+    """按下效果让心形缩小，旧位置的一圈像素必须被擦除"""
+    widget.pressed_active_until = until
+
+
+def test_first_frame_covers_heart_inside_widget(qapp):
+    widget = HeartWidget()
+    widget.frame_timer.stop()
+    widget.resize(400, 400)
+    assert widget.advance_frame(DT_MS, NOW)
+    region = widget.dirty_region()
+    assert widget.rect().contains(region.boundingRect())
+    assert _covers(widget, region, widget._heart_bounds(widget._frame))
+    widget.deleteLater()
+
+
+def test_unchanged_frame_needs_no_repaint(widget):
+    assert not widget.advance_frame(DT_MS, NOW)
+    assert widget.dirty_region().isEmpty()
+
+
+def test_shrinking_heart_repaints_old_bounds(widget):
+    old_bounds = widget._heart_bounds(widget._frame)
+    _press(widget, NOW + 1.0)
+    assert widget.advance_frame(DT_MS, NOW)
+    new_bounds = widget._heart_bounds(widget._frame)
+    assert old_bounds.contains(new_bounds) and old_bounds != new_bounds
+    assert _covers(widget, widget.dirty_region(), old_bounds)
+
+
+def test_spinning_heart_repaints_rotated_bounds(widget):
+    _start_spin(widget, NOW + 1.0)
+    assert widget.advance_frame(DT_MS, NOW + 0.25)
+    region = widget.dirty_region()
+    assert _covers(widget, region, widget._heart_bounds(widget._frame))
+    assert widget.rect().contains(region.boundingRect())
+
+
+def test_particles_repaint_only_their_area(widget):
+    widget.emit_particles(5, QRectF(20, 20, 10, 10), QColor("#FF69B4"))
+    assert widget.advance_frame(DT_MS, NOW)
+    region = widget.dirty_region()
+    assert _covers(widget, region, widget.particles.bounds().toAlignedRect())
+    assert _area(region) < _area(QRegion(widget.rect())) // 10
+
+    # 粒子全部消失的那一帧仍要擦除它们上一帧的位置，之后不再重绘
+    last_bounds = widget.particles.bounds().toAlignedRect()
+    widget.particles.field("life_current")[:] = 0
+    assert widget.advance_frame(DT_MS, NOW)
+    assert not widget.particles
+    assert _covers(widget, widget.dirty_region(), last_bounds)
+    assert not widget.advance_frame(DT_MS, NOW)
+    assert widget.dirty_region().isEmpty()
+
+
+def test_pixels_outside_dirty_region_do_not_change(widget):
+    before = _render(widget)
+    _press(widget, NOW + 1.0)
+    widget.emit_particles(8, QRectF(300, 40, 20, 20), QColor("#87CEFA"))
+    widget.advance_frame(DT_MS, NOW)
+    changed = _render(widget) != before
+    assert changed.any()
+    mask = _mask(widget.dirty_region(), widget.width(), widget.height())
+    assert not (changed & ~mask).any()
+
+
+def test_frame_tick_updates_only_dirty_region(widget, monkeypatch):
+    updates = []
+    monkeypatch.setattr(widget, "update", lambda *args: updates.append(args))
+    widget._on_frame_tick()
+    assert updates == []  # 画面没有变化时不请求重绘
+
+    widget.emit_particles(3, QRectF(20, 20, 10, 10), QColor("#FF69B4"))
+    widget._on_frame_tick()
+    ((region,),) = updates
+    assert isinstance(region, QRegion)
+    assert region == widget.dirty_region()
+    assert region.boundingRect() != widget.rect()
+
+
+def test_frame_tick_repaints_everything_when_overlay_changes(widget, monkeypatch):
+    updates = []
+    monkeypatch.setattr(widget, "update", lambda *args: updates.append(args))
+    widget.set_profiler_overlay_visible(True)
+    updates.clear()
+    widget._on_frame_tick()
+    assert updates == [()]
@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+
+from utils.constants import HEARTBEAT_LUB_PHASE, HEARTBEAT_PHASE_SNAP
+from utils.heartbeat_synth import HeartbeatSynth
+
+RATE = 8000
+BLOCK = 256
+
+
+def _impulse_synth(**kwargs) -> HeartbeatSynth:
+    """第一声换成单个脉冲、第二声静音，输出中非零采样的位置就是节拍的起点"""
+    synth = HeartbeatSynth(sample_rate=RATE, volume=1.0, **kwargs)
+    synth._lub = np.ones(1, dtype=np.float32)
+    synth._dub = np.zeros(1, dtype=np.float32)
+    return synth
+
+
+def _onsets(samples: np.ndarray) -> np.ndarray:
+    return np.flatnonzero(samples)
+
+
+def _signed_error(a: float, b: float) -> float:
+    return (a - b + 0.5) % 1.0 - 0.5
+
+
+def test_beats_follow_frequency():
+    synth = _impulse_synth()
+    synth.sync(0.0, 2.0)
+    samples = np.concatenate([synth.render(BLOCK) for _ in range(RATE * 3 // BLOCK)])
+    onsets = _onsets(samples)
+    assert len(onsets) == 6
+    assert onsets[0] == pytest.approx(HEARTBEAT_LUB_PHASE / 2.0 * RATE, abs=1)
+    assert np.all(np.abs(np.diff(onsets) - RATE / 2) <= 1)
+
+
+def test_zero_frequency_is_silent():
+    synth = _impulse_synth()
+    synth.sync(0.0, 0.0)
+    assert not synth.render(RATE).any()
+
+
+def test_small_phase_error_is_corrected_gradually():
+    synth = HeartbeatSynth(sample_rate=RATE)
+    frequency = 1.5
+    visual = 0.1  # 音频落后画面 0.1 个周期（小于直接对齐的阈值）
+    synth.sync(visual, frequency)
+    assert synth.phase == 0.0
+    for _ in range(RATE * 3 // BLOCK):
+        synth.render(BLOCK)
+        visual = (visual + frequency * BLOCK / RATE) % 1.0
+        synth.sync(visual, frequency)
+        assert abs(_signed_error(visual, synth.phase)) <= 0.1 + 1e-9  # 误差只会缩小，不会跳变
+    assert abs(_signed_error(visual, synth.phase)) < 0.005
+
+
+def test_large_phase_error_snaps():
+    synth = HeartbeatSynth(sample_rate=RATE)
+    synth.sync(HEARTBEAT_PHASE_SNAP + 0.1, 1.0)
+    assert synth.phase == pytest.approx(HEARTBEAT_PHASE_SNAP + 0.1)
+
+
+def test_error_wraps_around_cycle_boundary():
+    synth = HeartbeatSynth(sample_rate=RATE)
+    synth.phase = 0.02
+    synth.sync(0.98, 1.0)  # 只差 0.04 个周期，不应当作 0.96 直接对齐
+    assert synth.phase == 0.02
+    assert synth._phase_error == pytest.approx(-0.04)
+
+
+def test_sync_targets_phase_when_samples_are_heard():
+    synth = HeartbeatSynth(sample_rate=RATE)
+    synth.sync(0.5, 2.0, latency_s=0.1)
+    assert synth.phase == pytest.approx(0.7)  # 0.5 + 0.1 s * 2 Hz
+
+
+def test_ringing_beat_continues_after_frequency_change():
+    synth = HeartbeatSynth(sample_rate=RATE)
+    synth.phase = HEARTBEAT_LUB_PHASE - 0.01
+    synth.sync(synth.phase, 2.0)
+    first = synth.render(BLOCK)
+    assert first.any()
+    synth.sync(synth.phase, 0.0)
+    assert synth.render(BLOCK).any()  # 已经开始的那一声不会被截断
+    for _ in range(RATE // BLOCK):
+        synth.render(BLOCK)
+    assert not synth.render(BLOCK).any()
+
+
+def test_block_size_does_not_change_output():
+    a, b = HeartbeatSynth(sample_rate=RATE), HeartbeatSynth(sample_rate=RATE)
+    a.sync(0.0, 3.0)
+    b.sync(0.0, 3.0)
+    big = np.concatenate([a.render(1024) for _ in range(8)])
+    small = np.concatenate([b.render(128) for _ in range(64)])
+    assert np.allclose(big, small, atol=0.02)
@@ -0,0 +1,123 @@
+from controllers.history_manager import ChatHistoryManager, estimate_tokens, summarize_turns
+from utils.constants import HISTORY_SUMMARY_TOKEN_BUDGET
+
+
+class DeferredPool:
+    """代替 QThreadPool：记录摘要任务，由测试决定何时在当前线程中执行"""
+
+    def __init__(self, run_immediately: bool = False):
+        self.run_immediately = run_immediately
+        self.pending = []
+
+    def start(self, worker):
+        if self.run_immediately:
+            worker.run()
+        else:
+            self.pending.append(worker)
+
+    def run_next(self):
+        self.pending.pop(0).run()
+
+
+def _turn(i: int) -> tuple:
+    """约 10 个token的一轮对话"""
+    return f"问题{i}：你好吗", f"回答{i}：我很好。"
+
+
+def test_estimate_tokens_counts_cjk_per_character():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("你好") == 2
+    assert estimate_tokens("abcd") == 1
+    assert estimate_tokens("abcde") == 2
+    assert estimate_tokens("你好abcd") == 3
+
+
+def test_history_within_budget_is_kept_verbatim(qapp):
+    history = ChatHistoryManager(token_budget=1000, threadpool=DeferredPool())
+    for i in range(5):
+        history.append(*_turn(i))
+    assert len(history) == 5
+    assert history.threadpool.pending == []
+    contents = history.render_contents()
+    assert [c["role"] for c in contents] == ["user", "model"] * 5
+    assert contents[0]["parts"][0]["text"] == _turn(0)[0]
+    assert history.total_tokens == sum(estimate_tokens(u) + estimate_tokens(r) for u, r in map(_turn, range(5)))
+
+
+def test_oldest_turns_are_summarized_back_under_budget(qapp):
+    budget = 3 * sum(estimate_tokens(t) for t in _turn(0))
+    history = ChatHistoryManager(token_budget=budget, threadpool=DeferredPool(run_immediately=True))
+    for i in range(6):
+        history.append(*_turn(i))
+    assert history.total_tokens <= budget
+    assert [e["user"] for e in history.entries] == [_turn(i)[0] for i in range(3, 6)]
+    assert "问题0" in history.summary and "问题2" in history.summary
+    first = history.render_contents()[0]["parts"][0]["text"]
+    assert first.startswith(history.summary_preamble())
+    assert first.endswith(_turn(3)[0])
+
+
+def test_turns_appended_during_summary_are_kept(qapp):
+    pool = DeferredPool()
+    budget = 2 * sum(estimate_tokens(t) for t in _turn(0))
+    history = ChatHistoryManager(token_budget=budget, threadpool=pool)
+    for i in range(3):
+        history.append(*_turn(i))
+    assert len(pool.pending) == 1  # 第一轮超出预算，启动一次摘要
+    history.append(*_turn(3))
+    assert len(pool.pending) == 1  # 进行中时不重复启动
+
+    pool.run_next()
+    # 摘要只移除它覆盖的那一轮，剩余部分仍超出预算，立即开始下一次
+    assert history.entries[0]["user"] == _turn(1)[0]
+    assert len(pool.pending) == 1
+    pool.run_next()
+    assert [e["user"] for e in history.entries] == [_turn(2)[0], _turn(3)[0]]
+    assert history.total_tokens <= budget
+
+
+def test_clear_discards_pending_summary(qapp):
+    pool = DeferredPool()
+    history = ChatHistoryManager(token_budget=10, threadpool=pool)
+    history.append(*_turn(0))
+    history.append(*_turn(1))
+    history.clear()
+    pool.run_next()
+    assert not history
+    assert history.summary == ""
+
+
+def test_failing_summarizer_falls_back_to_local_summary(qapp):
+    def broken(previous, turns):
+        raise RuntimeError("summarizer offline")
+
+    history = ChatHistoryManager(token_budget=10, summarizer=broken, threadpool=DeferredPool(run_immediately=True))
+    history.append(*_turn(0))
+    history.append(*_turn(1))
+    assert "问题0" in history.summary
+
+
+def test_local_summary_respects_budget():
+    turns = [{"user": f"第{i}句话很长很长很长。后面还有", "ruby": "回答。"} for i in range(100)]
+    summary = summarize_turns("", turns)
+    assert estimate_tokens(summary) <= HISTORY_SUMMARY_TOKEN_BUDGET
+    assert "后面还有" not in summary  # 每句只保留第一句
+    assert summary.splitlines()[-1].startswith("用户：第99句")
+
+
+def test_restore_keeps_most_recent_turns_within_budget(qapp):
+    entries = [{"user": u, "ruby": r, "type": "chat"} for u, r in map(_turn, range(10))]
+    budget = 3 * sum(estimate_tokens(t) for t in _turn(0))
+    history = ChatHistoryManager(token_budget=budget, threadpool=DeferredPool())
+    history.restore(entries)
+    assert [e["user"] for e in history.entries] == [_turn(i)[0] for i in range(7, 10)]
+    assert history.total_tokens <= budget
+
+
+def test_render_contents_is_cached_until_history_changes(qapp):
+    history = ChatHistoryManager(threadpool=DeferredPool())
+    history.append(*_turn(0))
+    rendered = history.render_contents()
+    assert history.render_contents() is rendered
+    history.append(*_turn(1))
+    assert history.render_contents() is not rendered
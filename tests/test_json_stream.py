@@ -0,0 +1,105 @@
+import json
+import random
+
+import pytest
+
+from utils.json_stream import IncrementalJsonObjectParser
+
+DOCUMENT = {
+    "text": "你好，Ruby！\n她说：\"今天\\天气\" 很好 😊",
+    "mood": "happy",
+    "intensity": 0.75,
+    "count": -3,
+    "flag": True,
+    "nothing": None,
+    "tags": ["a", "b]", {"c": "}"}],
+    "meta": {"nested": {"quote": "\"", "list": [1, 2, 3]}},
+    "ascii_escaped": "café \U0001F496",
+}
+
+
+def _serialized(ensure_ascii: bool) -> str:
+    return json.dumps(DOCUMENT, ensure_ascii=ensure_ascii, indent=1)
+
+
+def _random_chunks(text: str, rng: random.Random):
+    """把文本切成随机长度（含空块）的片段"""
+    pos = 0
+    while pos < len(text):
+        size = rng.randint(0, 7)
+        yield text[pos:pos + size]
+        pos += size
+
+
+def _parse(chunks):
+    parser = IncrementalJsonObjectParser()
+    fields, deltas = {}, {}
+    for chunk in chunks:
+        for kind, key, value in parser.feed(chunk):
+            if kind == "field":
+                fields[key] = value
+            else:
+                deltas[key] = deltas.get(key, "") + value
+    return parser, fields, deltas
+
+
+@pytest.mark.parametrize("ensure_ascii", [False, True])
+@pytest.mark.parametrize("seed", range(50))
+def test_random_chunk_splits_match_json_loads(seed, ensure_ascii):
+    text = _serialized(ensure_ascii)
+    parser, fields, deltas = _parse(_random_chunks(text, random.Random(seed)))
+
+    assert parser.done
+    assert fields == DOCUMENT
+    # 字符串字段的增量拼接起来必须与最终值完全一致
+    for key, value in DOCUMENT.items():
+        if isinstance(value, str):
+            assert deltas[key] == value
+        else:
+            assert key not in deltas
+
+
+@pytest.mark.parametrize("ensure_ascii", [False, True])
+def test_single_character_chunks(ensure_ascii):
+    parser, fields, deltas = _parse(_serialized(ensure_ascii))
+    assert parser.done
+    assert fields == DOCUMENT
+    assert deltas["text"] == DOCUMENT["text"]
+
+
+def test_empty_object():
+    parser, fields, _ = _parse(["{", " ", "}"])
+    assert parser.done
+    assert fields == {}
+
+
+def test_fields_are_emitted_before_object_completes():
+    parser = IncrementalJsonObjectParser()
+    events = parser.feed('{"mood": "sad", "text": "hel')
+    assert ("field", "mood", "sad") in events
+    assert ("delta", "text", "hel") in events
+    assert not parser.done
+
+
+@pytest.mark.parametrize("text", ['[1, 2]', '{"a" 1}', '{"a": 1 "b": 2}'])
+def test_malformed_input_raises(text):
+    with pytest.raises(ValueError):
+        IncrementalJsonObjectParser().feed(text)
+
+
+def test_long_string_is_decoded_incrementally():
+    text = "很长的对白 \\\"quoted\\\" \\u00e9\\ud83d\\ude00\\n" * 2000
+    document = '{"long_dialogue": "' + text + '"}'
+    parser = IncrementalJsonObjectParser()
+    pieces = []
+    for start in range(0, len(document), 13):
+        for kind, _, value in parser.feed(document[start:start + 13]):
+            if kind == "delta":
+                pieces.append(value)
+            else:
+                final = value
+        # 已解码的部分会从缓冲区中丢弃，缓冲区不随字符串长度增长
+        assert len(parser._buffer) < 32
+    assert parser.done
+    assert final == json.loads(document)["long_dialogue"]
+    assert "".join(pieces) == final
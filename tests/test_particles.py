@@ -0,0 +1,92 @@
+import numpy as np
+import pytest
+from PyQt5.QtCore import QRectF, Qt
+from PyQt5.QtGui import QColor, QImage, QPainter
+
+from utils.particles import ParticleSystem
+
+ORIGIN = QRectF(0, 0, 100, 100)
+COLOR = QColor(255, 0, 0)
+
+
+def _emit_marked(system, count):
+    """发射一批粒子，再把当前所有粒子的 start_size 标记为 0 以区分之后发射的粒子"""
+    system.emit(count, ORIGIN, COLOR)
+    system.field("start_size")[:] = 0
+
+
+def test_unknown_policy_rejected():
+    with pytest.raises(ValueError):
+        ParticleSystem(capacity=10, overflow_policy="drop_random")
+
+
+def test_drop_newest_keeps_existing_particles():
+    system = ParticleSystem(capacity=10, overflow_policy="drop_newest")
+    _emit_marked(system, 6)
+    system.emit(8, ORIGIN, COLOR)
+    assert len(system) == 10
+    assert system.dropped == 4
+    assert np.count_nonzero(system.field("start_size") == 0) == 6
+
+    system.emit(5, ORIGIN, COLOR)
+    assert len(system) == 10
+    assert system.dropped == 9
+
+
+def test_drop_oldest_evicts_earliest_particles():
+    system = ParticleSystem(capacity=10, overflow_policy="drop_oldest")
+    _emit_marked(system, 6)
+    system.emit(8, ORIGIN, COLOR)
+    assert len(system) == 10
+    assert system.dropped == 4
+    sizes = system.field("start_size")
+    # 只剩两个旧粒子，且仍排在新粒子之前
+    assert list(sizes[:2]) == [0, 0]
+    assert np.all(sizes[2:] > 0)
+
+
+def test_drop_oldest_oversized_burst_counts_clamped_excess():
+    system = ParticleSystem(capacity=100, overflow_policy="drop_oldest")
+    system.emit(250, ORIGIN, COLOR)
+    assert len(system) == 100
+    assert system.dropped == 150
+
+    system.emit(250, ORIGIN, COLOR)
+    assert len(system) == 100
+    assert system.dropped == 400
+
+
+def test_unknown_particle_type_falls_back_to_default():
+    system = ParticleSystem(capacity=4)
+    system.emit(2, ORIGIN, COLOR, particle_type="confetti")
+    assert len(system) == 2
+    assert system.dropped == 0
+
+
+def _render(system, device_pixel_ratio=1.0):
+    image = QImage(int(100 * device_pixel_ratio), int(100 * device_pixel_ratio), QImage.Format_ARGB32_Premultiplied)
+    image.setDevicePixelRatio(device_pixel_ratio)
+    image.fill(Qt.white)
+    painter = QPainter(image)
+    system.draw(painter, device_pixel_ratio)
+    painter.end()
+    return image
+
+
+def test_draw_reuses_fragments_across_frames(qapp):
+    system = ParticleSystem(capacity=64)
+    system.emit(40, ORIGIN, COLOR, particle_type="sparkle")
+    system.emit(20, ORIGIN, COLOR, particle_type="teardrop")
+    fragments = list(system._fragments)
+    first = _render(system)
+    assert first != _render(ParticleSystem(capacity=64))  # 确实画出了粒子
+    assert _render(system) == first
+    assert all(a is b for a, b in zip(system._fragments, fragments))
+
+
+def test_draw_skips_invisible_particles(qapp):
+    system = ParticleSystem(capacity=8)
+    system.emit(8, ORIGIN, COLOR)
+    system.field("start_size")[:] = 0
+    system.field("end_size")[:] = 0
+    assert _render(system) == _render(ParticleSystem(capacity=8))
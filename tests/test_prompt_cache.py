@@ -0,0 +1,150 @@
+import pytest
+
+from controllers.gemini_controller import GeminiWorker
+from controllers.prompt_cache import SystemInstructionCache, context_cache_min_tokens
+from controllers.resilience import BackendError
+from models.gemini_models import GeminiPrompt
+from utils.constants import (
+    GEMINI_CONTEXT_CACHE_MIN_TOKENS, GEMINI_CONTEXT_CACHE_REFRESH_MARGIN_S, GEMINI_CONTEXT_CACHE_RETRY_S
+)
+
+INSTRUCTION = "规则" * 100  # 约200个token
+
+
+class FakeCacheBackend:
+    """记录缓存注册和删除的后端替身"""
+
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.created = []
+        self.deleted = []
+
+    def create_cached_content(self, system_instruction: str, ttl_s: float) -> str:
+        if self.fail:
+            raise RuntimeError("caching not supported")
+        self.created.append(system_instruction)
+        return f"cachedContents/{len(self.created)}"
+
+    def delete_cached_content(self, cache_name: str):
+        self.deleted.append(cache_name)
+
+
+def test_min_tokens_prefers_longest_prefix():
+    assert context_cache_min_tokens("gemini-2.5-flash-lite") == GEMINI_CONTEXT_CACHE_MIN_TOKENS["gemini-2.5-flash"]
+    assert context_cache_min_tokens("gemini-2.5-pro") == GEMINI_CONTEXT_CACHE_MIN_TOKENS["gemini-2.5-pro"]
+    assert context_cache_min_tokens("some-other-model") == GEMINI_CONTEXT_CACHE_MIN_TOKENS["default"]
+
+
+def test_instruction_below_minimum_is_never_cached(clock):
+    backend = FakeCacheBackend()
+    cache = SystemInstructionCache(INSTRUCTION, backend, min_tokens=10_000)
+    assert not cache.supported
+    assert not cache.needs_refresh()
+    assert not cache.refresh()
+    assert backend.created == []
+    assert cache.request_config() == {"system_instruction": INSTRUCTION}
+
+
+def test_request_config_is_inline_until_refreshed(clock):
+    backend = FakeCacheBackend()
+    cache = SystemInstructionCache(INSTRUCTION, backend, ttl_s=600.0, min_tokens=10)
+    assert cache.request_config() == {"system_instruction": INSTRUCTION}
+    assert backend.created == []  # 请求路径上不注册缓存
+
+    assert cache.needs_refresh()
+    assert cache.refresh()
+    assert cache.request_config() == {"cached_content": "cachedContents/1"}
+    assert not cache.needs_refresh()
+    assert not cache.refresh()
+    assert len(backend.created) == 1
+
+
+def test_refresh_before_expiry_replaces_and_deletes_old_cache(clock):
+    backend = FakeCacheBackend()
+    cache = SystemInstructionCache(INSTRUCTION, backend, ttl_s=600.0, min_tokens=10)
+    cache.refresh()
+    clock.advance(600.0 - GEMINI_CONTEXT_CACHE_REFRESH_MARGIN_S - 1)
+    assert not cache.needs_refresh()
+    clock.advance(1)
+    assert cache.needs_refresh()
+    assert cache.request_config() == {"cached_content": "cachedContents/1"}  # 续建前仍可使用
+
+    assert cache.refresh()
+    assert cache.request_config() == {"cached_content": "cachedContents/2"}
+    assert backend.deleted == ["cachedContents/1"]
+
+
+def test_expired_cache_is_not_referenced(clock):
+    cache = SystemInstructionCache(INSTRUCTION, FakeCacheBackend(), ttl_s=600.0, min_tokens=10)
+    cache.refresh()
+    clock.advance(600.0)
+    assert cache.request_config() == {"system_instruction": INSTRUCTION}
+
+
+def test_failed_registration_backs_off(clock):
+    backend = FakeCacheBackend(fail=True)
+    cache = SystemInstructionCache(INSTRUCTION, backend, min_tokens=10)
+    assert not cache.refresh()
+    assert cache.request_config() == {"system_instruction": INSTRUCTION}
+    assert not cache.needs_refresh()
+
+    backend.fail = False
+    clock.advance(GEMINI_CONTEXT_CACHE_RETRY_S)
+    assert cache.needs_refresh()
+    assert cache.refresh()
+
+
+@pytest.mark.parametrize("name, still_cached", [("cachedContents/1", False), ("cachedContents/old", True)])
+def test_invalidate_only_matching_cache(clock, name, still_cached):
+    cache = SystemInstructionCache(INSTRUCTION, FakeCacheBackend(), min_tokens=10)
+    cache.refresh()
+    cache.invalidate(name)
+    assert ("cached_content" in cache.request_config()) == still_cached
+    assert cache.needs_refresh() != still_cached
+
+
+def test_refresh_is_not_reentrant(clock):
+    cache = SystemInstructionCache(INSTRUCTION, FakeCacheBackend(), min_tokens=10)
+
+    def create(system_instruction, ttl_s):
+        # 注册过程中其他线程看到的状态：不需要再次续建
+        assert not cache.needs_refresh()
+        assert not cache.refresh()
+        return "cachedContents/1"
+
+    cache.backend.create_cached_content = create
+    assert cache.refresh()
+
+
+class CacheMissingBackend(FakeCacheBackend):
+    """引用缓存的请求返回 404，直接携带系统指令的请求成功"""
+
+    def __init__(self):
+        super().__init__()
+        self.configs = []
+
+    def is_available(self) -> bool:
+        return True
+
+    def generate(self, prompt, config):
+        self.configs.append(dict(config))
+        if "cached_content" in config:
+            raise BackendError(404, f"{config['cached_content']} not found")
+        return '{"short_dialogue": "嗨", "color_hex": "#FFC0CB", "frequency_hz": 1.0, "long_dialogue": "嗨"}'
+
+
+def test_worker_falls_back_inline_when_cache_is_missing(qapp, monkeypatch):
+    monkeypatch.setattr("controllers.gemini_controller.backoff_delay", lambda attempt: 0.0)
+    backend = CacheMissingBackend()
+    cache = SystemInstructionCache(INSTRUCTION, backend, min_tokens=10)
+    cache.refresh()
+    prompt = GeminiPrompt(system_instruction=INSTRUCTION, contents=[])
+    worker = GeminiWorker(prompt, backend, stream=False, prompt_cache=cache)
+    results = []
+    worker.signals.result.connect(results.append)
+    worker.run()
+
+    assert len(results) == 1
+    assert [("cached_content" in c) for c in backend.configs] == [True, False]
+    assert backend.configs[1]["system_instruction"] == INSTRUCTION
+    assert cache.needs_refresh()  # 由后台重新注册
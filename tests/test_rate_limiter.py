@@ -0,0 +1,61 @@
+import pytest
+
+from controllers.rate_limiter import RateLimiter, TokenBucket
+
+
+def test_bucket_refills_at_per_minute_rate(clock):
+    bucket = TokenBucket(60)
+    bucket.take(60)
+    assert bucket.tokens == 0
+    bucket.refill(clock.now + 10.0)
+    assert bucket.tokens == pytest.approx(10.0)
+    bucket.refill(clock.now + 1000.0)
+    assert bucket.tokens == bucket.capacity
+
+
+def test_bucket_wait_time_and_reserve(clock):
+    bucket = TokenBucket(60)
+    assert bucket.wait_time(10) == 0.0
+    bucket.take(50)
+    assert bucket.wait_time(10) == 0.0
+    assert bucket.wait_time(15) == pytest.approx(5.0)
+    # 保留 25% 容量：取出 10 个后必须至少剩 15 个
+    assert bucket.wait_time(10, reserve=0.25) == pytest.approx(15.0)
+    # 超过容量的请求按容量计算，不会永远等待
+    assert bucket.wait_time(1000) == pytest.approx(50.0)
+
+
+def test_limiter_limits_requests_per_minute(clock):
+    limiter = RateLimiter(requests_per_minute=2, tokens_per_minute=10_000, low_priority_reserve=0.0)
+    assert limiter.acquire(10) == 0.0
+    assert limiter.acquire(10) == 0.0
+    wait = limiter.acquire(10)
+    assert wait == pytest.approx(30.0)
+    clock.advance(wait)
+    assert limiter.acquire(10) == 0.0
+
+
+def test_limiter_limits_tokens_per_minute(clock):
+    limiter = RateLimiter(requests_per_minute=100, tokens_per_minute=600, low_priority_reserve=0.0)
+    assert limiter.acquire(500) == 0.0
+    assert limiter.acquire(200) == pytest.approx(10.0)
+    clock.advance(10.0)
+    assert limiter.acquire(200) == 0.0
+
+
+def test_refused_acquire_consumes_nothing(clock):
+    limiter = RateLimiter(requests_per_minute=1, tokens_per_minute=600, low_priority_reserve=0.0)
+    assert limiter.acquire(600) == 0.0
+    for _ in range(5):
+        assert limiter.acquire(1) > 0
+    clock.advance(60.0)
+    assert limiter.acquire(600) == 0.0
+
+
+def test_low_priority_cannot_use_reserve(clock):
+    limiter = RateLimiter(requests_per_minute=10, tokens_per_minute=1000, low_priority_reserve=0.3)
+    assert limiter.acquire(600, high_priority=False) == 0.0
+    # 剩余 400 个token：低优先级请求取 200 会侵占保留的 300，需等待
+    assert limiter.acquire(200, high_priority=False) > 0
+    # 高优先级请求可以使用保留部分
+    assert limiter.acquire(200, high_priority=True) == 0.0
@@ -0,0 +1,245 @@
+import sys
+import types
+
+import httpx
+import pytest
+
+from controllers.gemini_controller import GeminiWorker
+from controllers.prompt_cache import SystemInstructionCache
+from controllers.resilience import (
+    BackendError, CircuitBreaker, RequestTimeout, backoff_delay, error_status_code,
+    is_cache_missing, is_retryable, is_timeout
+)
+from models.gemini_models import GeminiPrompt
+from utils.constants import GEMINI_RETRYABLE_STATUS_CODES
+
+
+class FakeAPIError(Exception):
+    """模拟 google.genai.errors.APIError（只有 code 属性）"""
+
+    def __init__(self, code: int, message: str = ""):
+        super().__init__(f"{code} {message}")
+        self.code = code
+
+
+@pytest.fixture
+def genai_errors(monkeypatch):
+    """假装 SDK 已经加载"""
+    module = types.SimpleNamespace(APIError=FakeAPIError)
+    monkeypatch.setitem(sys.modules, "google.genai.errors", module)
+    return module
+
+
+def test_backoff_delay_uses_full_jitter_within_cap(monkeypatch):
+    bounds = []
+    monkeypatch.setattr("random.uniform", lambda low, high: bounds.append((low, high)) or high)
+    assert backoff_delay(0, base_s=0.5, max_s=8.0) == 0.5
+    assert backoff_delay(3, base_s=0.5, max_s=8.0) == 4.0
+    assert backoff_delay(10, base_s=0.5, max_s=8.0) == 8.0
+    assert all(low == 0 for low, _ in bounds)
+
+
+def test_backoff_delay_is_random():
+    delays = {backoff_delay(2, base_s=1.0, max_s=8.0) for _ in range(20)}
+    assert len(delays) > 1
+    assert all(0 <= d <= 4.0 for d in delays)
+
+
+def test_error_status_code_from_backend_error():
+    assert error_status_code(BackendError(503, "unavailable")) == 503
+    assert error_status_code(ValueError("no code")) is None
+
+
+def test_error_status_code_ignores_sdk_types_until_loaded(monkeypatch):
+    monkeypatch.delitem(sys.modules, "google.genai.errors", raising=False)
+    assert error_status_code(FakeAPIError(429)) is None
+
+
+def test_error_status_code_from_loaded_sdk(genai_errors):
+    assert error_status_code(FakeAPIError(429)) == 429
+
+
+@pytest.mark.parametrize("code", GEMINI_RETRYABLE_STATUS_CODES)
+def test_retryable_status_codes(code, genai_errors):
+    assert is_retryable(BackendError(code))
+    assert is_retryable(FakeAPIError(code))
+
+
+@pytest.mark.parametrize("code", [400, 401, 403, 404, 422])
+def test_client_errors_are_not_retryable(code, genai_errors):
+    assert not is_retryable(BackendError(code))
+    assert not is_retryable(FakeAPIError(code))
+
+
+@pytest.mark.parametrize("error, retryable", [
+    (RequestTimeout("slow"), True),
+    (TimeoutError(), True),
+    (ConnectionResetError(), True),
+    (httpx.ReadTimeout("slow"), True),
+    (httpx.ConnectError("refused"), True),
+    (ValueError("bad json"), False),
+    (KeyError("field"), False),
+])
+def test_retryable_without_status_code(error, retryable):
+    assert is_retryable(error) == retryable
+
+
+def test_is_timeout():
+    assert is_timeout(RequestTimeout("slow"))
+    assert is_timeout(httpx.ReadTimeout("slow"))
+    assert not is_timeout(httpx.ConnectError("refused"))
+    assert not is_timeout(BackendError(504))
+
+
+@pytest.mark.parametrize("error, missing", [
+    (BackendError(404, "cachedContents/abc123 not found"), True),
+    (BackendError(403, "Permission denied on resource cachedContents/abc123"), True),
+    (BackendError(400, "Cached content is expired"), True),
+    (BackendError(404, "models/gemini-nonexistent is not found for API version v1beta"), False),
+    (BackendError(400, "Invalid JSON payload"), False),
+    (BackendError(503, "cachedContents/abc123 backend unavailable"), False),
+    (ValueError("cachedContents"), False),
+])
+def test_is_cache_missing(error, missing):
+    assert is_cache_missing(error) == missing
+
+
+def _open_breaker(breaker):
+    for _ in range(breaker.failure_threshold):
+        assert breaker.allow_request()
+        breaker.record_failure()
+
+
+def test_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout_s=10.0)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow_request()
+    assert breaker.retry_after() == 10.0
+
+
+def test_success_resets_failure_count(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout_s=10.0)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+
+
+def test_half_open_admits_single_probe(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout_s=10.0)
+    _open_breaker(breaker)
+    clock.advance(9.0)
+    assert breaker.state == "open"
+    assert breaker.retry_after() == 1.0
+    clock.advance(1.0)
+    assert breaker.state == "half_open"
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+
+
+def test_probe_success_closes(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout_s=10.0)
+    _open_breaker(breaker)
+    clock.advance(10.0)
+    assert breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow_request()
+    assert breaker.allow_request()
+
+
+def test_probe_failure_reopens(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout_s=10.0)
+    _open_breaker(breaker)
+    clock.advance(10.0)
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.retry_after() == 10.0
+    assert not breaker.allow_request()
+
+
+def test_released_probe_can_be_retried(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout_s=10.0)
+    _open_breaker(breaker)
+    clock.advance(10.0)
+    assert breaker.allow_request()
+    breaker.release_probe()
+    assert breaker.state == "half_open"
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+
+
+class ScriptedBackend:
+    """按顺序抛出给定的错误，之后返回合法的回复"""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def is_available(self) -> bool:
+        return True
+
+    def generate(self, prompt, config):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return '{"short_dialogue": "嗨", "color_hex": "#FFC0CB", "frequency_hz": 1.0, "long_dialogue": "嗨"}'
+
+
+def _run_worker(backend, circuit_probe=False, **kwargs):
+    worker = GeminiWorker(GeminiPrompt(system_instruction="规则", contents=[]), backend, stream=False, **kwargs)
+    worker.circuit_probe = circuit_probe
+    results, errors = [], []
+    worker.signals.result.connect(results.append)
+    worker.signals.error.connect(errors.append)
+    worker.run()
+    return results, errors
+
+
+@pytest.fixture
+def no_backoff(monkeypatch):
+    monkeypatch.setattr("controllers.gemini_controller.backoff_delay", lambda attempt: 0.0)
+
+
+def test_worker_retries_transient_errors(qapp, no_backoff):
+    backend = ScriptedBackend(BackendError(503), BackendError(429))
+    breaker = CircuitBreaker(failure_threshold=5)
+    results, errors = _run_worker(backend, circuit_breaker=breaker, max_retries=2)
+    assert (len(results), errors, backend.calls) == (1, [], 3)
+    assert breaker.state == "closed"
+
+
+def test_worker_gives_up_after_max_retries(qapp, no_backoff):
+    backend = ScriptedBackend(*[BackendError(503)] * 5)
+    results, errors = _run_worker(backend, max_retries=2)
+    assert (results, len(errors), backend.calls) == ([], 1, 3)
+
+
+def test_worker_fails_fast_on_wrong_model_without_touching_cache(qapp, no_backoff):
+    class CachingBackend(ScriptedBackend):
+        def create_cached_content(self, system_instruction, ttl_s):
+            return "cachedContents/1"
+
+    backend = CachingBackend(BackendError(404, "models/gemini-typo is not found"))
+    cache = SystemInstructionCache("规则", backend, min_tokens=0)
+    cache.refresh()
+    results, errors = _run_worker(backend, prompt_cache=cache)
+    assert (results, len(errors), backend.calls) == ([], 1, 1)
+    assert cache.request_config() == {"cached_content": "cachedContents/1"}
+
+
+def test_client_error_releases_half_open_probe_without_closing(qapp, clock, no_backoff):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout_s=10.0)
+    breaker.record_failure()
+    clock.advance(10.0)
+    assert breaker.allow_request()
+    _run_worker(ScriptedBackend(BackendError(401, "bad key")), circuit_probe=True, circuit_breaker=breaker)
+    assert breaker.state == "half_open"
+    assert breaker.allow_request()  # 探测机会已让出
@@ -0,0 +1,78 @@
+from controllers.response_cache import ResponseCache
+
+HISTORY = [
+    {"type": "chat", "user": "hi", "ruby": "hello"},
+    {"type": "poke", "user": "", "ruby": "hey!"},
+]
+
+
+def test_key_ignores_non_chat_entries():
+    cache = ResponseCache()
+    key = cache.make_key("poke", HISTORY)
+    assert key == cache.make_key("poke", HISTORY[:1])
+    assert key == cache.make_key("poke", HISTORY + [{"type": "mood", "user": "", "ruby": "fine"}])
+    assert key != cache.make_key("poke", HISTORY + [{"type": "chat", "user": "a", "ruby": "b"}])
+    assert key != cache.make_key("mood", HISTORY)
+
+
+def test_key_uses_history_window():
+    cache = ResponseCache(history_window=1)
+    older = [{"type": "chat", "user": "old", "ruby": "old"}]
+    assert cache.make_key("poke", older + HISTORY) == cache.make_key("poke", HISTORY)
+
+
+def test_take_consumes_pool_and_counts_hits(clock):
+    cache = ResponseCache(pool_size=2)
+    key = cache.make_key("poke", HISTORY)
+    cache.put(key, "a")
+    cache.put(key, "b")
+    cache.put(key, "c")  # 池已满，丢弃
+    assert cache.take(key) == "a"
+    assert cache.take(key) == "b"
+    assert cache.take(key) is None
+    assert (cache.hits, cache.misses) == (2, 1)
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = ResponseCache(ttl_s=60.0)
+    key = cache.make_key("poke", HISTORY)
+    cache.put(key, "old")
+    clock.advance(30.0)
+    cache.put(key, "new")
+    clock.advance(31.0)
+    assert cache.take(key) == "new"
+    assert cache.take(key) is None
+
+
+def test_lru_evicts_least_recently_used_key(clock):
+    cache = ResponseCache(max_keys=2)
+    a, b, c = ("poke", "a"), ("poke", "b"), ("poke", "c")
+    cache.put(a, "A")
+    cache.put(b, "B")
+    cache.put(a, "A2")  # a 变为最近使用
+    cache.put(c, "C")   # 淘汰 b
+    assert cache.take(b) is None
+    assert cache.take(a) == "A"
+    assert cache.take(c) == "C"
+
+
+def test_missing_count_includes_in_flight(clock):
+    cache = ResponseCache(pool_size=3)
+    key = cache.make_key("mood", HISTORY)
+    assert cache.missing_count(key) == 3
+    cache.put(key, "x")
+    cache.mark_in_flight(key, 1)
+    assert cache.missing_count(key) == 1
+    cache.mark_in_flight(key, -1)
+    assert cache.missing_count(key) == 2
+    cache.mark_in_flight(key, -1)
+    assert cache.missing_count(key) == 2
+
+
+def test_take_any_falls_back_across_keys(clock):
+    cache = ResponseCache()
+    cache.put(("poke", "a"), "A")
+    cache.put(("mood", "b"), "B")
+    assert cache.take_any("poke") == "A"
+    assert cache.take_any("poke") is None
+    assert (cache.hits, cache.misses) == (0, 0)
@@ -0,0 +1,133 @@
+import wave
+
+import numpy as np
+import pytest
+
+pytest.importorskip(
+    "PyQt5.QtMultimedia", reason="QtMultimedia or its audio backend libraries are not installed", exc_type=ImportError
+)
+
+from controllers.sound_controller import AudioMixer, decode_wav  # noqa: E402
+
+
+def _write_wav(path, samples: np.ndarray, rate: int, width: int = 2, channels: int = 1):
+    """写入PCM WAV，samples 为 -1 到 1 之间的浮点数（多声道时按帧交错）"""
+    if width == 1:
+        data = np.round(samples * 127 + 128).astype(np.uint8)
+    elif width == 2:
+        data = np.round(samples * 32767).astype("<i2")
+    elif width == 3:
+        data = np.zeros(len(samples) * 3, dtype=np.uint8)  # 24位：只用于测试不支持的格式
+    else:
+        data = np.round(samples * 2147483647).astype("<i4")
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(channels)
+        f.setsampwidth(width)
+        f.setframerate(rate)
+        f.writeframes(data.tobytes())
+    return str(path)
+
+
+def _tone(count: int, value: float = 0.5) -> np.ndarray:
+    return np.full(count, value, dtype=np.float32)
+
+
+def test_voice_limit_steals_oldest():
+    mixer = AudioMixer(sample_rate=1000, max_voices=3)
+    for i in range(5):
+        mixer.play(f"voice{i}", _tone(100), 0.1)
+    assert [v.name for v in mixer.voices] == ["voice2", "voice3", "voice4"]
+    assert mixer.stolen == 2
+
+
+def test_silent_or_empty_sounds_do_not_take_a_voice():
+    mixer = AudioMixer(max_voices=1)
+    mixer.play("a", _tone(10), 0.5)
+    mixer.play("empty", np.zeros(0, dtype=np.float32), 0.5)
+    mixer.play("muted", _tone(10), 0.0)
+    assert [v.name for v in mixer.voices] == ["a"]
+    assert mixer.stolen == 0
+
+
+def test_voices_mix_with_gain_and_finish():
+    mixer = AudioMixer(sample_rate=1000)
+    mixer.play("long", _tone(150, 0.5), 0.5)
+    mixer.play("short", _tone(50, 0.5), 0.2)
+    block = mixer.render(100)
+    assert block.dtype == np.int16
+    assert block[0] == int(0.35 * 32767)
+    assert block[60] == int(0.25 * 32767)
+    assert [v.name for v in mixer.voices] == ["long"]
+    assert mixer.render(100)[49] == int(0.25 * 32767)
+    assert mixer.voices == []
+    assert not mixer.render(100).any()
+
+
+def test_mix_is_clipped():
+    mixer = AudioMixer(max_voices=4)
+    for _ in range(4):
+        mixer.play("loud", _tone(10, 1.0), 1.0)
+    block = mixer.render(10)
+    assert block.max() == 32767
+
+
+def test_sources_are_pulled_every_block_outside_voice_limit():
+    mixer = AudioMixer(max_voices=1)
+    calls = []
+
+    def source(frames, latency_s):
+        calls.append((frames, latency_s))
+        return _tone(frames, 0.25) if len(calls) == 1 else None
+
+    mixer.add_source(source)
+    mixer.play("a", _tone(10, 0.5), 0.5)
+    assert mixer.render(10, latency_s=0.1)[0] == int(0.5 * 32767)
+    assert mixer.render(10, latency_s=0.2)[0] == 0
+    assert calls == [(10, 0.1), (10, 0.2)]
+    assert mixer.stolen == 0
+
+
+def test_stop_all_silences_voices():
+    mixer = AudioMixer()
+    mixer.play("a", _tone(100), 1.0)
+    mixer.stop_all()
+    assert not mixer.render(10).any()
+
+
+def test_decode_16_bit_mono_at_target_rate(tmp_path):
+    samples = np.linspace(-0.5, 0.5, 100)
+    decoded = decode_wav(_write_wav(tmp_path / "a.wav", samples, 8000), sample_rate=8000)
+    assert decoded.dtype == np.float32
+    assert np.allclose(decoded, samples, atol=1e-4)
+
+
+def test_decode_resamples_to_target_rate(tmp_path):
+    samples = np.sin(np.linspace(0, 2 * np.pi, 4000, endpoint=False))
+    decoded = decode_wav(_write_wav(tmp_path / "a.wav", samples, 4000), sample_rate=8000)
+    assert len(decoded) == 8000
+    assert np.allclose(decoded[::2], samples, atol=1e-4)
+    assert np.allclose(decoded[1::2][:-1], (samples[:-1] + samples[1:]) / 2, atol=1e-4)
+
+    down = decode_wav(_write_wav(tmp_path / "b.wav", samples, 4000), sample_rate=2000)
+    assert len(down) == 2000
+    assert np.allclose(down, samples[::2], atol=1e-4)
+
+
+def test_decode_downmixes_stereo(tmp_path):
+    left, right = np.full(50, 0.6), np.full(50, -0.2)
+    interleaved = np.column_stack((left, right)).ravel()
+    decoded = decode_wav(_write_wav(tmp_path / "s.wav", interleaved, 8000, channels=2), sample_rate=8000)
+    assert len(decoded) == 50
+    assert np.allclose(decoded, 0.2, atol=1e-4)
+
+
+@pytest.mark.parametrize("width, tolerance", [(1, 1e-2), (4, 1e-6)])
+def test_decode_other_sample_widths(tmp_path, width, tolerance):
+    samples = np.array([-0.5, 0.0, 0.25, 0.5])
+    decoded = decode_wav(_write_wav(tmp_path / "w.wav", samples, 8000, width=width), sample_rate=8000)
+    assert np.allclose(decoded, samples, atol=tolerance)
+
+
+def test_decode_rejects_unsupported_width(tmp_path):
+    with pytest.raises(wave.Error):
+        decode_wav(_write_wav(tmp_path / "x.wav", np.zeros(4), 8000, width=3), sample_rate=8000)
@@ -18,15 +18,114 @@ ERROR_HEART_COLOR = "#AA0000"    # 深红色
 # 动画和定时器相关常量
 DEFAULT_PULSE_FREQUENCY = 1.0
 DEFAULT_ANIMATION_DURATION_MS = 500
-PARTICLE_UPDATE_INTERVAL_MS = 16  # ~60 FPS
-COLOR_TRANSITION_STEPS = 20
-PULSATION_TIMER_INTERVAL_MS = 30
+FRAME_INTERVAL_MS = 16  # 统一帧时钟间隔，~60 FPS
+MAX_FRAME_DT_MS = 100  # 单帧最大步长，避免卡顿后动画跳变
+COLOR_TRANSITION_DURATION_MS = 800
+COLOR_TRANSITION_STEPS = 12  # 颜色过渡量化为的级数，相邻几帧共用同一种颜色，从而复用同一张预渲染位图
+PULSATION_TIMER_INTERVAL_MS = 30  # 频率平滑的参考步长
+HEART_SPRITE_CACHE_SIZE = 32  # 预渲染心形位图的LRU缓存上限
+HEART_SPRITE_TRANSIENT_CACHE_SIZE = 8  # 颜色过渡和发光帧使用的临时位图缓存上限，不挤占稳定颜色的LRU
+HEART_TEXT_CACHE_SIZE = 8  # 心形显示文本排版结果的LRU缓存上限（脉动时字号和排版矩形只在少数几个值之间变化）
+PARTICLE_POOL_CAPACITY = 4096  # 粒子池硬上限
+PARTICLE_OVERFLOW_POLICY = "drop_oldest"  # 粒子池满时的策略: drop_oldest / drop_newest
+FRAME_PROFILER_WINDOW = 240  # 帧时间分析器保留的最近帧数
+FRAME_PROFILER_OVERLAY_REFRESH_MS = 250  # 调试覆盖层的刷新间隔（环境变量 RUBY_FRAME_PROFILER=1 时默认显示）
+DROPPED_FRAME_FACTOR = 1.5  # 帧间隔超过目标间隔的这个倍数时计为掉帧
+# 程序化心跳音频：按心形的脉动相位实时合成“扑通”两声，作为混音器的一路持续声源播放
+HEARTBEAT_LUB_PHASE = 0.2  # 第一声在脉动周期中的位置（周期数，0.25 为心形最大时）
+HEARTBEAT_DUB_DELAY_S = 0.14  # 第二声相对第一声的延迟
+HEARTBEAT_DUB_MAX_FRACTION = 0.35  # 高频时第二声的延迟不超过周期的这个比例
+HEARTBEAT_PHASE_CORRECTION_PER_S = 2.0  # 每秒修正的相位误差比例
+HEARTBEAT_PHASE_SNAP = 0.25  # 相位误差超过这么多周期时直接对齐（例如从空闲模式恢复）
+HEARTBEAT_VOLUME = 0.8
 OUTPUT_HIDE_TIMEOUT_MS = 12000
 ERROR_HIDE_TIMEOUT_MS = 20000
 
 # API相关
 GEMINI_MODEL_NAME = 'gemini-2.0-flash-lite'
+GEMINI_BACKEND = "genai"  # genai / local（离线替身，可用环境变量 RUBY_GEMINI_BACKEND 覆盖）
+GEMINI_STREAMING = True  # 使用流式接口，尽早更新心形和长对话
+GEMINI_CONTEXT_CACHE_ENABLED = False  # 将静态系统指令注册为上下文缓存（当前系统指令远低于所用模型的最小长度，默认关闭）
+# 显式上下文缓存要求的最小token数，按模型名前缀匹配，未列出的模型使用 default
+GEMINI_CONTEXT_CACHE_MIN_TOKENS = {"gemini-2.5-flash": 1024, "gemini-2.5-pro": 4096, "default": 4096}
+GEMINI_CONTEXT_CACHE_TTL_S = 3600.0
+GEMINI_CONTEXT_CACHE_REFRESH_MARGIN_S = 60.0  # 过期前提前续建
+GEMINI_CONTEXT_CACHE_RETRY_S = 600.0  # 注册失败后再次尝试的间隔
+GEMINI_REQUEST_POLICY = "latest_wins"  # 并发请求策略: latest_wins / debounce / fifo
+GEMINI_DEBOUNCE_MS = 400  # debounce 策略下合并连续戳一戳的时间窗口
+COALESCIBLE_INTERACTIONS = ("poke_reaction", "mood_query")  # debounce 策略下可合并的自动交互
+
+# 请求耗时指标：导出由环境变量 RUBY_METRICS_FILE（.prom 为Prometheus文本，否则为JSON）和 RUBY_METRICS_PORT 开启
+METRICS_WINDOW_SIZE = 2048  # 每个直方图保留的最近样本数
+METRICS_EXPORT_INTERVAL_S = 10.0  # 写导出文件的间隔
+
+# 本地替身后端的延迟配置：首块延迟和分块间隔为 (中位数毫秒, 对数正态sigma)
+LOCAL_BACKEND_PROFILE = "typical"
+LOCAL_BACKEND_SEED = 1234
+LOCAL_BACKEND_PROFILES = {
+    "instant": {"first_chunk_ms": (0, 0), "chunk_interval_ms": (0, 0), "chunk_chars": 32,
+                "error_rate": 0.0, "error_codes": (503,)},
+    "typical": {"first_chunk_ms": (400, 0.35), "chunk_interval_ms": (40, 0.5), "chunk_chars": 24,
+                "error_rate": 0.0, "error_codes": (503,)},
+    "slow": {"first_chunk_ms": (1500, 0.5), "chunk_interval_ms": (150, 0.5), "chunk_chars": 16,
+             "error_rate": 0.0, "error_codes": (503,)},
+    "flaky": {"first_chunk_ms": (400, 0.35), "chunk_interval_ms": (40, 0.5), "chunk_chars": 24,
+              "error_rate": 0.2, "error_codes": (429, 500, 503)},
+}
+
+# 回复缓存：戳一戳和询问心情的提示几乎不变，预取多条回复以便立即响应
+CACHEABLE_INTERACTIONS = ("poke_reaction", "mood_query")
+RESPONSE_CACHE_POOL_SIZE = 3  # 每个键预取的回复数
+RESPONSE_CACHE_TTL_S = 600.0  # 预取回复的有效期
+RESPONSE_CACHE_MAX_KEYS = 16  # LRU淘汰前保留的键数
+RESPONSE_CACHE_HISTORY_WINDOW = 2  # 参与缓存键计算的最近聊天条数
+GEMINI_REQUEST_TIMEOUT_S = 20.0  # 单次请求（含流式接收）的超时
+GEMINI_MAX_RETRIES = 2  # 暂时性错误的最大重试次数
+GEMINI_RETRYABLE_STATUS_CODES = (408, 429, 500, 502, 503, 504)
+GEMINI_BACKOFF_BASE_S = 0.5  # 指数退避的初始上限（完全抖动）
+GEMINI_BACKOFF_MAX_S = 8.0
+CIRCUIT_FAILURE_THRESHOLD = 5  # 连续失败多少次后熔断
+CIRCUIT_RESET_TIMEOUT_S = 30.0  # 熔断后多久允许一次探测请求
+GEMINI_MAX_CONCURRENCY = 4  # Gemini线程池的最大并发请求数
+GEMINI_RATE_LIMIT_RPM = 30  # 客户端限流：每分钟请求数
+GEMINI_RATE_LIMIT_TPM = 1000000  # 客户端限流：每分钟token数
+GEMINI_RATE_LIMIT_RESERVE = 0.2  # 为用户主动聊天保留的配额比例，自动请求不能使用
+GEMINI_EXPECTED_OUTPUT_TOKENS = 256  # 限流时为每次回复预估的输出token数
+# 线程池中的优先级：用户主动聊天优先于自动的戳一戳/询问心情，预取最低
+GEMINI_REQUEST_PRIORITIES = {"chat": 2, "poke_reaction": 1, "mood_query": 1}
+GEMINI_PREFETCH_PRIORITY = 0
 API_KEY = ""  # 实际应用中应通过环境变量获取
+GEMINI_HTTP_MAX_CONNECTIONS = 8  # 共享客户端的HTTP连接池大小
+GEMINI_HTTP_KEEPALIVE_EXPIRY_S = 120.0  # 空闲连接保持时间
+GEMINI_WARM_UP_DELAY_MS = 100  # 启动后延迟多久在后台导入SDK、构建模型并创建客户端（让窗口先显示）
+
+# 聊天历史
+HISTORY_TOKEN_BUDGET = 800  # 原样保留的历史对话的估算token预算
+HISTORY_SUMMARY_TOKEN_BUDGET = 200  # 滚动摘要的估算token上限
+HISTORY_SUMMARY_CLIP_CHARS = 40  # 摘要中每句话保留的最大字符数
+HISTORY_RESTORE_MAX_TURNS = 50  # 启动时从对话记录中最多读取的轮数（再按token预算截取）
+
+# 对话记录持久化
+CONVERSATION_DB_PATH = "data/conversation.db"
+CONVERSATION_WRITE_BATCH_SIZE = 32  # 单个事务最多提交的记录数
+CONVERSATION_FLUSH_INTERVAL_S = 0.5  # 攒批写入的最长等待时间
+
+# 资源清单：声音名 -> 文件名（位于 SOUND_DIR）。启动后在后台按清单一次性检查，缺失的文件写入静音占位WAV
+SOUND_DIR = "resources/sounds"
+SOUND_MANIFEST = {
+    "poke": "poke.wav",
+    "pop": "pop.wav",
+    "spin": "swoosh.wav",
+    "jiggle": "jiggle.wav",
+    "message_receive": "message.wav",
+    "ui_click": "click.wav",
+}
+SOUND_DEFAULT_VOLUME = 0.6
+# 软件混音器：所有声音解码为内存中的PCM后混合成一路输出，整个应用只打开一个音频设备
+AUDIO_SAMPLE_RATE = 44100  # 混音和输出的采样率（单声道16位），声音文件加载时重采样到这个采样率
+AUDIO_BUFFER_MS = 100  # 音频输出缓冲时长（即延迟）
+SOUND_MAX_VOICES = 8  # 同时播放的音效上限，超出时停止最早开始的那个
+RESOURCE_BOOTSTRAP_DELAY_MS = 50  # 启动后延迟多久开始检查资源并加载音效（让窗口先完成首帧绘制）
 
 # 快速回复文本
 QUICK_RESPONSES = ["Ouch!", "Hehe!", "Eep!", "Hmm?", ":)"]
\ No newline at end of file
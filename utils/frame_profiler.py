@@ -0,0 +1,83 @@
+# 帧时间分析器：统计帧间隔、每帧更新和绘制耗时以及掉帧数，供调试覆盖层和性能回归测试使用
+import math
+import time
+from collections import deque
+from typing import Deque, Dict
+
+from utils.constants import FRAME_INTERVAL_MS, FRAME_PROFILER_WINDOW, DROPPED_FRAME_FACTOR
+
+
+def _percentile(values, q: float) -> float:
+    """最近秩法分位数，空序列返回0"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+
+class FrameProfiler:
+    """记录最近 window 帧的计时数据
+
+    帧间隔超过 DROPPED_FRAME_FACTOR 倍目标间隔时，按错过的帧数计入掉帧。
+    记录只是向有界队列追加数值，开销可以忽略，因此始终开启。
+    """
+
+    def __init__(self, window: int = FRAME_PROFILER_WINDOW, target_interval_ms: float = FRAME_INTERVAL_MS):
+        self.target_interval_ms = target_interval_ms
+        self._tick_intervals: Deque[float] = deque(maxlen=window)
+        self._update_times: Deque[float] = deque(maxlen=window)
+        self._paint_times: Deque[float] = deque(maxlen=window)
+        self._paint_stamps: Deque[float] = deque(maxlen=window)
+        self.ticks = 0
+        self.paints = 0
+        self.dropped_frames = 0
+
+    def record_tick(self, interval_ms: float, update_ms: float):
+        """记录一次帧时钟回调
+
+        Args:
+            interval_ms: 距上一次回调的实测间隔（未截断）
+            update_ms: 本次回调推进动画所用的时间
+        """
+        self.ticks += 1
+        self._tick_intervals.append(interval_ms)
+        self._update_times.append(update_ms)
+        if interval_ms > self.target_interval_ms * DROPPED_FRAME_FACTOR:
+            self.dropped_frames += max(1, round(interval_ms / self.target_interval_ms) - 1)
+
+    def record_paint(self, paint_ms: float):
+        """记录一次 paintEvent 的耗时"""
+        self.paints += 1
+        self._paint_times.append(paint_ms)
+        self._paint_stamps.append(time.perf_counter())
+
+    def fps(self) -> float:
+        """最近一秒内实际完成的绘制次数"""
+        now = time.perf_counter()
+        return float(sum(1 for stamp in self._paint_stamps if now - stamp <= 1.0))
+
+    def stats(self) -> Dict[str, float]:
+        """返回当前统计
+
+        Returns:
+            fps, paint_ms_avg, paint_ms_p99, update_ms_avg, frame_ms_p99（帧间隔）,
+            ticks, paints, dropped_frames
+        """
+        paint_times = list(self._paint_times)
+        update_times = list(self._update_times)
+        return {
+            "fps": self.fps(),
+            "paint_ms_avg": sum(paint_times) / len(paint_times) if paint_times else 0.0,
+            "paint_ms_p99": _percentile(paint_times, 0.99),
+            "update_ms_avg": sum(update_times) / len(update_times) if update_times else 0.0,
+            "frame_ms_p99": _percentile(self._tick_intervals, 0.99),
+            "ticks": self.ticks,
+            "paints": self.paints,
+            "dropped_frames": self.dropped_frames,
+        }
+
+    def reset(self):
+        """清空所有统计"""
+        for samples in (self._tick_intervals, self._update_times, self._paint_times, self._paint_stamps):
+            samples.clear()
+        self.ticks = self.paints = self.dropped_frames = 0
@@ -0,0 +1,100 @@
+# 心形精灵缓存，避免每帧逐像素绘制心形矩阵
+from collections import OrderedDict
+from typing import Tuple
+
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QPainter, QPixmap, QColor
+
+from utils.constants import (
+    HEART_PIXEL_MATRIX, HEART_MATRIX_HEIGHT, HEART_MATRIX_WIDTH,
+    HEART_SPRITE_CACHE_SIZE, HEART_SPRITE_TRANSIENT_CACHE_SIZE
+)
+
+
+class HeartSpriteCache:
+    """按 (像素尺寸, 基色/高光/阴影颜色, 设备像素比) 缓存预渲染的心形位图
+
+    使用有界 LRU 淘汰，脉动时像素尺寸只在少数几个值之间变化，
+    因此绝大多数帧都能直接命中缓存。颜色过渡和发光期间颜色逐帧变化，
+    这些临时颜色的位图放在单独的小 LRU 中，不会把稳定颜色的条目挤出主缓存。
+    """
+
+    def __init__(self, max_entries: int = HEART_SPRITE_CACHE_SIZE,
+                 max_transient_entries: int = HEART_SPRITE_TRANSIENT_CACHE_SIZE):
+        self.max_entries = max(1, max_entries)
+        self.max_transient_entries = max(1, max_transient_entries)
+        self._sprites: "OrderedDict[Tuple, QPixmap]" = OrderedDict()
+        self._transient: "OrderedDict[Tuple, QPixmap]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, pixel_size: int, base_color: QColor, highlight_color: QColor,
+            shadow_color: QColor, device_pixel_ratio: float = 1.0, transient: bool = False) -> QPixmap:
+        """获取心形位图，不存在时渲染并放入缓存
+
+        Args:
+            pixel_size: 每个矩阵单元的边长（逻辑像素）
+            base_color: 基色
+            highlight_color: 高光颜色
+            shadow_color: 阴影颜色
+            device_pixel_ratio: 设备像素比，用于高DPI屏幕
+            transient: 颜色只在过渡中短暂出现，未命中时放入临时缓存而不是主缓存
+
+        Returns:
+            预渲染的心形位图（逻辑尺寸为 矩阵宽 x 矩阵高 个像素单元）
+        """
+        key = (pixel_size, base_color.rgba(), highlight_color.rgba(),
+               shadow_color.rgba(), device_pixel_ratio)
+        sprite = self._sprites.get(key)
+        if sprite is not None:
+            self._sprites.move_to_end(key)
+            self.hits += 1
+            return sprite
+
+        if transient:
+            entries, max_entries = self._transient, self.max_transient_entries
+            sprite = entries.get(key)
+            if sprite is not None:
+                entries.move_to_end(key)
+                self.hits += 1
+                return sprite
+        else:
+            entries, max_entries = self._sprites, self.max_entries
+
+        self.misses += 1
+        sprite = self._render(pixel_size, base_color, highlight_color, shadow_color, device_pixel_ratio)
+        entries[key] = sprite
+        if len(entries) > max_entries:
+            entries.popitem(last=False)  # 淘汰最久未使用的条目
+        return sprite
+
+    def clear(self):
+        """清空缓存"""
+        self._sprites.clear()
+        self._transient.clear()
+
+    def __len__(self):
+        return len(self._sprites)
+
+    @staticmethod
+    def _render(pixel_size: int, base_color: QColor, highlight_color: QColor,
+                shadow_color: QColor, device_pixel_ratio: float) -> QPixmap:
+        """将心形矩阵渲染到透明位图中"""
+        width = HEART_MATRIX_WIDTH * pixel_size
+        height = HEART_MATRIX_HEIGHT * pixel_size
+        sprite = QPixmap(max(1, round(width * device_pixel_ratio)),
+                         max(1, round(height * device_pixel_ratio)))
+        sprite.setDevicePixelRatio(device_pixel_ratio)
+        sprite.fill(Qt.transparent)
+
+        cell_colors = {1: base_color, 2: highlight_color, 3: shadow_color}
+        painter = QPainter(sprite)
+        painter.setPen(Qt.NoPen)
+        for r, row_data in enumerate(HEART_PIXEL_MATRIX):
+            for c, cell_type in enumerate(row_data):
+                color = cell_colors.get(cell_type)
+                if color is None:
+                    continue
+                painter.fillRect(c * pixel_size, r * pixel_size, pixel_size, pixel_size, color)
+        painter.end()
+        return sprite
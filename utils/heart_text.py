@@ -0,0 +1,119 @@
+# 心形显示文本的排版缓存，避免每帧重新整形和换行
+import math
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Tuple
+
+from PyQt5.QtCore import Qt, QPointF, QRectF
+from PyQt5.QtGui import QColor, QFont, QFontMetricsF, QStaticText, QTextLayout, QTextOption, QTransform
+
+from utils.constants import HEART_TEXT_CACHE_SIZE
+
+
+class HeartText(NamedTuple):
+    """排版好的显示文本"""
+    static_text: QStaticText
+    centering_height: float  # 垂直居中时使用的文本高度，算法与 drawText 相同
+
+
+class HeartTextCache:
+    """按 (文本, 字号, 排版矩形尺寸, 文本颜色) 缓存排版好的 QStaticText
+
+    文本只在 set_display_text 时改变，字号和排版矩形随脉动在少数几个值之间变化，
+    因此绝大多数帧只需要一次绘制调用，不再重新整形和换行。位置不在键中：
+    颤抖、抖动带来的平移不会使缓存失效。
+    """
+
+    def __init__(self, max_entries: int = HEART_TEXT_CACHE_SIZE):
+        self.max_entries = max(1, max_entries)
+        self._layouts: "OrderedDict[Tuple, HeartText]" = OrderedDict()
+        self._fonts: Dict[int, QFont] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def font(self, point_size: int) -> QFont:
+        """返回指定字号的显示字体（Arial 粗体），同一字号只创建一次"""
+        font = self._fonts.get(point_size)
+        if font is None:
+            font = self._fonts[point_size] = QFont("Arial", point_size, QFont.Bold)
+        return font
+
+    def get(self, text: str, font: QFont, rect: QRectF, color: QColor) -> HeartText:
+        """获取排版好的文本，不存在时排版并放入缓存
+
+        Args:
+            text: 显示文本
+            font: 字体
+            rect: 排版矩形，只使用其尺寸
+            color: 文本颜色
+
+        Returns:
+            宽度为 rect 宽度、水平居中并按单词换行的静态文本，以及垂直居中用的高度
+        """
+        key = (text, font.pointSize(), rect.width(), rect.height(), color.rgba())
+        layout = self._layouts.get(key)
+        if layout is not None:
+            self._layouts.move_to_end(key)
+            self.hits += 1
+            return layout
+
+        self.misses += 1
+        layout = HeartText(self._layout(text, font, rect.width()), self._centering_height(text, font, rect))
+        self._layouts[key] = layout
+        if len(self._layouts) > self.max_entries:
+            self._layouts.popitem(last=False)  # 淘汰最久未使用的条目
+        return layout
+
+    def clear(self):
+        """清空缓存"""
+        self._layouts.clear()
+        self._fonts.clear()
+
+    def __len__(self):
+        return len(self._layouts)
+
+    @staticmethod
+    def position(layout: HeartText, rect: QRectF) -> QPointF:
+        """静态文本在 rect 中垂直居中时的左上角（超出 rect 高度时向上下溢出，与 drawText 一致）"""
+        return QPointF(rect.x(), rect.y() + (rect.height() - layout.centering_height) / 2)
+
+    @staticmethod
+    def overflows(layout: HeartText, rect: QRectF) -> bool:
+        """排版结果是否超出 rect，超出时绘制需要裁剪到 rect（drawText 同样裁剪）"""
+        size = layout.static_text.size()
+        return size.width() > rect.width() or size.height() > rect.height()
+
+    @staticmethod
+    def _centering_height(text: str, font: QFont, rect: QRectF) -> float:
+        """按 drawText 的方式计算垂直居中所用的高度
+
+        drawText 逐行累加行高（行首对齐到整像素）。PyQt 的 drawText 总会请求外接矩形，
+        Qt 因此不会在高度达到 rect 高度后提前停止排版，溢出的文本同样以全部行的高度居中。
+        """
+        leading = QFontMetricsF(font).leading()
+        option = QTextOption()
+        option.setWrapMode(QTextOption.WordWrap)
+        text_layout = QTextLayout(text, font)
+        text_layout.setTextOption(option)
+        text_layout.beginLayout()
+        height = -leading
+        while True:
+            line = text_layout.createLine()
+            if not line.isValid():
+                break
+            line.setLineWidth(rect.width())
+            height = math.ceil(height + leading) + line.height()
+        text_layout.endLayout()
+        return max(0.0, height)
+
+    @staticmethod
+    def _layout(text: str, font: QFont, width: float) -> QStaticText:
+        """排版文本：纯文本、水平居中、按单词换行"""
+        layout = QStaticText(text)
+        layout.setTextFormat(Qt.PlainText)
+        layout.setTextWidth(width)
+        option = QTextOption()
+        option.setAlignment(Qt.AlignHCenter)
+        option.setWrapMode(QTextOption.WordWrap)
+        layout.setTextOption(option)
+        layout.prepare(QTransform(), font)
+        return layout
@@ -0,0 +1,108 @@
+# 程序化心跳合成器：按脉动相位生成“扑通”（lub-dub）两声的PCM采样，不依赖声音文件和逐拍定时器
+import math
+from typing import List
+
+import numpy as np
+
+from utils.constants import (
+    AUDIO_SAMPLE_RATE, DEFAULT_PULSE_FREQUENCY, HEARTBEAT_LUB_PHASE, HEARTBEAT_DUB_DELAY_S,
+    HEARTBEAT_DUB_MAX_FRACTION, HEARTBEAT_PHASE_CORRECTION_PER_S, HEARTBEAT_PHASE_SNAP, HEARTBEAT_VOLUME
+)
+
+
+def _thump(sample_rate: int, pitch_hz: float, duration_s: float, decay_s: float, amplitude: float) -> np.ndarray:
+    """生成一声低沉的“扑”：快速起音、指数衰减、音高略微下滑的正弦"""
+    t = np.arange(int(sample_rate * duration_s), dtype=np.float64) / sample_rate
+    envelope = (1.0 - np.exp(-t / 0.004)) * np.exp(-t / decay_s)
+    wave = np.sin(2.0 * math.pi * (pitch_hz * t - 0.5 * pitch_hz * 0.6 * t * t / duration_s))
+    return (amplitude * envelope * wave).astype(np.float32)
+
+
+def beat_gain(frequency_hz: float) -> float:
+    """心跳越快声音越响"""
+    return min(1.0, 0.35 + 0.08 * frequency_hz)
+
+
+class HeartbeatSynth:
+    """按相位合成心跳声
+
+    相位以周期数表示（0-1，与 HeartWidget.angle / 2π 一致），每当相位越过 HEARTBEAT_LUB_PHASE
+    就触发第一声，随后按 HEARTBEAT_DUB_DELAY_S 触发第二声。频率变化只改变相位推进的速度，
+    不会打断正在发声的节拍。sync() 根据画面的脉动相位微调推进速度，使声音与画面保持同步。
+    """
+
+    def __init__(self, sample_rate: int = AUDIO_SAMPLE_RATE, volume: float = HEARTBEAT_VOLUME):
+        self.sample_rate = sample_rate
+        self.volume = volume
+        self.phase = 0.0
+        self.frequency_hz = DEFAULT_PULSE_FREQUENCY
+        self.frames_rendered = 0
+        self._phase_error = 0.0
+        self._lub = _thump(sample_rate, 55.0, 0.16, 0.045, 1.0)
+        self._dub = _thump(sample_rate, 75.0, 0.12, 0.03, 0.65)
+        self._tail = np.zeros(0, dtype=np.float32)  # 跨块延续的发声部分
+
+    def sync(self, visual_phase: float, frequency_hz: float, latency_s: float = 0.0):
+        """与画面的脉动相位对齐
+
+        Args:
+            visual_phase: 画面此刻的相位（周期数）
+            frequency_hz: 画面此刻的脉动频率
+            latency_s: 下一块采样要等多久才会被听到（输出缓冲中尚未播放的时长）
+        """
+        self.frequency_hz = max(0.0, frequency_hz)
+        # 下一块采样被听到时，画面应处于的相位
+        expected = visual_phase + latency_s * self.frequency_hz
+        error = (expected - self.phase + 0.5) % 1.0 - 0.5
+        if abs(error) > HEARTBEAT_PHASE_SNAP:
+            self.phase = expected % 1.0
+            error = 0.0
+        self._phase_error = error
+
+    def render(self, frames: int) -> np.ndarray:
+        """生成下一块采样
+
+        Args:
+            frames: 采样数
+
+        Returns:
+            float32 单声道采样（约在 -1 到 1 之间，由混音器统一限幅）
+        """
+        if frames <= 0:
+            return np.zeros(0, dtype=np.float32)
+        # 相位误差在多个块内逐步修正，节拍间隔只会轻微伸缩
+        correction = self._phase_error * min(1.0, HEARTBEAT_PHASE_CORRECTION_PER_S * frames / self.sample_rate)
+        self._phase_error -= correction
+        cycles = self.frequency_hz * frames / self.sample_rate + correction
+
+        dub_delay = int(self.sample_rate * min(
+            HEARTBEAT_DUB_DELAY_S, HEARTBEAT_DUB_MAX_FRACTION / max(self.frequency_hz, 1e-3)
+        ))
+        buffer = np.zeros(max(frames + dub_delay + len(self._lub), len(self._tail)), dtype=np.float32)
+        buffer[:len(self._tail)] += self._tail
+
+        gain = self.volume * beat_gain(self.frequency_hz)
+        for onset in self._lub_onsets(frames, cycles):
+            buffer[onset:onset + len(self._lub)] += gain * self._lub
+            start = onset + dub_delay
+            buffer[start:start + len(self._dub)] += gain * self._dub
+
+        self.phase = (self.phase + cycles) % 1.0
+        self.frames_rendered += frames
+        self._tail = buffer[frames:].copy()
+        if not self._tail.any():
+            self._tail = self._tail[:0]
+        return buffer[:frames]
+
+    def _lub_onsets(self, frames: int, cycles: float) -> List[int]:
+        """本块中相位越过 HEARTBEAT_LUB_PHASE 的采样位置"""
+        if cycles <= 0:
+            return []
+        start = self.phase - HEARTBEAT_LUB_PHASE
+        first = math.floor(start) + 1  # 下一次越过时的相位整数部分
+        onsets = []
+        per_frame = cycles / frames
+        while first - start <= cycles:
+            onsets.append(min(frames - 1, int((first - start) / per_frame)))
+            first += 1
+        return onsets
@@ -0,0 +1,208 @@
+# 增量JSON解析器，用于在流式响应到达时尽早取出顶层字段
+import json
+from typing import Any, List, Optional, Tuple
+
+
+class IncrementalJsonObjectParser:
+    """逐块解析一个顶层JSON对象
+
+    每次 feed() 返回本次新产生的事件列表：
+      ("field", key, value)  顶层字段完整解析后产生
+      ("delta", key, text)   顶层字符串字段在完成前新增的文本片段
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        self._state = "start"  # start/key/colon/value/string/scalar/nested/comma/done
+        self._key: Optional[str] = None
+        self._value_start = 0
+        self._decoded_parts: List[str] = []  # 未完成字符串中已通过 delta 事件发出的文本
+        self._decoded_raw_end = 0  # 未完成字符串中已解码部分在缓冲区中的结束位置
+        self._depth = 0
+        self._in_nested_string = False
+        self._nested_escape = False
+
+    @property
+    def done(self) -> bool:
+        """对象是否已完整解析"""
+        return self._state == "done"
+
+    def feed(self, chunk: str) -> List[Tuple[str, str, Any]]:
+        """输入一块新数据
+
+        Args:
+            chunk: 新到达的文本
+
+        Returns:
+            本次产生的事件列表
+        """
+        self._buffer += chunk
+        events: List[Tuple[str, str, Any]] = []
+        buf = self._buffer
+        while self._pos < len(buf) and self._state != "done":
+            ch = buf[self._pos]
+            state = self._state
+
+            if state in ("start", "key", "colon", "value", "comma") and ch.isspace():
+                self._pos += 1
+            elif state == "start":
+                if ch != "{":
+                    raise ValueError(f"Expected '{{' at position {self._pos}")
+                self._state = "key"
+                self._pos += 1
+            elif state == "key":
+                if ch == "}":
+                    self._state = "done"
+                    self._pos += 1
+                    continue
+                end, _ = self._find_string_end(buf, self._pos + 1)
+                if end < 0:
+                    break  # 键尚未完整
+                self._key = json.loads(buf[self._pos:end + 1])
+                self._pos = end + 1
+                self._state = "colon"
+            elif state == "colon":
+                if ch != ":":
+                    raise ValueError(f"Expected ':' at position {self._pos}")
+                self._state = "value"
+                self._pos += 1
+            elif state == "value":
+                self._value_start = self._pos
+                if ch == '"':
+                    self._state = "string"
+                    self._decoded_parts = []
+                    self._pos += 1
+                    self._decoded_raw_end = self._pos
+                elif ch in "{[":
+                    self._state = "nested"
+                    self._depth = 0
+                    self._in_nested_string = False
+                    self._nested_escape = False
+                else:
+                    self._state = "scalar"
+            elif state == "string":
+                end, resume = self._find_string_end(buf, self._pos)
+                if end < 0:
+                    # 字符串未完成：发出可安全解码部分的增量
+                    self._pos = resume
+                    delta = self._pending_string_delta(buf)
+                    if delta:
+                        events.append(("delta", self._key, delta))
+                    break
+                tail = json.loads(f'"{buf[self._decoded_raw_end:end]}"', strict=False)
+                if tail:
+                    events.append(("delta", self._key, tail))
+                self._decoded_parts.append(tail)
+                events.append(("field", self._key, "".join(self._decoded_parts)))
+                self._decoded_parts = []
+                self._pos = end + 1
+                self._state = "comma"
+            elif state == "scalar":
+                if ch in ",}" or ch.isspace():
+                    raw = buf[self._value_start:self._pos].strip()
+                    events.append(("field", self._key, json.loads(raw)))
+                    self._state = "comma"
+                else:
+                    self._pos += 1
+            elif state == "nested":
+                self._pos += 1
+                if self._in_nested_string:
+                    if self._nested_escape:
+                        self._nested_escape = False
+                    elif ch == "\\":
+                        self._nested_escape = True
+                    elif ch == '"':
+                        self._in_nested_string = False
+                elif ch == '"':
+                    self._in_nested_string = True
+                elif ch in "{[":
+                    self._depth += 1
+                elif ch in "}]":
+                    self._depth -= 1
+                    if self._depth == 0:
+                        events.append(("field", self._key, json.loads(buf[self._value_start:self._pos])))
+                        self._state = "comma"
+            elif state == "comma":
+                if ch == ",":
+                    self._state = "key"
+                elif ch == "}":
+                    self._state = "done"
+                else:
+                    raise ValueError(f"Expected ',' or '}}' at position {self._pos}")
+                self._pos += 1
+        self._compact()
+        return events
+
+    def _compact(self):
+        """丢弃缓冲区中已经处理完、之后不会再读取的前缀，避免长响应逐块到达时反复复制整个缓冲区"""
+        if self._state == "string":
+            keep_from = self._decoded_raw_end
+        elif self._state in ("scalar", "nested"):
+            keep_from = self._value_start
+        else:
+            keep_from = self._pos
+        if keep_from <= 0:
+            return
+        self._buffer = self._buffer[keep_from:]
+        self._pos -= keep_from
+        self._value_start -= keep_from
+        self._decoded_raw_end -= keep_from
+
+    @staticmethod
+    def _find_string_end(buf: str, start: int) -> Tuple[int, int]:
+        """从 start 开始查找未转义的右引号
+
+        Returns:
+            (右引号位置，未找到时为 -1；下次继续扫描的位置)
+        """
+        i = start
+        while i < len(buf):
+            ch = buf[i]
+            if ch == "\\":
+                if i + 1 >= len(buf):
+                    return -1, i  # 转义字符被截断，下次从反斜杠处重新扫描
+                i += 2
+                continue
+            if ch == '"':
+                return i, i
+            i += 1
+        return -1, i
+
+    @staticmethod
+    def _decodable_prefix(raw: str) -> str:
+        """返回未完成字符串中不以残缺转义序列（或落单的高位代理）结尾的最长前缀"""
+        i = 0
+        while i < len(raw):
+            if raw[i] != "\\":
+                i += 1
+                continue
+            if i + 1 >= len(raw):
+                break
+            if raw[i + 1] != "u":
+                i += 2
+                continue
+            if i + 6 > len(raw):
+                break
+            if 0xD800 <= int(raw[i + 2:i + 6], 16) <= 0xDBFF:
+                # 高位代理必须与随后的低位代理 "\\uDCxx" 一起解码
+                if i + 12 > len(raw):
+                    break
+                i += 12
+            else:
+                i += 6
+        return raw[:i]
+
+    def _pending_string_delta(self, buf: str) -> str:
+        """只解码未完成字符串中上次之后新到达、且可以安全解码的部分，返回新增的文本
+
+        已解码部分总是结束在完整的转义序列之后，因此新部分可以单独解码，
+        每个字符只解码一次，长字符串逐块到达时总开销是线性的。
+        """
+        raw = self._decodable_prefix(buf[self._decoded_raw_end:])
+        if not raw:
+            return ""
+        delta = json.loads(f'"{raw}"', strict=False)
+        self._decoded_raw_end += len(raw)
+        self._decoded_parts.append(delta)
+        return delta
@@ -0,0 +1,211 @@
+# 延迟和吞吐量指标：滑动窗口直方图（p50/p95/p99），可导出为JSON文件或Prometheus文本
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Deque, Dict, Optional, Tuple
+
+from utils.constants import METRICS_WINDOW_SIZE, METRICS_EXPORT_INTERVAL_S
+
+logger = logging.getLogger(__name__)
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Histogram:
+    """保留最近 window_size 个样本的直方图，累计计数和总和不受窗口限制（不加锁，由 MetricsRegistry 保护）"""
+
+    def __init__(self, window_size: int = METRICS_WINDOW_SIZE):
+        self._samples: Deque[Tuple[float, float]] = deque(maxlen=max(1, window_size))  # (时刻, 值)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float, now: float):
+        """记录一个样本"""
+        self._samples.append((now, value))
+        self.count += 1
+        self.total += value
+
+    def summary(self, now: float) -> Dict[str, float]:
+        """计算窗口内的分位数、最大值和最近一分钟的速率"""
+        values = sorted(value for _, value in self._samples)
+        result = {"count": self.count, "sum": self.total}
+        if values:
+            for q in QUANTILES:
+                # 最近秩法：不插值，结果总是实际出现过的样本
+                index = min(len(values) - 1, max(0, math.ceil(q * len(values)) - 1))
+                result[f"p{int(q * 100)}"] = values[index]
+            result["max"] = values[-1]
+        result["rate_per_min"] = sum(1 for t, _ in self._samples if now - t <= 60.0)
+        return result
+
+
+class MetricsRegistry:
+    """按名称管理直方图，可在多个线程中同时记录"""
+
+    def __init__(self, window_size: int = METRICS_WINDOW_SIZE):
+        self.window_size = window_size
+        self._histograms: Dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, value_ms: float):
+        """记录一个以毫秒为单位的耗时样本
+
+        Args:
+            name: 指标名
+            value_ms: 耗时（毫秒）
+        """
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram(self.window_size)
+            histogram.observe(value_ms, time.monotonic())
+
+    def observe_since(self, name: str, start: float) -> float:
+        """记录从 start（time.monotonic()）到现在的耗时
+
+        Returns:
+            当前时刻，便于连续计时
+        """
+        now = time.monotonic()
+        self.observe(name, (now - start) * 1000.0)
+        return now
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """返回所有直方图的摘要 {指标名: {count, sum, p50, p95, p99, max, rate_per_min}}"""
+        now = time.monotonic()
+        with self._lock:
+            return {name: histogram.summary(now) for name, histogram in sorted(self._histograms.items())}
+
+    def to_prometheus(self, counters: Optional[Dict[str, int]] = None, prefix: str = "ruby_") -> str:
+        """渲染为Prometheus文本格式：直方图导出为 summary（毫秒），计数器导出为 counter
+
+        Args:
+            counters: 额外导出的计数器，可选
+            prefix: 指标名前缀
+
+        Returns:
+            Prometheus文本
+        """
+        lines = []
+        for name, summary in self.snapshot().items():
+            metric = f"{prefix}{name}"
+            lines.append(f"# TYPE {metric} summary")
+            for q in QUANTILES:
+                key = f"p{int(q * 100)}"
+                if key in summary:
+                    lines.append(f'{metric}{{quantile="{q}"}} {summary[key]:.3f}')
+            lines.append(f"{metric}_sum {summary['sum']:.3f}")
+            lines.append(f"{metric}_count {summary['count']}")
+        for name, value in sorted((counters or {}).items()):
+            metric = f"{prefix}{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsExporter:
+    """把指标定期写入本地文件，和/或在本机端口上提供Prometheus文本
+
+    文件扩展名为 .prom 时写入Prometheus文本，否则写入JSON。写入先落到临时文件再替换，
+    读取方不会看到写了一半的文件。
+    """
+
+    def __init__(self, render_prometheus: Callable[[], str], render_json: Callable[[], dict],
+                 path: Optional[str] = None, port: Optional[int] = None,
+                 interval_s: float = METRICS_EXPORT_INTERVAL_S):
+        """
+        Args:
+            render_prometheus: 生成Prometheus文本的函数
+            render_json: 生成JSON对象的函数
+            path: 导出文件路径，None 表示不写文件
+            port: Prometheus端口（仅监听127.0.0.1），None 表示不启动
+            interval_s: 写文件的间隔
+        """
+        self.render_prometheus = render_prometheus
+        self.render_json = render_json
+        self.path = path
+        self.port = port
+        self.interval_s = interval_s
+        self._stop_event = threading.Event()
+        self._writer: Optional[threading.Thread] = None
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @classmethod
+    def from_environment(cls, render_prometheus: Callable[[], str],
+                         render_json: Callable[[], dict]) -> Optional["MetricsExporter"]:
+        """按环境变量 RUBY_METRICS_FILE / RUBY_METRICS_PORT 创建并启动导出器，都未设置时返回None"""
+        path = os.environ.get("RUBY_METRICS_FILE") or None
+        port = os.environ.get("RUBY_METRICS_PORT")
+        if not path and not port:
+            return None
+        exporter = cls(render_prometheus, render_json, path=path, port=int(port) if port else None)
+        exporter.start()
+        return exporter
+
+    def start(self):
+        """启动写文件线程和HTTP服务"""
+        if self.path:
+            self._writer = threading.Thread(target=self._write_loop, name="MetricsFileExporter", daemon=True)
+            self._writer.start()
+        if self.port:
+            render = self.render_prometheus
+
+            class Handler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    body = render().encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, format, *args):
+                    pass  # 不在控制台打印每次抓取
+
+            try:
+                self._server = ThreadingHTTPServer(("127.0.0.1", self.port), Handler)
+            except OSError as e:
+                logger.warning("Metrics endpoint unavailable on port %s: %s", self.port, e)
+                return
+            threading.Thread(target=self._server.serve_forever, name="MetricsHttpExporter", daemon=True).start()
+            logger.info("Serving metrics at http://127.0.0.1:%s/metrics", self.port)
+
+    def stop(self):
+        """停止导出，并最后写一次文件"""
+        self._stop_event.set()
+        if self._writer is not None:
+            self._writer.join(2.0)
+            self._writer = None
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def write_file(self):
+        """立即把当前指标写入文件"""
+        if not self.path:
+            return
+        if self.path.endswith(".prom"):
+            content = self.render_prometheus()
+        else:
+            content = json.dumps(self.render_json(), indent=2, ensure_ascii=False)
+        temp_path = f"{self.path}.tmp"
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(temp_path, "w", encoding="utf-8") as f:
+                f.write(content)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            logger.warning("Failed to write metrics to %s: %s", self.path, e)
+
+    def _write_loop(self):
+        while not self._stop_event.wait(self.interval_s):
+            self.write_file()
+        self.write_file()
@@ -1,44 +1,375 @@
-# 粒子效果类，用于创建心形周围的视觉效果
-import time
-import random
-from PyQt5.QtCore import QPointF, Qt
-from PyQt5.QtGui import QPainter, QColor
-
-class Particle:
-    """粒子类，用于创建视觉效果"""
-    def __init__(self, pos: QPointF, vel: QPointF, life_ms: int, start_color: QColor, end_color: QColor, start_size: float, end_size: float):
-        self.pos = pos
-        self.vel = vel
-        self.life_max = life_ms
-        self.life_current = life_ms
-        self.start_color = start_color
-        self.end_color = end_color
-        self.start_size = start_size
-        self.end_size = end_size
-        self.creation_time = time.time()
-
-    def update(self, dt_ms: int) -> bool: # Returns True if still alive
-        """更新粒子状态，返回粒子是否仍然存活"""
-        self.life_current -= dt_ms
-        if self.life_current <= 0:
+# 粒子效果系统，用于创建心形周围的视觉效果
+# 采用结构数组(SoA)布局：位置、速度、寿命、颜色和尺寸都保存在预分配的NumPy数组中，批量更新和绘制
+import math
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+import numpy as np
+from PyQt5.QtCore import QPointF, QRectF, Qt
+from PyQt5.QtGui import QPainter, QColor, QPixmap, QRadialGradient
+
+from utils.constants import PARTICLE_POOL_CAPACITY, PARTICLE_OVERFLOW_POLICY
+
+# 各粒子类型的发射参数：速度范围、寿命范围(毫秒，含上限)、尺寸范围和结束尺寸
+# 颜色为 None 表示使用情绪颜色；softness 为精灵边缘从不透明渐隐到透明的部分占半径的比例
+PARTICLE_TYPES = {
+    "sparkle": {
+        "vel_x": (-30, 30), "vel_y": (-50, -10),  # 向上
+        "life_ms": (500, 1500),
+        "color": None, "start_alpha": 255,
+        "start_size": (2, 5), "end_size": 0.5,
+        "softness": 0.6,  # 发光的光点
+    },
+    "teardrop": {
+        "vel_x": (-10, 10), "vel_y": (20, 60),  # 向下
+        "life_ms": (800, 2000),
+        "color": (0, 100, 255), "start_alpha": 200,  # 蓝色
+        "start_size": (3, 6), "end_size": 1,
+        "softness": 0.25,  # 边缘较清晰的水滴
+    },
+    "default": {
+        "vel_x": (-20, 20), "vel_y": (-20, 20),
+        "life_ms": (500, 1000),
+        "color": None, "start_alpha": 200,
+        "start_size": (3, 3), "end_size": 0,
+        "softness": 0.35,
+    },
+}
+PARTICLE_TYPE_NAMES = tuple(PARTICLE_TYPES)  # 粒子池中 kind 字段保存的是类型在此元组中的下标
+
+# 预渲染粒子精灵的半径档位（像素），绘制时选择不小于粒子尺寸的最小档位再按比例缩放
+PARTICLE_SPRITE_RADII = (2, 4, 8)
+PARTICLE_SPRITE_CACHE_SIZE = 16
+
+# 粒子池中的字段及其每个粒子的分量数（0 表示标量）
+PARTICLE_FIELDS = {
+    "pos": 2, "vel": 2,
+    "life_max": 0, "life_current": 0,
+    "start_color": 4, "end_color": 4,
+    "start_size": 0, "end_size": 0,
+    "kind": 0,
+}
+OVERFLOW_POLICIES = ("drop_oldest", "drop_newest")
+
+
+class ParticleSpriteAtlas:
+    """按 (粒子类型, 颜色, 设备像素比) 缓存的粒子精灵图集
+
+    每个图集横向排列各尺寸档位的柔边圆形精灵，按设备像素比以物理像素烘焙，
+    因此在高DPI屏幕上缩放绘制时不会发虚。
+    """
+
+    def __init__(self, radii=PARTICLE_SPRITE_RADII, max_entries: int = PARTICLE_SPRITE_CACHE_SIZE):
+        self.radii = np.asarray(radii, dtype=float)
+        self.max_entries = max(1, max_entries)
+        self._atlases: "OrderedDict[Tuple, QPixmap]" = OrderedDict()
+        self._layouts: Dict[float, Tuple[List[QRectF], Tuple[int, int]]] = {}
+
+    def source_rects(self, device_pixel_ratio: float = 1.0) -> List[QRectF]:
+        """各档位在图集中的源矩形（物理像素）"""
+        return self._layout(device_pixel_ratio)[0]
+
+    def _layout(self, device_pixel_ratio: float) -> Tuple[List[QRectF], Tuple[int, int]]:
+        """计算并缓存各档位的源矩形和图集尺寸（相邻精灵之间留1像素间隔，避免缩放时采样到邻居）"""
+        layout = self._layouts.get(device_pixel_ratio)
+        if layout is None:
+            rects = []
+            x = 0
+            for radius in self.radii:
+                diameter = radius * 2 * device_pixel_ratio
+                rects.append(QRectF(x, 0, diameter, diameter))
+                x += math.ceil(diameter) + 1
+            layout = self._layouts[device_pixel_ratio] = (
+                rects, (x, math.ceil(self.radii.max() * 2 * device_pixel_ratio))
+            )
+        return layout
+
+    def get(self, particle_type: str, rgb: Tuple[int, int, int], device_pixel_ratio: float = 1.0) -> QPixmap:
+        """获取图集，不存在时渲染并放入缓存
+
+        Args:
+            particle_type: 粒子类型，决定精灵边缘的柔和程度
+            rgb: 粒子颜色 (r, g, b)
+            device_pixel_ratio: 设备像素比
+
+        Returns:
+            包含所有尺寸档位的柔边圆形精灵图集（源矩形见 source_rects）
+        """
+        key = (particle_type, rgb, device_pixel_ratio)
+        atlas = self._atlases.get(key)
+        if atlas is not None:
+            self._atlases.move_to_end(key)
+            return atlas
+
+        rects, size = self._layout(device_pixel_ratio)
+        softness = PARTICLE_TYPES.get(particle_type, PARTICLE_TYPES["default"])["softness"]
+        opaque, transparent = QColor(*rgb), QColor(*rgb, 0)
+        atlas = QPixmap(*size)
+        atlas.fill(Qt.transparent)
+        painter = QPainter(atlas)
+        painter.setRenderHint(QPainter.Antialiasing, True)
+        painter.setPen(Qt.NoPen)
+        for rect in rects:
+            gradient = QRadialGradient(rect.center(), rect.width() / 2)
+            gradient.setColorAt(0.0, opaque)
+            gradient.setColorAt(1.0 - softness, opaque)
+            gradient.setColorAt(1.0, transparent)
+            painter.setBrush(gradient)
+            painter.drawEllipse(rect)
+        painter.end()
+        # drawPixmapFragments 的源矩形始终是物理像素，逻辑尺寸由绘制时的缩放换算
+        atlas.setDevicePixelRatio(device_pixel_ratio)
+        self._atlases[key] = atlas
+        if len(self._atlases) > self.max_entries:
+            self._atlases.popitem(last=False)
+        return atlas
+
+
+class ParticleSystem:
+    """固定容量的粒子池
+
+    存活粒子按发射顺序紧凑地存放在各数组的前 count 个槽位中，之后的槽位即为可复用的空槽。
+    剔除死亡粒子时用 np.compress 写入备用缓冲区再交换，因此稳定运行时的逐帧更新不分配任何内存。
+    """
+
+    def __init__(self, capacity: int = PARTICLE_POOL_CAPACITY, overflow_policy: str = PARTICLE_OVERFLOW_POLICY):
+        """
+        Args:
+            capacity: 粒子数量硬上限
+            overflow_policy: 池满时的策略，drop_oldest 丢弃最早的粒子，drop_newest 丢弃新发射的粒子
+        """
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown particle overflow policy: {overflow_policy}")
+        self.capacity = max(1, capacity)
+        self.overflow_policy = overflow_policy
+        self.count = 0
+        self.dropped = 0  # 因池满而丢弃的粒子总数
+
+        self._rng = np.random.default_rng()
+        self._sprites = ParticleSpriteAtlas()
+        self._buffers = self._allocate_fields()
+        self._spare = self._allocate_fields()  # 剔除时的双缓冲
+
+        # 逐帧计算使用的临时缓冲区
+        self._alive = np.empty(self.capacity, dtype=bool)
+        self._random = np.empty(self.capacity)
+        self._progress = np.empty(self.capacity)
+        self._step = np.empty((self.capacity, 2))
+        self._colors = np.empty((self.capacity, 4))
+        self._sizes = np.empty(self.capacity)
+        # 绘制用的片段对象按槽位预先创建，每帧只改写字段，不再为每个粒子新建包装对象
+        self._fragments = [
+            QPainter.PixmapFragment.create(QPointF(), QRectF(), 1.0, 1.0, 0.0, 1.0) for _ in range(self.capacity)
+        ]
+        self._fragment_params = np.empty((self.capacity, 6))  # x, y, sourceLeft, 源直径, 缩放, 不透明度
+
+    def _allocate_fields(self):
+        """为每个字段分配满容量的数组"""
+        return {
+            name: np.zeros((self.capacity, width) if width else self.capacity)
+            for name, width in PARTICLE_FIELDS.items()
+        }
+
+    def __len__(self):
+        return self.count
+
+    def field(self, name: str) -> np.ndarray:
+        """返回存活粒子某个字段的视图
+
+        Args:
+            name: 字段名，见 PARTICLE_FIELDS
+
+        Returns:
+            前 count 个槽位的数组视图
+        """
+        return self._buffers[name][:self.count]
+
+    def clear(self):
+        """移除所有粒子"""
+        self.count = 0
+
+    def emit(self, count: int, origin_rect: QRectF, base_mood_color: QColor, particle_type: str = "sparkle"):
+        """批量发射粒子，写入空槽位；池满时按溢出策略处理
+
+        Args:
+            count: 粒子数量
+            origin_rect: 起源矩形
+            base_mood_color: 基础颜色
+            particle_type: 粒子类型 (sparkle/teardrop)
+        """
+        free = self.capacity - self.count
+        if count > free:
+            if self.overflow_policy == "drop_newest":
+                self.dropped += count - free
+                count = free
+            else:
+                if count > self.capacity:
+                    # 超过整个池容量的部分（批次中最早的那些）同样计为丢弃
+                    self.dropped += count - self.capacity
+                    count = self.capacity
+                self._drop_oldest(count - free)
+        if count <= 0:
+            return
+
+        if particle_type not in PARTICLE_TYPES:
+            particle_type = "default"
+        spec = PARTICLE_TYPES[particle_type]
+        start, end = self.count, self.count + count
+        b = self._buffers
+        center = origin_rect.center()
+        half_w, half_h = origin_rect.width() * 0.2, origin_rect.height() * 0.2
+
+        b["pos"][start:end, 0] = self._uniform(count, center.x() - half_w, center.x() + half_w)
+        b["pos"][start:end, 1] = self._uniform(count, center.y() - half_h, center.y() + half_h)
+        b["vel"][start:end, 0] = self._uniform(count, *spec["vel_x"])
+        b["vel"][start:end, 1] = self._uniform(count, *spec["vel_y"])
+        life_min, life_max = spec["life_ms"]
+        b["life_max"][start:end] = np.floor(self._uniform(count, life_min, life_max + 1), out=self._random[:count])
+        b["life_current"][start:end] = b["life_max"][start:end]
+
+        if spec["color"] is None:
+            rgb = (base_mood_color.red(), base_mood_color.green(), base_mood_color.blue())
+        else:
+            rgb = spec["color"]
+        b["start_color"][start:end] = (*rgb, spec["start_alpha"])
+        b["end_color"][start:end] = (*rgb, 0)
+        b["start_size"][start:end] = self._uniform(count, *spec["start_size"])
+        b["end_size"][start:end] = spec["end_size"]
+        b["kind"][start:end] = PARTICLE_TYPE_NAMES.index(particle_type)
+        self.count = end
+
+    def _uniform(self, count: int, low: float, high: float) -> np.ndarray:
+        """在临时缓冲区中生成 [low, high) 的均匀随机数（结果在下一次调用前有效）"""
+        values = self._random[:count]
+        self._rng.random(out=values)
+        values *= high - low
+        values += low
+        return values
+
+    def _drop_oldest(self, drop_count: int):
+        """丢弃最早发射的若干个粒子，为新粒子腾出槽位"""
+        drop_count = min(drop_count, self.count)
+        remaining = self.count - drop_count
+        for name, buffer in self._buffers.items():
+            self._spare[name][:remaining] = buffer[drop_count:self.count]
+        self._buffers, self._spare = self._spare, self._buffers
+        self.count = remaining
+        self.dropped += drop_count
+
+    def update(self, dt_ms: float) -> bool:
+        """批量更新粒子状态并回收死亡粒子的槽位
+
+        Args:
+            dt_ms: 时间步长 (毫秒)
+
+        Returns:
+            是否仍有存活的粒子
+        """
+        n = self.count
+        if not n:
             return False
-        self.pos += self.vel * (dt_ms / 1000.0)
+        b = self._buffers
+        life = b["life_current"][:n]
+        life -= dt_ms
+        alive = np.greater(life, 0, out=self._alive[:n])
+        survivors = int(np.count_nonzero(alive))
+        if survivors < n:
+            for name, buffer in b.items():
+                np.compress(alive, buffer[:n], axis=0, out=self._spare[name][:survivors])
+            self._buffers, self._spare = self._spare, self._buffers
+            b, n = self._buffers, survivors
+            self.count = n
+
+        step = np.multiply(b["vel"][:n], dt_ms / 1000.0, out=self._step[:n])
+        b["pos"][:n] += step
         # Optional: add gravity or other forces
-        # self.vel.setY(self.vel.y() + 0.05 * (dt_ms / 1000.0)) # Simple gravity
-        return True
-
-    def draw(self, painter: QPainter):
-        """绘制粒子"""
-        progress = (self.life_max - self.life_current) / self.life_max
-        
-        r = int(self.start_color.red() + (self.end_color.red() - self.start_color.red()) * progress)
-        g = int(self.start_color.green() + (self.end_color.green() - self.start_color.green()) * progress)
-        b = int(self.start_color.blue() + (self.end_color.blue() - self.start_color.blue()) * progress)
-        a = int(self.start_color.alpha() + (self.end_color.alpha() - self.start_color.alpha()) * progress)
-        current_color = QColor(r,g,b,a)
-        
-        current_size = self.start_size + (self.end_size - self.start_size) * progress
-        
-        painter.setBrush(current_color)
-        painter.setPen(Qt.NoPen)
-        painter.drawEllipse(self.pos, current_size, current_size)
\ No newline at end of file
+        return bool(n)
+
+    def bounds(self) -> QRectF:
+        """存活粒子绘制范围的包围矩形（窗口坐标），没有粒子时返回空矩形"""
+        n, b = self.count, self._buffers
+        if not n:
+            return QRectF()
+        pos = b["pos"][:n]
+        x0, y0 = pos.min(axis=0)
+        x1, y1 = pos.max(axis=0)
+        # 粒子以 pos 为中心、当前尺寸为半径绘制，尺寸在起止尺寸之间线性变化；多留1像素给抗锯齿
+        radius = max(b["start_size"][:n].max(), b["end_size"][:n].max()) + 1.0
+        return QRectF(x0 - radius, y0 - radius, x1 - x0 + 2 * radius, y1 - y0 + 2 * radius)
+
+    def current_colors_and_sizes(self):
+        """批量计算每个粒子当前的颜色和尺寸（结果为内部缓冲区的视图）
+
+        Returns:
+            (颜色数组 N x 4, 尺寸数组 N)
+        """
+        n, b = self.count, self._buffers
+        progress = self._progress[:n]
+        np.subtract(b["life_max"][:n], b["life_current"][:n], out=progress)
+        progress /= b["life_max"][:n]
+
+        colors = np.subtract(b["end_color"][:n], b["start_color"][:n], out=self._colors[:n])
+        colors *= progress[:, None]
+        colors += b["start_color"][:n]
+        np.trunc(colors, out=colors)
+
+        sizes = np.subtract(b["end_size"][:n], b["start_size"][:n], out=self._sizes[:n])
+        sizes *= progress
+        sizes += b["start_size"][:n]
+        return colors, sizes
+
+    def draw(self, painter: QPainter, device_pixel_ratio: float = 1.0):
+        """绘制所有粒子
+
+        每种（粒子类型, 颜色）只调用一次 drawPixmapFragments，透明度和尺寸通过每个片段的
+        opacity 和缩放表达，因此绘制开销不随粒子数量线性增加绘制调用次数。
+        片段对象按槽位预先创建并逐帧改写；剩余的逐帧分配只有与可见粒子数成正比的 NumPy 临时数组。
+
+        Args:
+            painter: 绘制目标
+            device_pixel_ratio: 目标的设备像素比，精灵按此比例烘焙
+        """
+        if not len(self):
+            return
+        colors, sizes = self.current_colors_and_sizes()
+        visible = np.flatnonzero((sizes > 0) & (colors[:, 3] > 0))
+        if not len(visible):
+            return
+
+        # （粒子类型, r, g, b）合成一个整数分组键，按键稳定排序后每组是预分配片段列表中连续的一段
+        rgb = colors[visible, :3]
+        keys = self.field("kind")[visible] * 16777216.0 + rgb[:, 0] * 65536.0 + rgb[:, 1] * 256.0 + rgb[:, 2]
+        order = np.argsort(keys, kind="stable")
+        group_keys, counts = np.unique(keys[order], return_counts=True)
+        order = visible[order]
+
+        radii = self._sprites.radii
+        m = len(order)
+        sizes = sizes[order]
+        buckets = np.minimum(np.searchsorted(radii, sizes), len(radii) - 1)
+        source_rects = self._sprites.source_rects(device_pixel_ratio)
+        params = self._fragment_params[:m]
+        params[:, 0:2] = self.field("pos")[order]
+        np.take([rect.left() for rect in source_rects], buckets, out=params[:, 2])
+        np.take([rect.width() for rect in source_rects], buckets, out=params[:, 3])
+        # 源矩形是物理像素，缩放后的逻辑直径为 2 * size
+        np.divide(sizes, radii[buckets] * device_pixel_ratio, out=params[:, 4])
+        np.divide(colors[order, 3], 255.0, out=params[:, 5])
+
+        fragments = self._fragments
+        for fragment, row in zip(fragments, params):
+            x, y, left, width, scale, opacity = row.tolist()
+            fragment.x, fragment.y = x, y
+            fragment.sourceLeft = left
+            fragment.width = fragment.height = width
+            fragment.scaleX = fragment.scaleY = scale
+            fragment.opacity = opacity
+
+        painter.setRenderHint(QPainter.SmoothPixmapTransform, True)
+        start = 0
+        for key, count in zip(group_keys.tolist(), counts.tolist()):
+            key = int(key)
+            rgb = ((key >> 16) & 0xFF, (key >> 8) & 0xFF, key & 0xFF)
+            atlas = self._sprites.get(PARTICLE_TYPE_NAMES[key >> 24], rgb, device_pixel_ratio)
+            painter.drawPixmapFragments(fragments[start:start + count], atlas)
+            start += count
@@ -0,0 +1,55 @@
+# 启动耗时分解：记录导入、创建QApplication、初始化主窗口和首帧绘制各阶段的耗时
+import logging
+import time
+from typing import Dict, List, Tuple
+
+from PyQt5.QtCore import QEvent, QObject, QTimer
+from PyQt5.QtWidgets import QWidget
+
+logger = logging.getLogger(__name__)
+
+
+class StartupTimer(QObject):
+    """按顺序记录启动阶段的结束时刻，首帧绘制完成后输出一次汇总"""
+
+    def __init__(self, started_at: float):
+        """
+        Args:
+            started_at: 开始计时的时刻（time.perf_counter()），通常是入口模块开始导入依赖之前
+        """
+        super().__init__()
+        self.started_at = started_at
+        self._marks: List[Tuple[str, float]] = []
+
+    def mark(self, phase: str):
+        """记录一个阶段在此刻结束"""
+        self._marks.append((phase, time.perf_counter()))
+
+    def watch_first_paint(self, widget: QWidget):
+        """在部件第一次绘制完成后记录 first_paint 阶段并输出汇总"""
+        widget.installEventFilter(self)
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Paint:
+            obj.removeEventFilter(self)
+            # 当前绘制事件处理完（包括把内容送往屏幕）之后再记录
+            QTimer.singleShot(0, self._on_first_paint)
+        return False
+
+    def _on_first_paint(self):
+        self.mark("first_paint")
+        self.report()
+
+    def breakdown(self) -> Dict[str, float]:
+        """返回 {阶段: 耗时毫秒}，另含 total"""
+        result = {}
+        previous = self.started_at
+        for phase, stamp in self._marks:
+            result[phase] = (stamp - previous) * 1000.0
+            previous = stamp
+        result["total"] = (previous - self.started_at) * 1000.0
+        return result
+
+    def report(self):
+        """把耗时分解写入日志"""
+        logger.info("Startup: %s", ", ".join(f"{phase} {ms:.0f} ms" for phase, ms in self.breakdown().items()))
@@ -1,19 +1,34 @@
 import math
+import os
 import random
 import time
-from typing import List, Optional
+from typing import NamedTuple, Optional, Tuple
 
 from PyQt5.QtWidgets import QWidget
-from PyQt5.QtGui import QPainter, QColor, QBrush, QPen, QFont, QTextOption
-from PyQt5.QtCore import Qt, QTimer, QPointF, QRectF, pyqtSignal
+from PyQt5.QtGui import QPainter, QColor, QPen, QFont, QTransform, QRegion
+from PyQt5.QtCore import Qt, QTimer, QPointF, QRect, QRectF, QElapsedTimer, pyqtSignal
 
 from utils.constants import (
-    HEART_PIXEL_MATRIX, HEART_MATRIX_HEIGHT, HEART_MATRIX_WIDTH,
-    DEFAULT_HEART_COLOR, PARTICLE_UPDATE_INTERVAL_MS,
-    COLOR_TRANSITION_STEPS, PULSATION_TIMER_INTERVAL_MS,
-    QUICK_RESPONSES
+    HEART_MATRIX_HEIGHT, HEART_MATRIX_WIDTH,
+    DEFAULT_HEART_COLOR, FRAME_INTERVAL_MS, MAX_FRAME_DT_MS,
+    COLOR_TRANSITION_DURATION_MS, COLOR_TRANSITION_STEPS, PULSATION_TIMER_INTERVAL_MS,
+    FRAME_PROFILER_OVERLAY_REFRESH_MS, QUICK_RESPONSES
 )
-from utils.particles import Particle
+from utils.frame_profiler import FrameProfiler
+from utils.particles import ParticleSystem
+from utils.heart_sprite import HeartSpriteCache
+from utils.heart_text import HeartText, HeartTextCache
+
+
+class HeartFrame(NamedTuple):
+    """单帧心形的绘制状态，由帧时钟计算，paintEvent 只负责绘制"""
+    pixel_size: int
+    spin_angle: float
+    offset_x: float
+    offset_y: float
+    base_color: QColor
+    glowing: bool
+    text: str
 
 
 class HeartWidget(QWidget):
@@ -32,29 +47,24 @@ class HeartWidget(QWidget):
         self.angle = 0  # 用于脉动
         self.target_frequency_hz = 1.0
         self.current_frequency_hz = 1.0
-        self._pulsation_timer_interval_ms = PULSATION_TIMER_INTERVAL_MS
         
         # 颜色设置
         self.base_color = QColor(DEFAULT_HEART_COLOR)
         self.highlight_color = self._derive_highlight_color(self.base_color)
         self.shadow_color = self._derive_shadow_color(self.base_color)
         self.target_base_color = QColor(self.base_color)
-        self.color_transition_steps = COLOR_TRANSITION_STEPS
-        self.current_color_step = 0
+        self._color_transition_from = QColor(self.base_color)
+        self._color_transition_elapsed_ms = 0.0
+        self._color_transition_active = False
+        self._sprite_cache = HeartSpriteCache()
+        self.device_pixel_ratio_override: Optional[float] = None  # 离屏渲染到高DPI图像时指定设备像素比
+        self._text_cache = HeartTextCache()
         
         # 显示文本
         self.display_text = "Ruby..."
         self.setAutoFillBackground(False)  # 对透明很重要
         self.long_dialogue_is_visible_externally = False
 
-        # 定时器初始化
-        self.pulsation_timer = QTimer(self)
-        self.pulsation_timer.timeout.connect(self.update_pulsation)
-        self.pulsation_timer.start(self._pulsation_timer_interval_ms)
-        
-        self.color_change_timer = QTimer(self)
-        self.color_change_timer.timeout.connect(self.update_color_transition)
-
         # 动画状态
         self.shiver_active_until = 0.0
         self.shiver_intensity_factor = 0.0
@@ -86,10 +96,27 @@ class HeartWidget(QWidget):
         self.is_hovering = False
 
         # 粒子效果
-        self.particles: List[Particle] = []
-        self.particle_timer = QTimer(self)
-        self.particle_timer.timeout.connect(self._update_particles)
-        self.particle_timer.start(PARTICLE_UPDATE_INTERVAL_MS)  # ~60 FPS for particles
+        self.particles = ParticleSystem()
+
+        # 统一帧时钟：脉动、粒子、颜色过渡和各种动画共用一个定时器和实测的dt
+        self._frame: Optional[HeartFrame] = None
+        self._frame_clock = QElapsedTimer()
+        self._last_frame_ms = 0
+        self._suspended_at: Optional[float] = None  # 空闲挂起的时间戳
+        # 局部重绘：上一帧心形（含文本）和粒子所占的区域，以及本帧需要重绘的区域
+        self._heart_rect = QRect()
+        self._particle_rect = QRect()
+        self._dirty_region = QRegion()
+        self.frame_timer = QTimer(self)
+        self.frame_timer.setTimerType(Qt.PreciseTimer)
+        self.frame_timer.timeout.connect(self._on_frame_tick)
+
+        # 帧时间分析器（始终记录），调试覆盖层默认由环境变量开启
+        self.profiler = FrameProfiler()
+        self.profiler_overlay_visible = os.environ.get("RUBY_FRAME_PROFILER", "") not in ("", "0")
+        self._profiler_overlay_text = ""
+        self._profiler_overlay_updated_ms = -FRAME_PROFILER_OVERLAY_REFRESH_MS
+        self.start_frame_clock()
 
     def _derive_highlight_color(self, color: QColor) -> QColor:
         """根据基色派生高光颜色"""
@@ -101,71 +128,207 @@ class HeartWidget(QWidget):
         h, s, v, a = color.getHsv()
         return QColor.fromHsv(h, min(255, s + 20), max(0, v - 50), a)
 
-    def _update_particles(self):
-        """更新粒子状态"""
-        self.particles = [p for p in self.particles if p.update(self.particle_timer.interval())]
-        if self.particles:  # 仅当有粒子时更新
+    def _update_particles(self, dt_ms: float):
+        """更新粒子状态
+
+        Args:
+            dt_ms: 距上一帧的时间 (毫秒)
+        """
+        self.particles.update(dt_ms)
+
+    # --- 帧时钟 ---
+    def start_frame_clock(self):
+        """启动帧时钟（已在运行时不做任何事）"""
+        if self.frame_timer.isActive():
+            return
+        self._frame_clock.start()
+        self._last_frame_ms = 0
+        self.frame_timer.start(FRAME_INTERVAL_MS)
+
+    def suspend_animations(self):
+        """挂起帧时钟（窗口最小化、隐藏或被遮挡时调用），挂起期间不再重绘"""
+        if self._suspended_at is not None:
+            return
+        self._suspended_at = time.time()
+        self.frame_timer.stop()
+
+    def resume_animations(self):
+        """恢复帧时钟，并将进行中的动画整体顺延挂起的时长以保持相位"""
+        if self._suspended_at is None:
+            return
+        paused_sec = time.time() - self._suspended_at
+        self._suspended_at = None
+        for attr in ("shiver_active_until", "pop_active_until", "spin_active_until",
+                     "glow_active_until", "jiggle_active_until", "pressed_active_until"):
+            if getattr(self, attr) > 0:
+                setattr(self, attr, getattr(self, attr) + paused_sec)
+        self.start_frame_clock()
+        self.update()
+
+    def is_suspended(self) -> bool:
+        """返回帧时钟是否处于空闲挂起状态"""
+        return self._suspended_at is not None
+
+    def _on_frame_tick(self):
+        """帧时钟回调：用实测的dt推进所有动画，并且每帧最多请求一次重绘"""
+        tick_started = time.perf_counter()
+        now_ms = self._frame_clock.elapsed()
+        interval_ms = now_ms - self._last_frame_ms
+        self._last_frame_ms = now_ms
+
+        changed = self.advance_frame(min(interval_ms, MAX_FRAME_DT_MS), time.time())
+        overlay_changed = self._refresh_profiler_overlay(now_ms)
+        self.profiler.record_tick(interval_ms, (time.perf_counter() - tick_started) * 1000.0)
+        # 仅当画面确实发生变化时才重绘，并且只重绘发生变化的区域
+        if overlay_changed:
             self.update()
-            
-    def emit_particles(self, count: int, origin_rect: QRectF, base_mood_color: QColor, particle_type: str = "sparkle"):
-        """发射粒子效果
-        
+        elif changed and not self._dirty_region.isEmpty():
+            self.update(self._dirty_region)
+
+    def advance_frame(self, dt_ms: float, current_time: float) -> bool:
+        """推进所有动画一帧并计算新的绘制状态（帧时钟和离屏基准测试共用）
+
         Args:
-            count: 粒子数量
-            origin_rect: 起源矩形
-            base_mood_color: 基础颜色
-            particle_type: 粒子类型 (sparkle/teardrop)
+            dt_ms: 时间步长 (毫秒)
+            current_time: 当前时间戳 (秒)，用于判断各动画是否结束
+
+        Returns:
+            画面是否需要重绘；需要重绘的区域见 dirty_region()
         """
-        for _ in range(count):
-            start_x = origin_rect.center().x() + random.uniform(-origin_rect.width()*0.2, origin_rect.width()*0.2)
-            start_y = origin_rect.center().y() + random.uniform(-origin_rect.height()*0.2, origin_rect.height()*0.2)
-            
-            if particle_type == "sparkle":
-                vel_x = random.uniform(-30, 30) 
-                vel_y = random.uniform(-50, -10)  # 向上
-                life_ms = random.randint(500, 1500)
-                s_color = QColor(base_mood_color)
-                s_color.setAlpha(255)
-                e_color = QColor(base_mood_color)
-                e_color.setAlpha(0)
-                s_size = random.uniform(2, 5)
-                e_size = 0.5
-            elif particle_type == "teardrop":
-                vel_x = random.uniform(-10, 10)
-                vel_y = random.uniform(20, 60)  # 向下
-                life_ms = random.randint(800, 2000)
-                s_color = QColor(0, 100, 255, 200)  # 蓝色
-                e_color = QColor(0, 100, 255, 0)
-                s_size = random.uniform(3, 6)
-                e_size = 1
-            else:  # 默认
-                vel_x = random.uniform(-20, 20)
-                vel_y = random.uniform(-20, 20)
-                life_ms = random.randint(500, 1000)
-                s_color = QColor(base_mood_color)
-                s_color.setAlpha(200)
-                e_color = QColor(base_mood_color)
-                e_color.setAlpha(0)
-                s_size = 3
-                e_size = 0
-            
-            self.particles.append(Particle(
-                QPointF(start_x, start_y), 
-                QPointF(vel_x, vel_y), 
-                life_ms, s_color, e_color, 
-                s_size, e_size
-            ))
+        dt_sec = dt_ms / 1000.0
+        had_particles = bool(self.particles)
+        self.update_pulsation(dt_sec)
+        self.update_color_transition(dt_sec)
+        self._update_particles(dt_ms)
+
+        frame = self._compute_frame(current_time)
+        dirty = QRegion()
+        if frame != self._frame:
+            # 旧位置需要擦除，新位置需要绘制
+            heart_rect = self._heart_bounds(frame)
+            dirty += self._heart_rect.united(heart_rect)
+            self._heart_rect = heart_rect
+        if had_particles or self.particles:
+            particle_rect = self.particles.bounds().toAlignedRect()
+            dirty += self._particle_rect.united(particle_rect)
+            self._particle_rect = particle_rect
+        changed = frame != self._frame or had_particles
+        self._frame = frame
+        self._dirty_region = dirty.intersected(self.rect())
+        return changed
+
+    def dirty_region(self) -> QRegion:
+        """返回最近一次 advance_frame 之后需要重绘的区域（部件坐标）"""
+        return QRegion(self._dirty_region)
+
+    def _text_layout(self, frame: HeartFrame) -> Tuple[QRectF, QFont, QColor, HeartText]:
+        """计算文本在心形坐标系（以部件中心为原点、旋转之前）中的排版矩形、字体、颜色和缓存的排版结果"""
+        pixel_size = frame.pixel_size
+        heart_draw_width = HEART_MATRIX_WIDTH * pixel_size
+        heart_draw_height = HEART_MATRIX_HEIGHT * pixel_size
+        text_rect_width = heart_draw_width * 0.8
+        text_rect_height = heart_draw_height * 0.6
+        text_rect_x = frame.offset_x + (heart_draw_width - text_rect_width) / 2
+        text_rect_y = frame.offset_y + (heart_draw_height - text_rect_height) / 2
+        text_rect = QRectF(text_rect_x, text_rect_y, text_rect_width, text_rect_height)
+
+        font_size = int(pixel_size * 1.6)  # 稍微减小以更好地适应
+        if heart_draw_height > 0 and text_rect_height > 0:
+            font_size_by_height = int(text_rect_height * 0.3)
+            font_size = min(font_size, font_size_by_height if font_size_by_height > 0 else font_size)
+        if font_size < 7:
+            font_size = 7
+        font = self._text_cache.font(font_size)
+
+        # 考虑发光效果的文本颜色
+        text_color = QColor(Qt.white) if frame.base_color.lightnessF() < 0.5 else QColor(Qt.black)
+        if frame.glowing:
+            # 发光期间文本更鲜艳
+            text_color = QColor(Qt.white) if frame.base_color.lightnessF() < 0.6 else QColor(Qt.black)
+        return text_rect, font, text_color, self._text_cache.get(frame.text, font, text_rect, text_color)
+
+    def _heart_bounds(self, frame: HeartFrame) -> QRect:
+        """心形在缩放、旋转和偏移之后覆盖的区域（部件坐标）
+
+        文本绘制时裁剪到心形内部的排版矩形，因此不会超出这个区域。
+        """
+        bounds = QRectF(int(frame.offset_x), int(frame.offset_y),
+                        HEART_MATRIX_WIDTH * frame.pixel_size, HEART_MATRIX_HEIGHT * frame.pixel_size)
+        transform = QTransform().translate(self.width() / 2, self.height() / 2)
+        if frame.spin_angle:
+            transform.rotate(frame.spin_angle)
+        # 多留2像素给抗锯齿和平滑缩放
+        return transform.mapRect(bounds).toAlignedRect().adjusted(-2, -2, 2, 2)
+
+    # --- 帧时间分析 ---
+    def frame_stats(self) -> dict:
+        """返回帧时间统计，供调试覆盖层和自动化性能回归测试使用
+
+        Returns:
+            FrameProfiler.stats() 的内容，外加 particles（存活粒子数）、
+            particles_dropped（因池满丢弃的粒子数）和 sprite_cache_hit_rate
+        """
+        stats = self.profiler.stats()
+        lookups = self._sprite_cache.hits + self._sprite_cache.misses
+        stats["particles"] = len(self.particles)
+        stats["particles_dropped"] = self.particles.dropped
+        stats["sprite_cache_hit_rate"] = self._sprite_cache.hits / lookups if lookups else 0.0
+        return stats
 
-    def paintEvent(self, event):
-        """绘制心形和粒子效果"""
-        painter = QPainter(self)
-        painter.setRenderHint(QPainter.Antialiasing, True)
+    def set_profiler_overlay_visible(self, visible: bool):
+        """显示或隐藏帧时间调试覆盖层
 
-        if not HEART_MATRIX_WIDTH or not HEART_MATRIX_HEIGHT:
+        Args:
+            visible: 是否显示
+        """
+        self.profiler_overlay_visible = visible
+        self._profiler_overlay_updated_ms = -FRAME_PROFILER_OVERLAY_REFRESH_MS
+        self._profiler_overlay_text = ""
+        self.update()
+
+    def _refresh_profiler_overlay(self, now_ms: int) -> bool:
+        """按固定间隔刷新覆盖层文本（覆盖层本身不会让每一帧都重绘）
+
+        Returns:
+            覆盖层文本是否改变
+        """
+        if not self.profiler_overlay_visible or now_ms - self._profiler_overlay_updated_ms < FRAME_PROFILER_OVERLAY_REFRESH_MS:
+            return False
+        self._profiler_overlay_updated_ms = now_ms
+        stats = self.frame_stats()
+        text = (
+            f"FPS {stats['fps']:.0f}  dropped {stats['dropped_frames']}\n"
+            f"paint {stats['paint_ms_avg']:.2f} ms  p99 {stats['paint_ms_p99']:.2f} ms\n"
+            f"frame p99 {stats['frame_ms_p99']:.1f} ms\n"
+            f"particles {stats['particles']}  sprite hit {stats['sprite_cache_hit_rate'] * 100:.0f}%"
+        )
+        changed = text != self._profiler_overlay_text
+        self._profiler_overlay_text = text
+        return changed
+
+    def _draw_profiler_overlay(self, painter: QPainter):
+        """在左上角绘制帧时间调试覆盖层"""
+        if not self._profiler_overlay_text:
             return
+        painter.save()
+        painter.setFont(QFont("Monospace", 8))
+        rect = painter.boundingRect(QRectF(4, 4, self.width() - 8, self.height() - 8),
+                                    Qt.AlignLeft | Qt.AlignTop, self._profiler_overlay_text)
+        painter.fillRect(rect.adjusted(-3, -2, 3, 2), QColor(0, 0, 0, 160))
+        painter.setPen(QColor(Qt.green))
+        painter.drawText(rect, Qt.AlignLeft | Qt.AlignTop, self._profiler_overlay_text)
+        painter.restore()
+
+    def _compute_frame(self, current_time: float) -> HeartFrame:
+        """根据当前动画状态计算一帧的绘制参数
 
+        Args:
+            current_time: 当前时间戳 (秒)
+
+        Returns:
+            该帧的绘制状态
+        """
         widget_w, widget_h = self.width(), self.height()
-        current_time = time.time()
 
         # --- 处理活动动画 ---
         # 弹跳效果
@@ -206,19 +369,12 @@ class HeartWidget(QWidget):
 
         heart_draw_width = HEART_MATRIX_WIDTH * pixel_size
         heart_draw_height = HEART_MATRIX_HEIGHT * pixel_size
-        
-        # 计算中心点并应用变换
-        center_x, center_y = widget_w / 2, widget_h / 2
-        
-        painter.save()
-        painter.translate(center_x, center_y)  # 移动原点到中心以便旋转/缩放
 
         # 旋转效果
         if current_time < self.spin_active_until:
             progress = (self.spin_total_duration - (self.spin_active_until - current_time)) / self.spin_total_duration
             eased_progress = 0.5 * (1 - math.cos(progress * math.pi))  # 缓入缓出
             self.current_spin_angle = self.spin_target_angle * eased_progress
-            painter.rotate(self.current_spin_angle)
         elif self.spin_active_until > 0:  # 定时器刚结束时重置旋转
             self.current_spin_angle = 0
             self.spin_active_until = 0
@@ -247,12 +403,6 @@ class HeartWidget(QWidget):
         else: 
             self.jiggle_active_until = 0
 
-        # 应用组合偏移（相对于新的中心原点）
-        offset_x = -heart_draw_width / 2 + final_offset_x
-        offset_y = -heart_draw_height / 2 + final_offset_y
-
-        painter.setPen(Qt.NoPen)
-        
         # 应用发光效果
         current_base_color = QColor(self.base_color)
         if current_glow_intensity > 0:
@@ -261,74 +411,113 @@ class HeartWidget(QWidget):
             s = max(0, s - int(30 * current_glow_intensity))    # 轻微降低饱和度以产生更亮的感觉
             current_base_color = QColor.fromHsv(h,s,v,a)
 
+        # 组合偏移（相对于中心原点）
+        return HeartFrame(
+            pixel_size=pixel_size,
+            spin_angle=self.current_spin_angle,
+            offset_x=-heart_draw_width / 2 + final_offset_x,
+            offset_y=-heart_draw_height / 2 + final_offset_y,
+            base_color=current_base_color,
+            glowing=current_glow_intensity > 0,
+            text=self.display_text,
+        )
+            
+    def render_device_pixel_ratio(self) -> float:
+        """预渲染位图使用的设备像素比：优先使用 device_pixel_ratio_override，否则取部件所在屏幕的值"""
+        if self.device_pixel_ratio_override:
+            return self.device_pixel_ratio_override
+        return self.devicePixelRatioF()
+
+    def emit_particles(self, count: int, origin_rect: QRectF, base_mood_color: QColor, particle_type: str = "sparkle"):
+        """发射粒子效果
+        
+        Args:
+            count: 粒子数量
+            origin_rect: 起源矩形
+            base_mood_color: 基础颜色
+            particle_type: 粒子类型 (sparkle/teardrop)
+        """
+        self.particles.emit(count, origin_rect, base_mood_color, particle_type)
+
+    def paintEvent(self, event):
+        """绘制心形和粒子效果，并记录绘制耗时"""
+        paint_started = time.perf_counter()
+        self._paint(event)
+        self.profiler.record_paint((time.perf_counter() - paint_started) * 1000.0)
+
+    def _paint(self, event):
+        """绘制心形和粒子效果"""
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.Antialiasing, True)
+
+        if not HEART_MATRIX_WIDTH or not HEART_MATRIX_HEIGHT:
+            return
+
+        frame = self._frame
+        if frame is None:  # 帧时钟尚未运行（例如离屏渲染）
+            frame = self._frame = self._compute_frame(time.time())
+
+        pixel_size = frame.pixel_size
+        offset_x, offset_y = frame.offset_x, frame.offset_y
+        current_base_color = frame.base_color
         current_highlight_color = self._derive_highlight_color(current_base_color)
         current_shadow_color = self._derive_shadow_color(current_base_color)
 
-        # 绘制心形像素
-        for r, row_data in enumerate(HEART_PIXEL_MATRIX):
-            for c, cell_type in enumerate(row_data):
-                if cell_type == 0: 
-                    continue
-                rect_x, rect_y = offset_x + c * pixel_size, offset_y + r * pixel_size
-                pixel_rect = QRectF(int(rect_x), int(rect_y), pixel_size, pixel_size) 
-                if cell_type == 1: 
-                    painter.setBrush(QBrush(current_base_color))
-                elif cell_type == 2: 
-                    painter.setBrush(QBrush(current_highlight_color))
-                elif cell_type == 3: 
-                    painter.setBrush(QBrush(current_shadow_color))
-                painter.drawRect(pixel_rect)
+        painter.save()
+        painter.translate(self.width() / 2, self.height() / 2)  # 移动原点到中心以便旋转/缩放
+        if frame.spin_angle:
+            painter.rotate(frame.spin_angle)
+        painter.setPen(Qt.NoPen)
+
+        # 绘制心形像素（使用缓存的预渲染位图，过渡和发光中的颜色只进入临时缓存）
+        sprite = self._sprite_cache.get(
+            pixel_size, current_base_color, current_highlight_color, current_shadow_color,
+            self.render_device_pixel_ratio(), transient=self._color_transition_active or frame.glowing
+        )
+        if frame.spin_angle:
+            painter.setRenderHint(QPainter.SmoothPixmapTransform, True)
+        painter.drawPixmap(QPointF(int(offset_x), int(offset_y)), sprite)
 
         # 绘制显示文本
-        if self.display_text:
-            text_rect_width = heart_draw_width * 0.8
-            text_rect_height = heart_draw_height * 0.6
-            text_rect_x = offset_x + (heart_draw_width - text_rect_width) / 2
-            text_rect_y = offset_y + (heart_draw_height - text_rect_height) / 2
-            text_rect = QRectF(text_rect_x, text_rect_y, text_rect_width, text_rect_height)
-            
-            font_size = int(pixel_size * 1.6)  # 稍微减小以更好地适应
-            if heart_draw_height > 0 and text_rect_height > 0:
-                font_size_by_height = int(text_rect_height * 0.3) 
-                font_size = min(font_size, font_size_by_height if font_size_by_height > 0 else font_size)
-            if font_size < 7: 
-                font_size = 7
-            font = QFont("Arial", font_size, QFont.Bold)
+        if frame.text:
+            # 排版结果只在文本、字号、排版矩形尺寸或颜色改变时重新计算
+            text_rect, font, text_color, layout = self._text_layout(frame)
             painter.setFont(font)
-
-            # 考虑发光效果的文本颜色
-            text_color_base = QColor(Qt.white) if current_base_color.lightnessF() < 0.5 else QColor(Qt.black)
-            if current_glow_intensity > 0:
-                 # 发光期间文本更鲜艳
-                text_color_base = QColor(Qt.white) if current_base_color.lightnessF() < 0.6 else QColor(Qt.black)
-
-            painter.setPen(text_color_base)
-            text_option = QTextOption()
-            text_option.setAlignment(Qt.AlignCenter)
-            text_option.setWrapMode(QTextOption.WordWrap)
-            painter.drawText(text_rect, self.display_text, text_option)
+            painter.setPen(text_color)
+            if HeartTextCache.overflows(layout, text_rect):
+                painter.setClipRect(text_rect)  # 与 drawText 相同，超出排版矩形的部分不绘制
+            painter.drawStaticText(HeartTextCache.position(layout, text_rect), layout.static_text)
         
         painter.restore()  # 从 translate(center_x, center_y) 恢复
 
         # 绘制粒子（在窗口坐标中，在主心形绘制之后）
-        for particle in self.particles:
-            particle.draw(painter)
+        self.particles.draw(painter, self.render_device_pixel_ratio())
+
+        if self.profiler_overlay_visible:
+            self._draw_profiler_overlay(painter)
+
+    def update_pulsation(self, dt_sec: float):
+        """更新脉动效果
 
-    def update_pulsation(self):
-        """更新脉动效果"""
-        # 平滑频率过渡
+        Args:
+            dt_sec: 距上一帧的时间 (秒)
+        """
+        # 平滑频率过渡（每30ms逼近5%，按实际dt折算）
         if abs(self.current_frequency_hz - self.target_frequency_hz) > 0.05:
-            self.current_frequency_hz += (self.target_frequency_hz - self.current_frequency_hz) * 0.05  # 较慢的变化
+            blend = 1.0 - 0.95 ** (dt_sec * 1000.0 / PULSATION_TIMER_INTERVAL_MS)  # 较慢的变化
+            self.current_frequency_hz += (self.target_frequency_hz - self.current_frequency_hz) * blend
         else: 
             self.current_frequency_hz = self.target_frequency_hz
         
-        dt_sec = self._pulsation_timer_interval_ms / 1000.0
         self.angle += self.current_frequency_hz * (2 * math.pi) * dt_sec
         if self.angle > (2 * math.pi): 
             self.angle -= (2 * math.pi)
 
         self.scale_factor = 1.0 + 0.07 * math.sin(self.angle)  # 较小的脉动
-        self.update()
+
+    def pulse_phase(self) -> Tuple[float, float]:
+        """返回 (当前脉动相位（周期数，0-1）, 当前频率Hz)，供心跳音频锁相"""
+        return (self.angle / (2 * math.pi)) % 1.0, self.current_frequency_hz
 
     def set_pulsation(self, frequency_hz: float):
         """设置脉动频率
@@ -337,8 +526,6 @@ class HeartWidget(QWidget):
             frequency_hz: 脉动频率 (Hz)
         """
         self.target_frequency_hz = max(0.3, min(frequency_hz, 8.0))  # 调整后的实用范围
-        if not self.pulsation_timer.isActive(): 
-            self.pulsation_timer.start(self._pulsation_timer_interval_ms)
 
     def set_heart_color(self, color_hex: str):
         """设置心形颜色
@@ -355,26 +542,35 @@ class HeartWidget(QWidget):
         except Exception: 
             self.target_base_color = QColor(DEFAULT_HEART_COLOR)
         
-        self.current_color_step = 0
-        if not self.color_change_timer.isActive(): 
-            self.color_change_timer.start(40)  # 更快的颜色变化
-
-    def update_color_transition(self):
-        """更新颜色过渡效果"""
-        if self.current_color_step < self.color_transition_steps:
-            self.current_color_step += 1
-            r = self.base_color.red() + (self.target_base_color.red() - self.base_color.red()) * self.current_color_step / self.color_transition_steps
-            g = self.base_color.green() + (self.target_base_color.green() - self.base_color.green()) * self.current_color_step / self.color_transition_steps
-            b = self.base_color.blue() + (self.target_base_color.blue() - self.base_color.blue()) * self.current_color_step / self.color_transition_steps
+        self._color_transition_from = QColor(self.base_color)
+        self._color_transition_elapsed_ms = 0.0
+        self._color_transition_active = True
+
+    def update_color_transition(self, dt_sec: float):
+        """更新颜色过渡效果
+
+        Args:
+            dt_sec: 距上一帧的时间 (秒)
+        """
+        if not self._color_transition_active:
+            return
+        self._color_transition_elapsed_ms += dt_sec * 1000.0
+        progress = self._color_transition_elapsed_ms / COLOR_TRANSITION_DURATION_MS
+        if progress < 1.0:
+            # 量化为有限的几级，相邻几帧颜色相同，可以复用同一张位图
+            progress = math.floor(progress * COLOR_TRANSITION_STEPS) / COLOR_TRANSITION_STEPS
+            start, target = self._color_transition_from, self.target_base_color
+            r = start.red() + (target.red() - start.red()) * progress
+            g = start.green() + (target.green() - start.green()) * progress
+            b = start.blue() + (target.blue() - start.blue()) * progress
             self.base_color.setRgb(int(r), int(g), int(b))
         else:
             self.base_color = QColor(self.target_base_color)
-            self.color_change_timer.stop()
+            self._color_transition_active = False
         
         # 立即更新派生颜色
         self.highlight_color = self._derive_highlight_color(self.base_color)
         self.shadow_color = self._derive_shadow_color(self.base_color)
-        self.update()
 
     def set_display_text(self, text: str):
         """设置显示文本
@@ -382,8 +578,7 @@ class HeartWidget(QWidget):
         Args:
             text: 文本内容
         """
-        self.display_text = text
-        self.update()
+        self.display_text = text  # 由帧时钟在下一帧重绘
 
     # --- 随机动作方法 ---
     def _is_any_major_animation_active(self):
@@ -403,7 +598,6 @@ class HeartWidget(QWidget):
         self.shiver_intensity_factor = 0.8  # 较小的强度
         self.shiver_total_duration = random.uniform(0.4, 0.7) 
         self.shiver_active_until = time.time() + self.shiver_total_duration
-        self.update()
 
     def random_action_pop(self):
         """触发弹跳动画"""
@@ -411,7 +605,6 @@ class HeartWidget(QWidget):
             return
         self.total_pop_duration_for_calc = random.uniform(0.3, 0.6) 
         self.pop_active_until = time.time() + self.total_pop_duration_for_calc
-        self.update()
 
     def random_action_spin(self):
         """触发旋转动画"""
@@ -421,7 +614,6 @@ class HeartWidget(QWidget):
         self.spin_target_angle = random.choice([-360.0, 360.0])  # 旋转方向
         self.spin_active_until = time.time() + self.spin_total_duration
         self.current_spin_angle = 0  # 重置新旋转
-        self.update()
 
     def random_action_glow(self):
         """触发发光动画"""
@@ -430,7 +622,6 @@ class HeartWidget(QWidget):
         self.glow_intensity = random.uniform(0.5, 1.0)
         self.glow_total_duration = random.uniform(0.8, 1.5)
         self.glow_active_until = time.time() + self.glow_total_duration
-        self.update()
         self.emit_particles(random.randint(5,10), self.geometry(), self.base_color, "sparkle")
 
     def random_action_jiggle(self):
@@ -440,7 +631,6 @@ class HeartWidget(QWidget):
         self.jiggle_magnitude = random.uniform(3.0, 7.0)
         self.jiggle_total_duration = random.uniform(0.3, 0.6)
         self.jiggle_active_until = time.time() + self.jiggle_total_duration
-        self.update()
 
     # --- 直接交互方法 ---
     def mousePressEvent(self, event):
@@ -459,7 +649,6 @@ class HeartWidget(QWidget):
                     self.set_display_text(random.choice(quick_responses))
                     QTimer.singleShot(400, self._restore_text_after_click)
 
-                self.update()
                 self.clicked_on_heart.emit()  # 发出信号给MainWindow
         super().mousePressEvent(event)  # 允许父窗口处理（例如拖动）
 
@@ -473,14 +662,12 @@ class HeartWidget(QWidget):
         """鼠标进入事件处理"""
         self.is_hovering = True
         self.hover_scale_bonus = 0.03  # 悬停时轻微放大
-        self.update()
         super().enterEvent(event)
 
     def leaveEvent(self, event):
         """鼠标离开事件处理"""
         self.is_hovering = False
         self.hover_scale_bonus = 0.0
-        self.update()
         super().leaveEvent(event)
     
     def set_long_dialogue_visibility(self, is_visible: bool):
@@ -1,5 +1,7 @@
-from typing import List, Optional, Dict
+from typing import TYPE_CHECKING, NamedTuple, Optional
+import logging
 import random
+import time
 
 from PyQt5.QtWidgets import (
     QWidget, QVBoxLayout, QTextEdit, QMenu, QAction, QApplication
@@ -11,13 +13,29 @@ from views.heart_widget import HeartWidget
 from views.chat_popup import ChatInputPopup
 from controllers.gemini_controller import GeminiController
 from controllers.sound_controller import SoundController
+from controllers.resource_bootstrap import ResourceBootstrap
+from controllers.heartbeat_audio import HeartbeatAudio
 from controllers.animation_controller import AnimationController
-from models.gemini_models import RubyResponse
+from controllers.history_manager import ChatHistoryManager
+from controllers.conversation_store import ConversationStore
 from utils.constants import (
     DEFAULT_HEART_COLOR, DEFAULT_PULSE_FREQUENCY, ERROR_HEART_COLOR,
-    OUTPUT_HIDE_TIMEOUT_MS, ERROR_HIDE_TIMEOUT_MS
+    OUTPUT_HIDE_TIMEOUT_MS, ERROR_HIDE_TIMEOUT_MS, HISTORY_RESTORE_MAX_TURNS, GEMINI_WARM_UP_DELAY_MS,
+    RESOURCE_BOOTSTRAP_DELAY_MS
 )
 
+if TYPE_CHECKING:
+    from models.gemini_models import RubyResponse
+
+logger = logging.getLogger(__name__)
+
+
+class Interaction(NamedTuple):
+    """随请求一起传递的交互上下文，响应到达时用于写入历史记录并计算延迟"""
+    history_user_entry: str  # 历史记录中的用户条目
+    interaction_type: str  # chat/poke_reaction/mood_query
+    sent_at: float  # 发送时刻 (time.monotonic)
+
 
 class MainWindow(QWidget):
     """主窗口类，负责管理整个应用程序的交互"""
@@ -27,15 +45,22 @@ class MainWindow(QWidget):
         
         # 初始化控制器
         self.sound_controller = SoundController()
-        self.sound_controller.init_sounds()
+        # 资源文件在后台检查，音效在首帧绘制之后逐个加载，加载完成前静默跳过播放
+        self.resource_bootstrap = ResourceBootstrap(self.sound_controller)
+        QTimer.singleShot(RESOURCE_BOOTSTRAP_DELAY_MS, self.resource_bootstrap.start)
         
         self.gemini_controller = GeminiController()
+        # SDK、pydantic 模型和客户端在事件循环启动、窗口完成首帧绘制之后再在后台初始化
+        QTimer.singleShot(GEMINI_WARM_UP_DELAY_MS, self.gemini_controller.warm_up)
         
         self.animation_controller = AnimationController(self.sound_controller)
         
-        # 聊天历史
-        self.chat_history: List[Dict[str, str]] = []
-        self.current_interaction_context: Optional[str] = None  # 当前交互上下文，用于历史记录
+        # 聊天历史（按token预算保留，旧对话在后台压缩为摘要）
+        self.chat_history = ChatHistoryManager()
+        # 持久化的对话记录，启动后只读取末尾用于恢复提示上下文
+        self.conversation_store = ConversationStore()
+        QTimer.singleShot(0, self._restore_chat_history)
+        self._long_dialogue_streaming = False  # 长对话是否正在流式显示
         self.chat_input_popup: Optional[ChatInputPopup] = None
         
         # 初始化UI
@@ -47,10 +72,16 @@ class MainWindow(QWidget):
         # 窗口拖动相关
         self._drag_pos = QPoint()
         
-        # 设置心跳声音定时器
-        self.heartbeat_sound_timer = QTimer(self)
-        self.heartbeat_sound_timer.timeout.connect(self._play_heartbeat_sound)
-        self._update_heartbeat_sound_interval(self.heart_widget.current_frequency_hz)
+        # 程序化心跳声，跟随心形的脉动相位，和音效混合后从同一个音频设备输出；设备在首帧绘制之后再打开
+        self.heartbeat_audio = HeartbeatAudio(self.heart_widget.pulse_phase)
+        self.sound_controller.mixer.add_source(self.heartbeat_audio)
+        QTimer.singleShot(RESOURCE_BOOTSTRAP_DELAY_MS, self._start_audio_output)
+        
+        # 空闲模式：窗口不可见（最小化、隐藏或被完全遮挡）时挂起所有动画定时器
+        self._is_idle = False
+        self.winId()  # 确保原生窗口已创建，以便监听其曝光(Expose)事件
+        if self.windowHandle():
+            self.windowHandle().installEventFilter(self)
     
     def init_ui(self):
         """初始化用户界面"""
@@ -131,6 +162,9 @@ class MainWindow(QWidget):
         sound_toggle_action = menu.addAction(
             "Toggle Sounds (On)" if self.sound_controller.are_sounds_enabled() else "Toggle Sounds (Off)"
         )
+        profiler_toggle_action = menu.addAction(
+            "Hide Frame Profiler" if self.heart_widget.profiler_overlay_visible else "Show Frame Profiler"
+        )
         menu.addSeparator()
         quit_action = menu.addAction("Quit Ruby")
         
@@ -145,10 +179,8 @@ class MainWindow(QWidget):
         elif action == sound_toggle_action:
             new_state = not self.sound_controller.are_sounds_enabled()
             self.sound_controller.enable_sounds(new_state)
-            if not new_state:
-                self.heartbeat_sound_timer.stop()
-            else:
-                self._update_heartbeat_sound_interval(self.heart_widget.current_frequency_hz)
+        elif action == profiler_toggle_action:
+            self.heart_widget.set_profiler_overlay_visible(not self.heart_widget.profiler_overlay_visible)
         elif action == quit_action:
             self.close()
     
@@ -250,7 +282,21 @@ class MainWindow(QWidget):
         if self.chat_input_popup and self.chat_input_popup.isVisible():
             self.chat_input_popup.hide()
         
-        self.current_interaction_context = history_user_entry if history_user_entry else user_text_or_action
+        # 交互上下文随请求一起传递，用于写入历史记录
+        interaction = Interaction(
+            history_user_entry if history_user_entry else user_text_or_action,
+            interaction_type, time.monotonic()
+        )
+        
+        # 戳一戳/询问心情优先使用预取的回复，立即响应
+        cached_response = self.gemini_controller.take_cached_response(
+            user_text_or_action, interaction_type, self.chat_history
+        )
+        if cached_response is not None:
+            self.gemini_controller.cancel_all()  # 被立即回答取代的进行中请求不再需要
+            QTimer.singleShot(0, lambda: self.handle_gemini_response(cached_response, interaction))
+            return
+        
         self.heart_widget.set_display_text("...")  # 思考中...
         
         # 构建提示并发送到Gemini API
@@ -258,15 +304,58 @@ class MainWindow(QWidget):
             user_text_or_action, interaction_type, self.chat_history
         )
         
+        self._long_dialogue_streaming = False
         self.gemini_controller.send_message(
-            full_prompt, self.handle_gemini_response, self.handle_gemini_error
+            full_prompt,
+            lambda ruby_data: self.handle_gemini_response(ruby_data, interaction),
+            self.handle_gemini_error,
+            self.handle_gemini_field, self.handle_gemini_long_dialogue_chunk,
+            interaction_type
         )
     
-    def handle_gemini_response(self, ruby_data: RubyResponse):
+    def handle_gemini_field(self, field_name: str, value):
+        """处理流式响应中提前到达的字段，让心形尽早做出反应
+        
+        Args:
+            field_name: 字段名 (short_dialogue/color_hex/frequency_hz)
+            value: 字段值
+        """
+        if field_name == "short_dialogue" and isinstance(value, str):
+            self.heart_widget.set_display_text(value)
+        elif field_name == "color_hex" and isinstance(value, str):
+            self.heart_widget.set_heart_color(value)
+        elif field_name == "frequency_hz":
+            try:
+                frequency_hz = float(value)
+            except (TypeError, ValueError):
+                return
+            self.heart_widget.set_pulsation(frequency_hz)
+    
+    def handle_gemini_long_dialogue_chunk(self, text: str):
+        """处理流式响应中逐块到达的长对话文本
+        
+        Args:
+            text: 新到达的文本片段
+        """
+        if not self._long_dialogue_streaming:
+            self._long_dialogue_streaming = True
+            self.output_hide_timer.stop()
+            self.long_dialogue_output_area.clear()
+            self.long_dialogue_output_area.setVisible(True)
+            self.heart_widget.set_long_dialogue_visibility(True)
+        
+        cursor = self.long_dialogue_output_area.textCursor()
+        cursor.movePosition(cursor.End)
+        cursor.insertText(text)
+        scroll_bar = self.long_dialogue_output_area.verticalScrollBar()
+        scroll_bar.setValue(scroll_bar.maximum())
+    
+    def handle_gemini_response(self, ruby_data: "RubyResponse", interaction: Optional[Interaction] = None):
         """处理Gemini API的成功响应
         
         Args:
             ruby_data: Ruby响应数据
+            interaction: 交互上下文，为None时不记录历史
         """
         # 播放接收消息的声音
         self.sound_controller.play_sound("message_receive", volume=0.7)
@@ -276,9 +365,6 @@ class MainWindow(QWidget):
         self.heart_widget.set_heart_color(ruby_data.color_hex)
         self.heart_widget.set_pulsation(ruby_data.frequency_hz)
         
-        # 更新心跳声音
-        self._update_heartbeat_sound_interval(ruby_data.frequency_hz)
-        
         # 根据情绪生成粒子效果
         self.animation_controller.emit_mood_particles(
             ruby_data.frequency_hz, 
@@ -286,7 +372,8 @@ class MainWindow(QWidget):
             ruby_data.color_hex
         )
         
-        # 显示长对话文本
+        # 显示长对话文本（流式显示时用完整文本校正）
+        self._long_dialogue_streaming = False
         self.long_dialogue_output_area.setText(f"{ruby_data.long_dialogue}")
         self.long_dialogue_output_area.setVisible(True)
         self.heart_widget.set_long_dialogue_visibility(True)
@@ -301,17 +388,19 @@ class MainWindow(QWidget):
         self.output_hide_timer.start(OUTPUT_HIDE_TIMEOUT_MS)
         
         # 更新聊天历史
-        if self.current_interaction_context:
-            self.chat_history.append({
-                "user": self.current_interaction_context,
-                "ruby": ruby_data.long_dialogue
-            })
-            self.current_interaction_context = None
-            
-            # 限制历史记录长度
-            max_history_exchanges = 6
-            if len(self.chat_history) > max_history_exchanges:
-                self.chat_history = self.chat_history[-max_history_exchanges:]
+        if interaction:
+            self.chat_history.append(
+                interaction.history_user_entry, ruby_data.long_dialogue, interaction.interaction_type
+            )
+            latency_ms = (time.monotonic() - interaction.sent_at) * 1000.0
+            self.conversation_store.append(
+                interaction.history_user_entry, interaction.interaction_type, ruby_data, latency_ms
+            )
+    
+    def _restore_chat_history(self):
+        """从对话记录中恢复最近的聊天历史（在事件循环启动后执行，不拖慢窗口显示）"""
+        if not self.chat_history:
+            self.chat_history.restore(self.conversation_store.load_tail(HISTORY_RESTORE_MAX_TURNS))
     
     def handle_gemini_error(self, error_message: str):
         """处理Gemini API的错误响应
@@ -319,10 +408,10 @@ class MainWindow(QWidget):
         Args:
             error_message: 错误消息
         """
+        self._long_dialogue_streaming = False
         self.heart_widget.set_display_text("Error!")
         self.heart_widget.set_heart_color(ERROR_HEART_COLOR)
         self.heart_widget.set_pulsation(0.5)
-        self._update_heartbeat_sound_interval(0.5)
         
         self.long_dialogue_output_area.setText(
             f"Ruby Error: {error_message}\n(Check console for more details and ensure API key is correct)"
@@ -336,29 +425,11 @@ class MainWindow(QWidget):
         
         self.output_hide_timer.stop()
         self.output_hide_timer.start(ERROR_HIDE_TIMEOUT_MS)  # 错误显示时间更长
-        self.current_interaction_context = None
-    
-    def _play_heartbeat_sound(self):
-        """播放心跳声音"""
-        freq = self.heart_widget.current_frequency_hz
-        if freq < 1.5:
-            self.sound_controller.play_sound("heartbeat_soft", volume=0.3 + (freq * 0.1))
-        else:
-            self.sound_controller.play_sound("heartbeat_fast", volume=0.4 + (freq * 0.08))
-        self._update_heartbeat_sound_interval(freq)
     
-    def _update_heartbeat_sound_interval(self, frequency_hz: float):
-        """更新心跳声音的间隔
-        
-        Args:
-            frequency_hz: 频率 (Hz)
-        """
-        if frequency_hz <= 0:
-            self.heartbeat_sound_timer.stop()
-            return
-        
-        interval_ms = int(1000 / frequency_hz)
-        self.heartbeat_sound_timer.start(max(150, interval_ms))  # 最小间隔
+    def _start_audio_output(self):
+        """声音开启且窗口可见时打开音频设备"""
+        if self.sound_controller.are_sounds_enabled() and not self._is_idle:
+            self.sound_controller.start_output()
     
     def mousePressEvent(self, event):
         """鼠标按下事件处理"""
@@ -392,28 +463,68 @@ class MainWindow(QWidget):
         if event.type() == QEvent.WindowStateChange:
             if self.isMinimized():
                 self.heart_widget.set_display_text("Zzz...")
-                if self.sound_controller.are_sounds_enabled():
-                    self.heartbeat_sound_timer.stop()
             elif self.windowState() == Qt.WindowNoState or self.windowState() == Qt.WindowActive:  # 恢复或聚焦
                 # 根据对话框是否可见来恢复
                 if not self.long_dialogue_output_area.isVisible():
                     self.heart_widget.set_display_text("Ruby...")
                 # 否则保持当前Gemini文本
-                if self.sound_controller.are_sounds_enabled():
-                    self._update_heartbeat_sound_interval(self.heart_widget.current_frequency_hz)
+            self._update_idle_state()
+    
+    def showEvent(self, event):
+        """窗口显示事件处理"""
+        super().showEvent(event)
+        self._update_idle_state()
+    
+    def hideEvent(self, event):
+        """窗口隐藏事件处理"""
+        super().hideEvent(event)
+        self._update_idle_state()
+    
+    def eventFilter(self, obj, event):
+        """监听原生窗口的曝光事件，以检测窗口被完全遮挡或重新露出"""
+        if obj is self.windowHandle() and event.type() == QEvent.Expose:
+            QTimer.singleShot(0, self._update_idle_state)
+        return super().eventFilter(obj, event)
+    
+    def _is_window_observable(self) -> bool:
+        """返回窗口当前是否可能被用户看到"""
+        if not self.isVisible() or self.isMinimized():
+            return False
+        window_handle = self.windowHandle()
+        return window_handle is None or window_handle.isExposed()
+    
+    def _update_idle_state(self):
+        """根据窗口可见性进入或退出空闲模式"""
+        if not hasattr(self, '_is_idle'):  # 初始化完成前的事件
+            return
+        
+        should_idle = not self._is_window_observable()
+        if should_idle == self._is_idle:
+            return
+        self._is_idle = should_idle
+        
+        if should_idle:
+            self.heart_widget.suspend_animations()
+            self.animation_controller.pause()
+            self.heartbeat_audio.suspend()
+            # 音频设备暂停后不再从UI线程拉取混音，空闲时不占用CPU
+            self.sound_controller.suspend_output()
+        else:
+            self.heart_widget.resume_animations()
+            self.animation_controller.resume()
+            self.heartbeat_audio.resume()
+            self._start_audio_output()
     
     def closeEvent(self, event):
         """窗口关闭事件处理"""
-        print("Closing Ruby application...")
+        logger.info("Closing Ruby application...")
         # 停止所有定时器
         self.output_hide_timer.stop()
-        self.heartbeat_sound_timer.stop()
+        self.sound_controller.stop_output()
         
         # 停止心形部件的定时器
         if self.heart_widget:
-            self.heart_widget.pulsation_timer.stop()
-            self.heart_widget.color_change_timer.stop()
-            self.heart_widget.particle_timer.stop()
+            self.heart_widget.frame_timer.stop()
         
         # 停止动画控制器
         self.animation_controller.stop_animations()
@@ -422,11 +533,16 @@ class MainWindow(QWidget):
         if self.chat_input_popup:
             self.chat_input_popup.close()
         
-        # 等待线程结束
+        # 取消进行中的请求并等待线程结束
+        self.gemini_controller.cancel_all()
         if hasattr(self.gemini_controller, 'threadpool'):
             self.gemini_controller.threadpool.clear()  # 删除未开始的任务
             if not self.gemini_controller.threadpool.waitForDone(2000):  # 等待最多2秒
-                print("Warning: Some threads did not finish in time.")
+                logger.warning("Some threads did not finish in time.")
+        self.gemini_controller.shutdown()
+        
+        # 提交尚未写入的对话记录
+        self.conversation_store.close()
         
         super().closeEvent(event)
         self.deleteLater()  # 确保适当清理
\ No newline at end of file